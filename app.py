@@ -1,32 +1,46 @@
 from dotenv import load_dotenv
 load_dotenv("./.env")
-import os,json,re,asyncio,time
+import os,json,re,asyncio,time,hmac,hashlib
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 import httpx
 from contextlib import asynccontextmanager
 from slack_bolt.async_app import AsyncApp
 from slack_bolt.adapter.fastapi.async_handler import AsyncSlackRequestHandler
 from datetime import datetime 
-from handlers.app_state import redis_client,gptclient,http_client
-from handlers.modal_builder import build_project_selection_modal,build_ticket_fields_modal,open_status_modal,open_assign_modal,open_comment_modal,open_summary_modal,issue_options
-from handlers.jira_client import fetch_issue_fields, build_jira_payload_from_submission, create_jira_ticket, search_similar_tickets,attach_file_to_ticket,build_home_view_for_user,build_adf_comment
-from handlers.jira_token_store import save_jira_token,get_valid_jira_token,reset_user
-from handlers.llm import generate_and_update_summary,gptprompt,analyze_user_query_and_respond
-from handlers.project_loader import load_projects
-from handlers.userfetch import resolve_user,fetchUsers,refresh_user_cache, USER_CACHE_TTL
-from handlers.jira_models import SessionLocal, JiraToken
+from handlers.app_state import redis_client,http_client
+from handlers.modal_builder import build_project_selection_modal,build_no_issue_types_modal,build_ticket_fields_modal,open_status_modal,open_assign_modal,open_comment_modal,open_summary_modal,build_issue_page_modal
+from handlers.jira_client import fetch_issue_fields, build_jira_payload_from_submission, create_jira_ticket, search_similar_tickets,attach_file_to_ticket,AttachmentTooLarge,ATTACHMENT_MAX_BYTES,build_home_view_for_user,build_adf_comment,render_home_view,search_issue_page,HOME_LISTS,ISSUE_PAGE_SIZE
+from handlers.home_model import patch_home_model
+from handlers import home_model
+from handlers.jira_token_store import save_jira_token,get_valid_jira_token,reset_user,get_jira_token_record,get_slack_user_ids,delete_all_jira_tokens,run_token_refresher,get_token_cache_stats
+from handlers.redis_access import get_redis_rtt_counts
+from handlers.options_index import query_options_index, options_cache_key_from_block_id
+from handlers.issue_cache import apply_webhook_event
+from handlers.similarity_index import get_similarity_stats
+from handlers.summary_cache import get_summary_cache_stats
+from handlers.jql_translator import get_translator_stats
+from handlers.llm_scheduler import LLMOverloaded, get_llm_scheduler_stats
+from handlers.search_cache import invalidate_issue,invalidate_user,get_search_cache_stats,run_search_invalidation_listener
+from handlers.llm import generate_and_update_summary,gptprompt,analyze_user_query_and_respond,stream_completion,trim_partial_markdown,get_stream_stats,STREAM_CURSOR
+from handlers.project_loader import catalog,run_catalog_refresher
+from handlers.prefetch import rank_issue_types,prefetch_issue_types,record_issue_type_pick
+from handlers.userfetch import resolve_user,fetchUsers,refresh_user_cache, USER_CACHE_TTL,DEFAULT_AVATAR,apply_user_change,run_user_change_listener,search_users
+from handlers.user_search import display_label
+from handlers.jira_models import async_engine
 import traceback
 
 
 JIRA_DOMAIN = os.getenv("JIRA_DOMAIN")
 ADMIN_USER_IDS = os.getenv("SLACK_ADMIN_USERS", "").split(",")
 ADMIN_LOG_CHANNEL = os.getenv("ADMIN_LOG_CHANNEL")
+JIRA_WEBHOOK_SECRET = os.getenv("JIRA_WEBHOOK_SECRET")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+HOME_RECONCILE_DELAY = int(os.getenv("HOME_RECONCILE_DELAY_SECONDS", "20"))
+_home_reconcile_tasks = {}
 
 
-proj_index = {}
-
 async def set_pending_ticket(user_id, data):
     await redis_client.set(f"user_pending:{user_id}",json.dumps(data))
 async def get_pending_ticket(user_id):
@@ -37,14 +51,21 @@ async def clear_pending_ticket(user_id):
 
 @asynccontextmanager
 async def app_lifespan(app):
-    global proj_index
-    print("🔁 Calling load_projects()...")
-    _, proj_index, _ = await asyncio.to_thread(load_projects)
-    print("✅ Projects loaded into memory.")
+    # Serve from whatever snapshot exists; the refresher revalidates it in the background
+    await asyncio.to_thread(catalog.load_snapshot)
     await redis_client.ping()
     await http_client.get("https://www.google.com") 
+    token_refresher = asyncio.create_task(run_token_refresher(http_client))
+    user_change_listener = asyncio.create_task(run_user_change_listener())
+    search_invalidation_listener = asyncio.create_task(run_search_invalidation_listener())
+    catalog_refresher = asyncio.create_task(run_catalog_refresher(redis_client))
     yield
+    token_refresher.cancel()
+    user_change_listener.cancel()
+    search_invalidation_listener.cancel()
+    catalog_refresher.cancel()
     await http_client.aclose()
+    await async_engine.dispose()
 
 fastapi_app = FastAPI(lifespan=app_lifespan)
 templates = Jinja2Templates(directory="templates")
@@ -118,6 +139,14 @@ async def update_home_tab(event, client, logger):
     except Exception as e:
         logger.error(f"Failed to render home tab: {e}")
 
+@app.event("user_change")
+async def handle_user_change(event):
+    await apply_user_change(event["user"])
+
+@app.event("team_join")
+async def handle_team_join(event):
+    await apply_user_change(event["user"])
+
 @app.action("create_ticket_button")
 async def handle_create_ticket_button(ack, body, client):
     await ack()
@@ -129,6 +158,8 @@ async def handle_create_ticket_button(ack, body, client):
 async def update_home(ack,body, client, logger):
     await ack()
     user_id = body["user"]["id"]
+    # An explicit refresh always goes back to Jira
+    await invalidate_user(user_id)
     try:
         token_info = await get_valid_jira_token(user_id,http_client)
         access_token = token_info["access_token"]
@@ -138,6 +169,36 @@ async def update_home(ack,body, client, logger):
     except Exception as e:
         logger.error(f"Failed to render home tab: {e}")
 
+async def issue_page_view(user_id, list_name, history):
+    token_info = await get_valid_jira_token(user_id,http_client)
+    page = await search_issue_page(token_info["access_token"], token_info["cloud_id"], HOME_LISTS[list_name], http_client, f"{list_name}_page", ISSUE_PAGE_SIZE, history[-1])
+    issues, next_page_token = page or ([], None)
+    return build_issue_page_modal(list_name, issues, history, next_page_token)
+
+@app.action("home_show_more")
+async def handle_home_show_more(ack, body, action, client, logger):
+    await ack()
+    try:
+        view = await issue_page_view(body["user"]["id"], action["value"], [None])
+        await client.views_open(trigger_id=body["trigger_id"], view=view)
+    except Exception as e:
+        logger.error(f"Failed to open issue list: {e}")
+
+@app.action(re.compile(r"issue_page_(next|prev)"))
+async def handle_issue_page(ack, body, action, client, logger):
+    await ack()
+    metadata = json.loads(body["view"]["private_metadata"])
+    history = metadata["history"]
+    if action["action_id"] == "issue_page_next":
+        history = history + [metadata["next"]]
+    else:
+        history = history[:-1] or [None]
+    try:
+        view = await issue_page_view(body["user"]["id"], metadata["list"], history)
+        await client.views_update(view_id=body["view"]["id"], hash=body["view"]["hash"], view=view)
+    except Exception as e:
+        logger.error(f"Failed to page issue list: {e}")
+
 @app.command("/resetjira")
 async def handle_reset_jira_db(ack, body, client, logger):
     await ack()
@@ -153,10 +214,7 @@ async def handle_reset_jira_db(ack, body, client, logger):
         return
 
     try:
-        session = SessionLocal()
-        session.query(JiraToken).delete()
-        session.commit()
-        session.close()
+        await delete_all_jira_tokens()
         await reset_user()
         # Notify the admin
         await client.chat_postMessage(
@@ -229,16 +287,13 @@ async def handle_debug_jira_token(ack, body, client, logger):
             text="❌ You are not authorized to use this command."
         )
         return
-    session = SessionLocal()
     if text:
         target_id = text[1:].split("|")[0]
         user_id=await resolve_user(target_id,client,get_id="id")
-        token = session.get(JiraToken, user_id)
+        token = await get_jira_token_record(user_id)
         if not token:
-            session.close()
             await client.chat_postMessage(channel=channel_id, text=f"🔍 No token found for <@{target_id}>.")
             return
-        session.close()
         await client.chat_postMessage(
             channel=ADMIN_LOG_CHANNEL,
             text=(
@@ -249,7 +304,6 @@ async def handle_debug_jira_token(ack, body, client, logger):
             )
         )
         return
-    session.close()
     await client.chat_postMessage(
         channel=channel_id,
         text="⚠️ Usage: /jiratoken `@user`"
@@ -352,9 +406,15 @@ async def handle_project_dropdown(ack, body, client):
     await ack()
     user_id = body["user"]["id"]
     project_key = body["actions"][0]["selected_option"]["value"]
-    issue_id=issue_options(project_key)[0]["value"]
-    p=proj_index.get(project_key)
+    ranked = await rank_issue_types(user_id, project_key)
+    if not ranked:
+        await client.views_update(view_id=body["view"]["id"], view=build_no_issue_types_modal(project_key))
+        return
+    issue_id=ranked[0]["value"]
+    p=catalog.project_index.get(project_key)
     project_name=p["name"]
+    # Warm the other issue types so a later switch renders from memory
+    prefetch_issue_types(user_id, project_key, project_name, [opt["value"] for opt in ranked[1:]], http_client)
     fields = await fetch_issue_fields(user_id, project_key,issue_id,http_client)
     view_id = body["view"]["id"]
     updated_view = await build_ticket_fields_modal(fields,project_key,project_name,issue_id)
@@ -415,33 +475,14 @@ async def load_external_options(ack, body, logger):
     block_id = body.get("block_id") 
 
     logger.info(f"[options] Query: '{query}' | Block ID: '{block_id}'")
-    cache_key = f"external_fields:{block_id}"
-    raw = await redis_client.get(cache_key)
-    if not raw:
+    matches = await query_options_index(options_cache_key_from_block_id(block_id), query)
+    if matches is None:
         logger.warning(f"[options] No cached values found for {block_id}")
         await ack(options=[{
             "text": {"type": "plain_text", "text": "⚠️ No options available"},
             "value": "no_options"
         }])
         return
-    try:
-        allowed = json.loads(raw)
-    except Exception as e:
-        logger.error(f"[options] Failed to parse JSON for {block_id}: {e}")
-        await ack(options=[])
-        return
-    matches = []
-    for opt in allowed:
-        label = opt.get("name") or opt.get("value") or str(opt)
-        value = opt.get("id") or opt.get("value") or str(opt)
-
-        if label and query in label.lower():
-            matches.append({
-                "text": {"type": "plain_text", "text": label[:75]},
-                "value": value
-            })
-            if len(matches) >= 100:
-                break
     logger.info(f"[options] Returning {len(matches)} matches for query: '{query}'")
     if not matches:
         matches.append({
@@ -460,6 +501,7 @@ async def handle_ticket_submission(ack, body, client, view, logger):
     project_name = metadata.get("project_name")
     issue_type_id = metadata.get("issue_type_id")
     issue_name = metadata.get("issue_name")
+    await record_issue_type_pick(user_id, project_key, issue_type_id)
     title = state_values.get("summary", {}).get("input_value", {}).get("value", "")
     description = state_values.get("description", {}).get("input_value", {}).get("value", "")
     await set_pending_ticket(user_id, {
@@ -471,10 +513,16 @@ async def handle_ticket_submission(ack, body, client, view, logger):
     })
     await process_ticket_similarity_async(client, user_id, title, description, project_key, issue_name)
 
-async def summarize_with_gpt4o(current_title, current_description, past_issues):
+async def summarize_with_gpt4o(current_title, current_description, past_issues, render=None):
     prompt = gptprompt(current_title, current_description, past_issues)
 
-    response = await gptclient.chat.completions.create(
+    async def show(text, done):
+        if render and not done:
+            await render(trim_partial_markdown(text) + STREAM_CURSOR)
+
+    return await stream_completion(
+        show,
+        "similarity",
         model="gpt-4o-mini",
         messages=[
             {
@@ -505,11 +553,10 @@ async def summarize_with_gpt4o(current_title, current_description, past_issues):
         temperature=0.5,
         max_tokens=1000
     )
-    return response.choices[0].message.content.strip()
 
 async def process_ticket_similarity_async(client, user_id, title, description, project_key, issue_type):
     try:
-        similar_tickets = await search_similar_tickets(user_id, title, project_key, issue_type,http_client)
+        similar_tickets = await search_similar_tickets(user_id, title, project_key, issue_type,http_client, description)
         if not similar_tickets:
             await proceed_to_ticket_creation(client, user_id)
             return
@@ -528,7 +575,22 @@ async def process_ticket_similarity_async(client, user_id, title, description, p
         ],
             text="🔍 Similar tickets found — review before creating."
         )
-        summary = await summarize_with_gpt4o(title,description,similar_tickets)
+        async def show(partial):
+            await client.chat_update(
+                channel=load["channel"],
+                ts=load["ts"],
+                text="🔍 Similar tickets found — review before creating.",
+                blocks=[
+                    {"type": "section", "text": {"type": "mrkdwn", "text": f"🧠 *Summary of Similar Tickets:*\n>{partial}"}},
+                    {"type": "divider"}
+                ]
+            )
+
+        try:
+            summary = await summarize_with_gpt4o(title,description,similar_tickets,render=show) or ""
+        except LLMOverloaded:
+            # The list below is what matters here; skip the summary rather than fail the check
+            summary = "🚦 _JiraMate is busy, so there is no summary this time. Please review the similar tickets below._"
         blocks = [
             {
                 "type": "section",
@@ -659,6 +721,7 @@ async def proceed_to_ticket_creation(client, user_id):
     ticket_url = await create_jira_ticket(user_id,payload,http_client)
 
     if ticket_url:
+        await invalidate_created_ticket(user_id, ticket_url.split('/')[-1], payload)
         summary = user_data["state_values"].get("summary", {}).get("input_value", {}).get("value", "-")
         now_str = datetime.now().strftime('%b %d, %Y %I:%M %p')
 
@@ -760,24 +823,24 @@ async def handle_message_events(event, client, logger):
         ticket_key = data["ticket_url"].split("/")[-1]
         summary = data["state_values"].get("summary", {}).get("input_value", {}).get("value", "-")
 
-        successful_uploads = 0
-        for file_info in event.get("files", []):
+        async def relay(file_info):
             file_name = file_info["name"]
-            file_url = file_info["url_private_download"]
             try:
-                headers = {"Authorization": f"Bearer {os.getenv('SLACK_BOT_TOKEN')}"}
-                response = await http_client.get(file_url, headers=headers)
-                file_content = response.content
-                success = await attach_file_to_ticket(user_id, ticket_key, file_name, file_content, http_client)
+                success = await attach_file_to_ticket(user_id, ticket_key, file_name, file_info["url_private_download"], http_client, size=file_info.get("size"))
                 if success:
-                    successful_uploads += 1
                     await client.chat_postMessage(channel=user_id, text=f"📎 `{file_name}` attached to ticket `{ticket_key}`.")
                 else:
                     await client.chat_postMessage(channel=user_id, text=f"❌ Failed to attach `{file_name}`.")
+                return success
+            except AttachmentTooLarge:
+                await client.chat_postMessage(channel=user_id, text=f"⚠️ `{file_name}` is larger than {ATTACHMENT_MAX_BYTES // (1024 * 1024)} MB and was not attached.")
             except Exception as e:
                 logger.error(f"Error attaching `{file_name}`: {e}")
                 await client.chat_postMessage(channel=user_id, text=f"⚠️ Error while attaching `{file_name}`.")
+            return False
 
+        results = await asyncio.gather(*(relay(f) for f in event.get("files", [])))
+        successful_uploads = sum(results)
         if successful_uploads > 0:
             await client.chat_update(
                 channel=data["channel_id"],
@@ -822,8 +885,10 @@ async def handle_message_events(event, client, logger):
                 ]
             )
             # Step 2: GPT + Jira processing
-            response = await analyze_user_query_and_respond(text, access_token, cloud_id)
-            print(response)
+            async def show(blocks):
+                await client.chat_update(channel=loading["channel"], ts=loading["ts"], text="🧠 JiraMate AI", blocks=blocks)
+
+            response = await analyze_user_query_and_respond(text, access_token, cloud_id, render=show)
             # Step 3: Format final response in blocks
             await client.chat_update(
                 channel=loading["channel"],
@@ -831,6 +896,11 @@ async def handle_message_events(event, client, logger):
                 text="🧠 JiraMate AI",  # fallback text for clients that don't support blocks
                 blocks=response
             )
+        except LLMOverloaded:
+            await client.chat_postMessage(
+                channel=channel,
+                text="🚦 JiraMate is handling a lot of requests right now — please try again in a minute."
+            )
         except Exception as e:
             logger.error(f"GPT DM error: {e}")
             await client.chat_postMessage(
@@ -993,8 +1063,11 @@ async def handle_status_submit(ack, body, client, view):
     cloud_id = metadata["cloud_id"]
     access_token = metadata["token"]
     user_id = body["user"]["id"]
-    selected_status_id = view["state"]["values"]["status_block"]["selected_status"]["selected_option"]["value"]
-    await http_client.post(
+    selected_option = view["state"]["values"]["status_block"]["selected_status"]["selected_option"]
+    selected_status_id = selected_option["value"]
+    target = metadata.get("targets", {}).get(selected_status_id)
+    await ack()
+    response = await http_client.post(
         f"https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/issue/{issue_key}/transitions",
         headers={
             "Authorization": f"Bearer {access_token}",
@@ -1002,10 +1075,14 @@ async def handle_status_submit(ack, body, client, view):
         },
         json={"transition": {"id": selected_status_id}}
     )
+    if response.status_code != 204:
+        print(f"❌ Failed to transition {issue_key}: {response.text}")
+        return
+    await invalidate_issue(issue_key)
+    # Modals opened before targets were recorded only know the transition name; leave the status to the reconcile
+    mutate = home_model.set_status(issue_key, target["status"], target["done"]) if target else home_model.touch(issue_key)
     try:
-        blocks = await build_home_view_for_user(user_id, client,access_token,cloud_id,http_client)
-        await ack()
-        await client.views_publish(user_id=user_id, view={"type": "home", "blocks": blocks})
+        await republish_home(client, user_id, access_token, cloud_id, mutate)
     except Exception as e:
         print(f"⚠️ Failed to refresh home tab: {e}")
       
@@ -1017,7 +1094,7 @@ async def handle_assignee_submit(ack, body, client, view):
     access_token = metadata["access_token"]
     cloud_id = metadata["cloud_id"]
     slack_user_id = view["state"]["values"]["assignee_block"]["selected_assignee"]["selected_option"]["value"]
-    token_info=await get_valid_jira_token(slack_user_id,http_client)
+    token_info=await get_valid_jira_token(slack_user_id,http_client,active=False)
     if not token_info:
         target_email=await resolve_user(slack_user_id,client,get_id="email")
         url = f"https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/user/search?query={target_email}"
@@ -1029,10 +1106,14 @@ async def handle_assignee_submit(ack, body, client, view):
         if response.status_code == 200:
             user = response.json()
             account_id= user[0]["accountId"]
+            assignee_name = user[0].get("displayName", "")
+            assignee_pic = user[0].get("avatarUrls", {}).get("48x48", DEFAULT_AVATAR)
         else:
             print("❌ Error:", response.status_code, response.text)
     else:
         account_id=token_info['account_id']
+        assignee_name = token_info['display_name']
+        assignee_pic = DEFAULT_AVATAR
     await ack()
     assign_response = await http_client.put( 
         f"https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/issue/{issue_key}/assignee",
@@ -1042,9 +1123,10 @@ async def handle_assignee_submit(ack, body, client, view):
     if assign_response.status_code != 204:
         print(f"❌ Failed to assign {issue_key}: {assign_response.text}")
         return
+    await invalidate_issue(issue_key, (user_id, slack_user_id))
     try:
-        blocks = await build_home_view_for_user(user_id, client,access_token,cloud_id,http_client)
-        await client.views_publish(user_id=user_id, view={"type": "home", "blocks": blocks})
+        mutate = home_model.set_assignee(issue_key, assignee_name, assignee_pic, to_self=slack_user_id == user_id)
+        await republish_home(client, user_id, access_token, cloud_id, mutate)
     except Exception as e:
         print(f"⚠️ Failed to refresh home tab: {e}")
 
@@ -1064,18 +1146,16 @@ async def load_user_options(ack, body, client):
             "text": {"type": "plain_text", "text": f"{display_name} (Assign to me)"},
             "value": current_user_id
         })
-    users = await resolve_user("", client, get_id="all")
+    users = await search_users(body.get("value", ""), client, limit=100 - len(options), exclude={current_user_id})
     for u in users:
-        if u.get("deleted") or u.get("is_bot") or u.get("id") == "USLACKBOT" or u.get("id")==current_user_id:
-            continue
         uid = u["id"]
-        name = u.get("real_name", u.get("name", ""))
+        name = display_label(u)
         prefix = "✅ " if uid == current_assignee else ""
         options.append({
             "text": {"type": "plain_text", "text": f"{prefix}{name[:75]}"},
             "value": uid
         })
-    await ack(options=options[:100])
+    await ack(options=options)
 
 @app.view("submit_comment_modal")
 async def handle_comment_submit(ack, body, client, view):
@@ -1100,9 +1180,9 @@ async def handle_comment_submit(ack, body, client, view):
     if response.status_code != 201:
         print(f"❌ Failed to add comment to {issue_key}: {response.text}")
         return
+    await invalidate_issue(issue_key)
     try:
-        blocks = await build_home_view_for_user(user_id, client,access_token,cloud_id,http_client)
-        await client.views_publish(user_id=user_id, view={"type": "home", "blocks": blocks})
+        await republish_home(client, user_id, access_token, cloud_id, home_model.touch(issue_key))
     except Exception as e:
         print(f"⚠️ Failed to refresh home tab: {e}")
 
@@ -1110,17 +1190,15 @@ async def handle_comment_submit(ack, body, client, view):
 async def load_user(ack, body, client):
     current_user_id = body["user"]["id"]
     options = []
-    users = await resolve_user("", client, get_id="all")
+    users = await search_users(body.get("value", ""), client, limit=100, exclude={current_user_id})
     for u in users:
-        if u.get("id")==current_user_id:
-            continue
         uid = u["id"]
-        name = u.get("real_name", u.get("name", ""))
+        name = display_label(u)
         options.append({
             "text": {"type": "plain_text", "text": f"{name[:75]}"},
             "value": uid
         })
-    await ack(options=options[:100])
+    await ack(options=options)
 
 async def handle_unwatch(client, user_id, issue_key,access_token,cloud_id,account_id):
     try:
@@ -1139,12 +1217,57 @@ async def handle_unwatch(client, user_id, issue_key,access_token,cloud_id,accoun
         if response.status_code != 204:
             print(f"❌ Failed to unwatch issue {issue_key}: {response.text}")
             return
-        blocks = await build_home_view_for_user(user_id, client,access_token,cloud_id,http_client)
-        await client.views_publish(user_id=user_id, view={"type": "home", "blocks": blocks})
+        await invalidate_issue(issue_key)
+        await republish_home(client, user_id, access_token, cloud_id, home_model.unwatch(issue_key))
 
     except Exception as e:
         print(f"❌ handle_unwatch failed: {e}")
 
+async def invalidate_created_ticket(user_id, issue_key, payload):
+    # A new issue belongs in its reporter's and assignee's Home searches, which can't know it yet
+    slack_user_ids = {user_id}
+    assignee = payload["fields"].get("assignee")
+    assignee_id = assignee.get("id") if isinstance(assignee, dict) else None
+    if assignee_id:
+        try:
+            slack_user_ids.update(await get_slack_user_ids(assignee_id))
+        except Exception as e:
+            print(f"⚠️ Failed to look up Slack users for {assignee_id}: {e}")
+    await invalidate_issue(issue_key, tuple(slack_user_ids))
+
+async def republish_home(client, user_id, access_token, cloud_id, mutate):
+    # Patch the user's Home model with what we just did in Jira and republish without re-searching
+    model = await patch_home_model(user_id, mutate)
+    if model is None:
+        blocks = await build_home_view_for_user(user_id, client,access_token,cloud_id,http_client)
+    else:
+        blocks = render_home_view(*model)
+        schedule_home_reconcile(client, user_id, access_token, cloud_id, blocks)
+    await client.views_publish(user_id=user_id, view={"type": "home", "blocks": blocks})
+
+def schedule_home_reconcile(client, user_id, access_token, cloud_id, published_blocks):
+    # Debounced: chained actions only trigger one reconciliation search per user
+    pending = _home_reconcile_tasks.pop(user_id, None)
+    if pending:
+        pending.cancel()
+
+    async def reconcile():
+        await asyncio.sleep(HOME_RECONCILE_DELAY)
+        try:
+            await invalidate_user(user_id)
+            blocks = await build_home_view_for_user(user_id, client,access_token,cloud_id,http_client)
+            if blocks != published_blocks:
+                print(f"🔁 Home tab drifted for {user_id}, republishing")
+                await client.views_publish(user_id=user_id, view={"type": "home", "blocks": blocks})
+        except Exception as e:
+            print(f"⚠️ Home reconciliation failed for {user_id}: {e}")
+        finally:
+            if _home_reconcile_tasks.get(user_id) is task:
+                del _home_reconcile_tasks[user_id]
+
+    task = asyncio.create_task(reconcile())
+    _home_reconcile_tasks[user_id] = task
+
 @app.error
 async def global_error_handler(error, body, logger):
     logger.error(f"Unhandled error: {error}")
@@ -1155,6 +1278,43 @@ async def global_error_handler(error, body, logger):
 async def slack_events(req: Request):
     return await handler.handle(req)
 
+@fastapi_app.get("/metrics")
+async def metrics(request: Request):
+    # Cache sizes and per-lane traffic are internal; unset METRICS_TOKEN turns the endpoint off
+    if not METRICS_TOKEN:
+        return JSONResponse({"error": "not found"}, status_code=404)
+    if not hmac.compare_digest(f"Bearer {METRICS_TOKEN}", request.headers.get("Authorization", "")):
+        return JSONResponse({"error": "unauthorized"}, status_code=401)
+    return {
+        "token_cache": get_token_cache_stats(),
+        "redis_rtt": get_redis_rtt_counts(),
+        "home_search_cache": get_search_cache_stats(),
+        "similarity_index": get_similarity_stats(),
+        "llm_stream": get_stream_stats(),
+        "summary_cache": get_summary_cache_stats(),
+        "jql_translator": get_translator_stats(),
+        "llm_scheduler": get_llm_scheduler_stats()
+    }
+
+@fastapi_app.post("/jira/webhook")
+async def jira_webhook(request: Request):
+    # Webhook content is served to users and fed to GPT, so unsigned deliveries are never accepted
+    if not JIRA_WEBHOOK_SECRET:
+        print("❌ Rejected Jira webhook: JIRA_WEBHOOK_SECRET is not set")
+        return JSONResponse({"error": "webhook secret not configured"}, status_code=503)
+    body = await request.body()
+    expected = "sha256=" + hmac.new(JIRA_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, request.headers.get("X-Hub-Signature", "")):
+        return JSONResponse({"error": "invalid signature"}, status_code=401)
+    try:
+        event = json.loads(body)
+    except ValueError:
+        return JSONResponse({"error": "invalid payload"}, status_code=400)
+    issue_key = await apply_webhook_event(event)
+    if issue_key:
+        await invalidate_issue(issue_key)
+    return {"ok": True, "issue": issue_key}
+
 @fastapi_app.get("/jira/oauth/callback", response_class=HTMLResponse)
 async def jira_oauth_callback(request: Request):
     code = request.query_params.get("code")
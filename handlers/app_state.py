@@ -8,5 +8,6 @@ http_client = httpx.AsyncClient(timeout=10,
     headers={"User-Agent": "JiraMate/1.0"},
     http2=True
 )
-gptclient = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Retries are handled by handlers/llm_scheduler.py so they respect the shared rate budget
+gptclient = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
 redis_client = aioredis.from_url(REDIS_URL, decode_responses=True)
@@ -0,0 +1,41 @@
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from handlers.app_state import redis_client
+from handlers.project_loader import catalog, store_fields, field_key, FIELDS_KEY
+from handlers.redis_access import record_rtt
+
+FIELD_CACHE_MAX_SIZE = int(os.getenv("FIELD_CACHE_MAX_SIZE", "256"))
+
+# Parsed field metadata, keyed by (project, issue type, catalog version)
+_field_cache = OrderedDict()
+
+
+def get_cached_fields(project_key, issue_type_id):
+    key = (project_key, issue_type_id, catalog.version)
+    fields = _field_cache.get(key)
+    if fields is not None:
+        _field_cache.move_to_end(key)
+    return fields
+
+def cache_fields(project_key, issue_type_id, fields):
+    key = (project_key, issue_type_id, catalog.version)
+    _field_cache[key] = fields
+    _field_cache.move_to_end(key)
+    while len(_field_cache) > FIELD_CACHE_MAX_SIZE:
+        _field_cache.popitem(last=False)
+
+async def load_shared_fields(project_key, issue_type_id):
+    record_rtt("fields.load")
+    raw = await redis_client.hget(FIELDS_KEY, field_key(project_key, issue_type_id))
+    if raw is None:
+        return None
+    fields = await asyncio.to_thread(json.loads, raw)
+    cache_fields(project_key, issue_type_id, fields)
+    return fields
+
+async def save_shared_fields(project_key, issue_type_id, fields):
+    record_rtt("fields.store")
+    await store_fields(redis_client, project_key, issue_type_id, fields)
+    cache_fields(project_key, issue_type_id, fields)
@@ -0,0 +1,88 @@
+import json
+from handlers.app_state import redis_client
+from handlers.redis_access import record_rtt
+
+HOME_MODEL_TTL = 60 * 60
+
+# The Home tab is rendered from this per-user model: {"assigned": [...], "watching": [...]}
+
+
+def _model_key(user_id):
+    return f"home_model:{user_id}"
+
+async def save_home_model(user_id, assigned, watching):
+    try:
+        record_rtt("home.save")
+        await redis_client.setex(_model_key(user_id), HOME_MODEL_TTL, json.dumps({"assigned": assigned, "watching": watching}))
+    except Exception as e:
+        print(f"⚠️ Failed to save home model for {user_id}: {e}")
+
+async def patch_home_model(user_id, mutate):
+    """Apply ``mutate(model)`` to the stored model and save it. Returns None if there is no model yet."""
+    try:
+        record_rtt("home.load")
+        raw = await redis_client.get(_model_key(user_id))
+    except Exception as e:
+        print(f"⚠️ Failed to load home model for {user_id}: {e}")
+        return None
+    if not raw:
+        return None
+    model = json.loads(raw)
+    mutate(model)
+    await save_home_model(user_id, model["assigned"], model["watching"])
+    return model["assigned"], model["watching"]
+
+def _find(issues, issue_key):
+    return next((issue for issue in issues if issue["key"] == issue_key), None)
+
+def _move_to_top(issues, issue_key):
+    issue = _find(issues, issue_key)
+    if issue:
+        issues.remove(issue)
+        issues.insert(0, issue)
+
+# --- Mutations mirroring what JiraMate just did in Jira ---
+def set_status(issue_key, status_name, done=False):
+    def mutate(model):
+        for issues in (model["assigned"], model["watching"]):
+            issue = _find(issues, issue_key)
+            if not issue:
+                continue
+            # Both Home lists exclude done issues
+            if done:
+                issues.remove(issue)
+            else:
+                issue["status"] = status_name
+                _move_to_top(issues, issue_key)
+    return mutate
+
+def set_assignee(issue_key, display_name, avatar_url, to_self):
+    def mutate(model):
+        was_watching = _find(model["watching"], issue_key) is not None
+        issue = _find(model["assigned"], issue_key) or _find(model["watching"], issue_key)
+        if not issue:
+            return
+        issue["assignee"] = display_name
+        issue["assignee_pic"] = avatar_url
+        for issues in (model["assigned"], model["watching"]):
+            if issue in issues:
+                issues.remove(issue)
+        # "Assigned to You" holds the user's issues; the watching list excludes them
+        if to_self:
+            model["assigned"].insert(0, issue)
+        elif was_watching:
+            model["watching"].insert(0, issue)
+    return mutate
+
+def touch(issue_key):
+    def mutate(model):
+        for issues in (model["assigned"], model["watching"]):
+            _move_to_top(issues, issue_key)
+    return mutate
+
+def unwatch(issue_key):
+    def mutate(model):
+        issue = _find(model["watching"], issue_key)
+        if issue:
+            model["watching"].remove(issue)
+    return mutate
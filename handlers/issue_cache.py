@@ -0,0 +1,164 @@
+import json
+import os
+from datetime import datetime
+import redis.exceptions
+from handlers.redis_access import redis_mget, redis_watch_update
+
+ISSUE_CACHE_TTL = int(os.getenv("ISSUE_CACHE_TTL_SECONDS", str(60 * 60 * 24 * 7)))
+TOMBSTONE_TTL = 60 * 60 * 24
+# Everything Home, /summarize and the DM agent read from an issue; comments only when asked for
+BASE_ISSUE_FIELDS = "summary,description,status,issuetype,assignee,priority,project,created,updated"
+ISSUE_FIELDS = BASE_ISSUE_FIELDS + ",comment"
+DEFAULT_AVATAR = "https://cdn-icons-png.flaticon.com/512/149/149071.png"
+
+# Normalized entry, one Redis key per issue:
+# {"key", "summary", "description", "description_head", "status", "type", "priority",
+#  "assignee", "assignee_pic", "project", "created", "updated", "version", "comments"}
+# "version" is ``updated`` in epoch ms; "comments" is None when the source carried no comment field.
+
+
+def _issue_key(issue_key):
+    return f"jira_issue:{issue_key}"
+
+def issue_version(updated):
+    # Jira renders timestamps in the caller's timezone, so compare instants rather than strings
+    try:
+        return int(datetime.strptime(updated, "%Y-%m-%dT%H:%M:%S.%f%z").timestamp() * 1000)
+    except (TypeError, ValueError):
+        return 0
+
+def _adf_blocks(adf):
+    if not isinstance(adf, dict):
+        return []
+    return [
+        [inline.get("text", "") for inline in block.get("content", []) if "text" in inline]
+        for block in adf.get("content", [])
+    ]
+
+def _description(body):
+    # REST v3 returns Atlassian Document Format; webhook deliveries carry the body as a wiki-markup string
+    if isinstance(body, str):
+        lines = [line.strip() for line in body.splitlines() if line.strip()]
+        return " ".join(body.split()), lines[0] if lines else ""
+    blocks = _adf_blocks(body)
+    return " ".join(text for block in blocks for text in block).strip(), blocks[0][0] if blocks and blocks[0] else ""
+
+def normalize_comment(comment):
+    body = comment.get("body")
+    if isinstance(body, str):
+        text = " ".join(body.split())
+    else:
+        parts = []
+        for para in (body or {}).get("content", []):
+            for token in para.get("content", []):
+                if token.get("type") == "text":
+                    parts.append(token.get("text", ""))
+                elif token.get("type") == "mention":
+                    parts.append(token.get("attrs", {}).get("text", ""))
+        text = " ".join(parts).strip()
+    return {
+        "id": comment.get("id"),
+        "author": (comment.get("author") or {}).get("displayName", "Someone"),
+        "text": text,
+        "created": comment.get("created", "")
+    }
+
+def normalize_issue(issue):
+    """Flatten a REST or webhook issue into the cached entry."""
+    fields = issue.get("fields") or {}
+    description, description_head = _description(fields.get("description"))
+    assignee = fields.get("assignee")
+    comment_field = fields.get("comment")
+    return {
+        "key": issue["key"],
+        "summary": fields.get("summary", ""),
+        "description": description,
+        "description_head": description_head,
+        "status": (fields.get("status") or {}).get("name", ""),
+        "type": (fields.get("issuetype") or {}).get("name", ""),
+        "priority": (fields.get("priority") or {}).get("name", ""),
+        "assignee": assignee.get("displayName") if assignee else None,
+        "assignee_pic": assignee.get("avatarUrls", {}).get("48x48", DEFAULT_AVATAR) if assignee else DEFAULT_AVATAR,
+        "project": (fields.get("project") or {}).get("name", ""),
+        "created": fields.get("created", ""),
+        "updated": fields.get("updated", ""),
+        "version": issue_version(fields.get("updated")),
+        "comments": [normalize_comment(c) for c in comment_field.get("comments", [])] if isinstance(comment_field, dict) else None
+    }
+
+async def get_cached_issues(keys):
+    """Return {key: entry} for the issues present in the cache."""
+    try:
+        raws = await redis_mget("issues.get", [_issue_key(k) for k in keys])
+    except redis.exceptions.RedisError as e:
+        print(f"⚠️ Issue cache read failed: {e}")
+        return {}
+    entries = {}
+    for key, raw in zip(keys, raws):
+        if raw:
+            entry = json.loads(raw)
+            if not entry.get("deleted"):
+                entries[key] = entry
+    return entries
+
+async def _update_entry(issue_key, merge):
+    # Optimistic read-modify-write: webhooks for one issue can arrive concurrently on different workers
+    def update(raw):
+        entry = merge(json.loads(raw) if raw else None)
+        if entry is None:
+            return None
+        return json.dumps(entry), TOMBSTONE_TTL if entry.get("deleted") else ISSUE_CACHE_TTL
+    await redis_watch_update("issues.update", _issue_key(issue_key), update)
+
+async def save_issue(entry):
+    def merge(current):
+        if current and current.get("version", 0) > entry["version"]:
+            return None
+        if current and entry["comments"] is None and current.get("version") == entry["version"]:
+            # A projection without comments must not wipe the ones we already have for this version
+            return {**entry, "comments": current.get("comments")}
+        return entry
+    try:
+        await _update_entry(entry["key"], merge)
+    except redis.exceptions.RedisError as e:
+        print(f"⚠️ Issue cache write failed for {entry['key']}: {e}")
+
+async def save_issues(entries):
+    for entry in entries:
+        await save_issue(entry)
+
+async def delete_issue(issue_key, timestamp):
+    # Tombstone so a late issue_updated delivery cannot resurrect the issue
+    await _update_entry(issue_key, lambda current: {"key": issue_key, "deleted": True, "version": timestamp})
+
+async def apply_comment_event(issue_key, comment, deleted=False):
+    def merge(current):
+        if not current or current.get("deleted") or current.get("comments") is None:
+            return None
+        comments = [c for c in current["comments"] if c.get("id") != comment.get("id")]
+        if not deleted:
+            comments.append(normalize_comment(comment))
+        # Commenting bumps the issue's updated time; track it so the next version probe still hits
+        version = max(current.get("version", 0), issue_version(comment.get("updated")))
+        return {**current, "comments": comments, "version": version}
+    await _update_entry(issue_key, merge)
+
+async def apply_webhook_event(event):
+    """Apply one Jira webhook delivery to the cache. Returns the affected issue key, if any."""
+    webhook_event = event.get("webhookEvent", "")
+    issue = event.get("issue") or {}
+    issue_key = issue.get("key")
+    if not issue_key:
+        return None
+
+    if webhook_event in ("jira:issue_created", "jira:issue_updated"):
+        await save_issue(normalize_issue(issue))
+    elif webhook_event == "jira:issue_deleted":
+        await delete_issue(issue_key, event.get("timestamp") or issue_version(issue.get("fields", {}).get("updated")))
+    elif webhook_event in ("comment_created", "comment_updated"):
+        await apply_comment_event(issue_key, event.get("comment") or {})
+    elif webhook_event == "comment_deleted":
+        await apply_comment_event(issue_key, event.get("comment") or {}, deleted=True)
+    else:
+        return None
+    return issue_key
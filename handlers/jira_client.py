@@ -1,47 +1,56 @@
 import asyncio
-import os,json
+import re
+import time
+import uuid
+import os
 from handlers.userfetch import resolve_user
 from handlers.jira_token_store import get_valid_jira_token
-from pathlib import Path
+from handlers.field_store import get_cached_fields, load_shared_fields, save_shared_fields
+from handlers.search_cache import cached_search, record_search_fetch
+from handlers.home_model import save_home_model
+from handlers.jql import jql_string, jql_text
+from handlers.similarity_index import find_similar
+from handlers.issue_cache import BASE_ISSUE_FIELDS, ISSUE_FIELDS, issue_version, normalize_issue, get_cached_issues, save_issues
 JIRA_DOMAIN = os.getenv("JIRA_DOMAIN")
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_MB", "100")) * 1024 * 1024
+ATTACHMENT_CHUNK_SIZE = 256 * 1024
+# Uploads relayed at once per worker; each holds roughly one chunk in memory
+_attachment_slots = asyncio.Semaphore(int(os.getenv("ATTACHMENT_CONCURRENCY", "3")))
+_cache_write_tasks = set()
+# "An issue with key 'SHOP-9' does not exist for field 'key'."
+_MISSING_KEY = re.compile(r"key '([A-Z][A-Z0-9_]*-\d+)' does not exist")
 
 
-def extract_adf_text(adf):
-    if not isinstance(adf, dict):
-        return ""
-    text = ""
-    for block in adf.get("content", []):
-        for inline in block.get("content", []):
-            text += inline.get("text", "") + " "
-    return text.strip()
 # --- Fetching Fields ---
 async def fetch_issue_fields(slack_user_id,project_key, issue_type_id,http_client):
-    path = Path(f"fields/{project_key}/{issue_type_id}.json")
-    if path.exists():
-        with await asyncio.to_thread(open, path, "r") as f:
-            return json.load(f)
-        
-    else:
-        token_info = await get_valid_jira_token(slack_user_id,http_client)
-        access_token = token_info["access_token"]
-        cloud_id = token_info["cloud_id"]
+    fields = get_cached_fields(project_key, issue_type_id)
+    if fields is not None:
+        return fields
+    fields = await load_shared_fields(project_key, issue_type_id)
+    if fields is not None:
+        return fields
 
-        url = f"https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/issue/createmeta/{project_key}/issuetypes/{issue_type_id}"
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Accept": "application/json"
-        }
+    token_info = await get_valid_jira_token(slack_user_id,http_client)
+    access_token = token_info["access_token"]
+    cloud_id = token_info["cloud_id"]
+
+    url = f"https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/issue/createmeta/{project_key}/issuetypes/{issue_type_id}"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Accept": "application/json"
+    }
 
-        response = await http_client.get(url, headers=headers)
+    response = await http_client.get(url, headers=headers)
 
-        if response.status_code == 200:
-            fields=response.json().get("fields", [])
-            if isinstance(fields, list):
-                fields = {f["key"]: f for f in fields if "key" in f}
-            return fields
-        else:
-            print(f"Error fetching fields: {response.status_code} {response.text}")
-            return []
+    if response.status_code == 200:
+        fields=response.json().get("fields", [])
+        if isinstance(fields, list):
+            fields = {f["key"]: f for f in fields if "key" in f}
+        await save_shared_fields(project_key, issue_type_id, fields)
+        return fields
+    else:
+        print(f"Error fetching fields: {response.status_code} {response.text}")
+        return None
 # --- Building Payload ---
 def build_jira_payload_from_submission(state_values, project_key, issue_type_id):
     fields_payload = {
@@ -82,67 +91,60 @@ def build_jira_payload_from_submission(state_values, project_key, issue_type_id)
         fields_payload.pop("assignee", None)
     return {"fields": fields_payload}
 
-def extract_comment_text(comment):
-    body = comment.get("body", {})
-    parts = []
-
-    for para in body.get("content", []):
-        for token in para.get("content", []):
-            if token.get("type") == "text":
-                parts.append(token.get("text", ""))
-            elif token.get("type") == "mention":
-                parts.append(token.get("attrs", {}).get("text", ""))
-    return " ".join(parts).strip()
-
-async def search_similar_tickets(slack_user_id,summary, project_key, issue_type_name,http_client):
+async def search_similar_tickets(slack_user_id,summary, project_key, issue_type_name,http_client, description=""):
     token_info = await get_valid_jira_token(slack_user_id,http_client)
     if not token_info:
         raise Exception("Jira account not connected")
     access_token = token_info["access_token"]
     cloud_id = token_info["cloud_id"]
-    jql = f'''
-        project = {project_key} AND
-        issuetype = "{issue_type_name}" AND
-        summary ~ "{summary}" 
-        ORDER BY created DESC
-    '''.strip()
-
-    url = f"https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/search"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Accept": "application/json"
-    }
 
-    response = await http_client.get(url, headers=headers, params={
-        "jql": jql,
-        "fields": "summary,status,comment,description",
-        "maxResults": 5
-    })
-
-    if response.status_code != 200:
-        print(f"Error searching tickets: {response.status_code} {response.text}")
-        return []
-
-    issues = response.json().get("issues", [])
-    results = []
-
-    for issue in issues:
-        fields = issue.get("fields", {})
-        comments = fields.get("comment", {}).get("comments", [])
-        all_comments_text= "\n".join(
-            f"- {c.get('author', {}).get('displayName', 'Someone')}: {extract_comment_text(c)}"
-            for c in comments
+    async def fetch_page(jql, fields, next_page_token):
+        params = {"jql": jql, "fields": fields, "maxResults": 100}
+        if next_page_token:
+            params["nextPageToken"] = next_page_token
+        return await _jql_search(access_token, cloud_id, params, http_client, "similar_sync")
+
+    try:
+        ranked = await find_similar(project_key, summary, description, issue_type_name, fetch_page)
+    except Exception as e:
+        print(f"⚠️ Similarity index lookup failed, falling back to text search: {e}")
+        ranked = None
+
+    if ranked is None:
+        # Index still cold for this project: Jira text search, with the title safely quoted
+        jql = (
+            f"project = {jql_string(project_key)} AND issuetype = {jql_string(issue_type_name)} "
+            f"AND summary ~ {jql_text(summary)} ORDER BY created DESC"
         )
-        plain_desc = extract_adf_text(fields.get("description"))
+    elif ranked:
+        jql = f"key in ({','.join(key for key, _ in ranked)})"
+    else:
+        return []
 
-        results.append({
+    # Either way the candidates are re-read with the user's token, so only issues they can see come back
+    errors = []
+    page = await fetch_issues(access_token, cloud_id, jql, http_client, "similar", 5, need_comments=True, errors=errors)
+    if page is None and ranked:
+        # Jira rejects the whole query over one deleted, moved or hidden key; retry without the ones it named
+        gone = set(_MISSING_KEY.findall(" ".join(errors)))
+        ranked = [(key, score) for key, score in ranked if key not in gone]
+        if gone and ranked:
+            jql = f"key in ({','.join(key for key, _ in ranked)})"
+            page = await fetch_issues(access_token, cloud_id, jql, http_client, "similar", 5, need_comments=True)
+    if page is None:
+        return []
+    order = {key: i for i, (key, _) in enumerate(ranked or [])}
+    issues = sorted(page[0], key=lambda issue: order.get(issue["key"], 0))
+    return [
+        {
             "key": issue["key"],
-            "summary": fields.get("summary", ""),
-            "status": fields.get("status", {}).get("name", ""),
-            "description": plain_desc.strip(),
-            "last_comment":  all_comments_text.strip()
-        })
-    return results
+            "summary": issue["summary"],
+            "status": issue["status"],
+            "description": issue["description"],
+            "last_comment": "\n".join(f"- {c['author']}: {c['text']}" for c in issue["comments"] or [])
+        }
+        for issue in issues
+    ]
 
 # --- Ticket Creation ---
 async def create_jira_ticket(slack_user_id, payload,http_client):
@@ -168,22 +170,58 @@ async def create_jira_ticket(slack_user_id, payload,http_client):
     issue_key = response.json()["key"]
     return f"https://{JIRA_DOMAIN}/browse/{issue_key}"
 
-async def attach_file_to_ticket(slack_user_id,issue_key, filename, file_bytes,http_client):
+class AttachmentTooLarge(Exception):
+    pass
+
+async def attach_file_to_ticket(slack_user_id,issue_key, filename, file_url,http_client, size=None):
+    """Stream a Slack file into a Jira attachment upload, one chunk in memory at a time."""
+    if size and size > ATTACHMENT_MAX_BYTES:
+        raise AttachmentTooLarge(size)
     token_info = await get_valid_jira_token(slack_user_id,http_client)
     if not token_info:
         raise Exception("Jira account not connected. Please run /connectjira")
     access_token = token_info["access_token"]
     cloud_id = token_info["cloud_id"]
     url = f"https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/issue/{issue_key}/attachments"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "X-Atlassian-Token": "no-check"
-    }
-    files = {
-        "file": (filename, file_bytes)
-    }
 
-    response = await http_client.post(url, headers=headers, files=files)
+    # Hand-rolled multipart so the body can be an async stream instead of in-memory bytes
+    boundary = uuid.uuid4().hex
+    safe_name = filename.replace('"', "%22").replace("\r", "").replace("\n", "")
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{safe_name}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+
+    async with _attachment_slots:
+        slack_headers = {"Authorization": f"Bearer {os.getenv('SLACK_BOT_TOKEN')}"}
+        async with http_client.stream("GET", file_url, headers=slack_headers) as download:
+            if download.status_code != 200:
+                print(f"File download failed: {download.status_code} {file_url}")
+                return False
+            length = download.headers.get("Content-Length")
+            if length and int(length) > ATTACHMENT_MAX_BYTES:
+                raise AttachmentTooLarge(int(length))
+
+            async def body():
+                sent = 0
+                yield head
+                async for chunk in download.aiter_bytes(ATTACHMENT_CHUNK_SIZE):
+                    sent += len(chunk)
+                    if sent > ATTACHMENT_MAX_BYTES:
+                        raise AttachmentTooLarge(sent)
+                    yield chunk
+                yield tail
+
+            headers = {
+                "Authorization": f"Bearer {access_token}",
+                "X-Atlassian-Token": "no-check",
+                "Content-Type": f"multipart/form-data; boundary={boundary}"
+            }
+            if length and not download.headers.get("Content-Encoding"):
+                headers["Content-Length"] = str(len(head) + int(length) + len(tail))
+            response = await http_client.post(url, headers=headers, content=body())
 
     if response.status_code in (200, 201):
         return True
@@ -192,6 +230,33 @@ async def attach_file_to_ticket(slack_user_id,issue_key, filename, file_bytes,ht
         return False
 
 async def build_home_view_for_user(user_id, client,access_token,cloud_id,http_client):
+    assigned, watching = await asyncio.gather(
+    fetch_assigned_issues(access_token, cloud_id, user_id, client,http_client),
+    fetch_watching_issues(access_token, cloud_id, user_id, client,http_client)
+    )
+    await save_home_model(user_id, assigned, watching)
+    return render_home_view(assigned, watching)
+
+def show_more_block(list_name, jira_url):
+    return {
+        "type": "actions",
+        "elements": [
+            {
+                "type": "button",
+                "text": {"type": "plain_text", "text": "📄 Show more", "emoji": True},
+                "value": list_name,
+                "action_id": "home_show_more"
+            },
+            {
+                "type": "button",
+                "text": {"type": "plain_text", "text": "🔗 Open in Jira", "emoji": True},
+                "url": jira_url,
+                "action_id": "jiralink"
+            }
+        ]
+    }
+
+def render_home_view(assigned, watching):
     greeting = {
     "type": "section",
     "text": {
@@ -219,31 +284,13 @@ Let’s get things moving 🚀"""
         "type": "mrkdwn",
         "text":f"\n\n" 
     }}]
-    assigned, watching = await asyncio.gather(
-    fetch_assigned_issues(access_token, cloud_id, user_id, client,http_client),
-    fetch_watching_issues(access_token, cloud_id, user_id, client,http_client)
-    )
     if assigned:
         blocks.append({"type": "header", "text": {"type": "plain_text", "text": "🧑‍💻 Assigned to You"}})
         blocks.append({"type": "divider"}) 
-        for issue in assigned[:3]:
+        for issue in assigned[:HOME_ISSUE_LIMIT]:
             blocks += ticket_block(issue)
-        if len(assigned)>3:
-            blocks.append({
-            "type": "actions",
-            "elements": [
-                {
-                    "type": "button",
-                    "text": {
-                        "type": "plain_text",
-                        "text": f"🔗 View {len(assigned)-3} more in Jira",
-                        "emoji": True
-                    },
-                    "url": f"https://{JIRA_DOMAIN}/issues/?jql=assignee=currentUser()%20AND%20statusCategory!=Done%20ORDER%20BY%20updated%20DESC",
-                    "action_id": "jiralink" 
-                }
-            ]
-        })
+        if len(assigned)>HOME_ISSUE_LIMIT:
+            blocks.append(show_more_block("assigned", f"https://{JIRA_DOMAIN}/issues/?jql=assignee=currentUser()%20AND%20statusCategory!=Done%20ORDER%20BY%20updated%20DESC"))
     elif watching:
         blocks.append({
     "type": "section",
@@ -259,24 +306,10 @@ Let’s get things moving 🚀"""
     if watching:
         blocks.append({"type": "header", "text": {"type": "plain_text", "text": "👁️ Watching"}})
         blocks.append({"type": "divider"}) 
-        for issue in watching[:3]:
+        for issue in watching[:HOME_ISSUE_LIMIT]:
             blocks += ticket_block(issue)
-        if len(watching)>3:
-            blocks.append({
-            "type": "actions",
-            "elements": [
-                {
-                    "type": "button",
-                    "text": {
-                        "type": "plain_text",
-                        "text": f"🔗 View {len(watching)-3} more in Jira",
-                        "emoji": True
-                    },
-                    "url": f"https://{JIRA_DOMAIN}/issues/?jql=issue%20in%20watchedIssues()%20AND%20(assignee%20is%20EMPTY%20OR%20assignee%20!=%20currentUser())%20AND%20statusCategory%20!=%20Done%20ORDER%20BY%20updated%20DESC",  # or build dynamic link
-                    "action_id": "jiralink"
-                }
-            ]
-        })
+        if len(watching)>HOME_ISSUE_LIMIT:
+            blocks.append(show_more_block("watching", f"https://{JIRA_DOMAIN}/issues/?jql=issue%20in%20watchedIssues()%20AND%20(assignee%20is%20EMPTY%20OR%20assignee%20!=%20currentUser())%20AND%20statusCategory%20!=%20Done%20ORDER%20BY%20updated%20DESC"))
     elif assigned:
         blocks.append({
     "type": "section",
@@ -311,94 +344,105 @@ Let’s get things moving 🚀"""
 
     return blocks
 
-async def fetch_assigned_issues(access_token, cloud_id, slack_user_id, client,http_client):
-    url = f"https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/search"
-    headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
-    jql = "assignee = currentUser() and statusCategory != Done ORDER BY updated DESC"
+ASSIGNED_JQL = "assignee = currentUser() and statusCategory != Done ORDER BY updated DESC"
+WATCHING_JQL = "watcher = currentUser() and (assignee is EMPTY OR assignee != currentuser()) and statusCategory != Done ORDER BY updated DESC"
+HOME_LISTS = {"assigned": ASSIGNED_JQL, "watching": WATCHING_JQL}
+HOME_ISSUE_LIMIT = 3
+ISSUE_PAGE_SIZE = 10
 
-    response = await http_client.get(url, headers=headers, params={
-        "jql": jql,
-        "fields": "summary,description,status,issuetype,assignee,priority",
-        "maxResults": 5
-    })
-    if response.status_code != 200:
-        print(f"❌ Failed to fetch assigned issues: {response.text}")
-        return []
-    issues = []
-    for issue in response.json().get("issues", []):
-        fields = issue["fields"]
-        # Description (safe extraction from ADF)
-        try:
-            desc = fields.get("description", {})
-            desc_text = desc.get("content", [{}])[0].get("content", [{}])[0].get("text", "")
-        except Exception:
-            desc_text = ""
-
-        # Assignee Slack info
-        assignee_display = "Unassigned"
-        assignee_image = "https://cdn-icons-png.flaticon.com/512/149/149071.png"  # fallback
-        assignee_id = None
-
-        if fields.get("assignee"):
-            assignee_display = fields["assignee"].get("displayName")
-            assignee_image=fields["assignee"]["avatarUrls"]["48x48"]
-        issues.append({
-            "key": issue["key"],
-            "summary": fields["summary"],
-            "description": desc_text,
-            "status": fields["status"]["name"],
-            "type": fields["issuetype"]["name"],
-            "type_icon": type_icon(fields["issuetype"]["name"]),
-            "assignee": assignee_display,
-            "assignee_pic": assignee_image,
-            "assignee_id": assignee_id,
-            "priority": fields["priority"]["name"] if fields.get("priority") else "N/A",
-            "priority_icon": priority_emoji(fields.get("priority", {}).get("name", ""))
-        })
-
-    return issues
+def home_issue_from_entry(entry):
+    return {
+        "key": entry["key"],
+        "summary": entry["summary"],
+        "description": entry["description_head"],
+        "status": entry["status"],
+        "type": entry["type"],
+        "type_icon": type_icon(entry["type"]),
+        "assignee": entry["assignee"] or "Unassigned",
+        "assignee_pic": entry["assignee_pic"],
+        "assignee_id": None,
+        "priority": entry["priority"] or "N/A",
+        "priority_icon": priority_emoji(entry["priority"] or "")
+    }
 
-async def fetch_watching_issues(access_token, cloud_id, slack_user_id, client,http_client):
-    url = f"https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/search"
+async def _jql_search(access_token, cloud_id, params, http_client, label, errors=None):
+    url = f"https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/search/jql"
     headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
-    jql = "watcher = currentUser() and (assignee is EMPTY OR assignee != currentuser()) and statusCategory != Done ORDER BY updated DESC"
-
-    response = await http_client.get(url, headers=headers, params={
-        "jql": jql,
-        "fields": "summary,description,status,issuetype,assignee,priority",
-    })
+    started = time.monotonic()
+    response = await http_client.get(url, headers=headers, params=params)
+    record_search_fetch(label, len(response.content), time.monotonic() - started)
     if response.status_code != 200:
-        print(f"❌ Failed to fetch watched issues: {response.text}")
-        return []
+        print(f"❌ Failed to fetch {label} issues: {response.text}")
+        if errors is not None:
+            errors.append(response.text)
+        return None
+    return response.json()
+
+async def fetch_issues(access_token, cloud_id, jql, http_client, label, max_results, next_page_token=None, need_comments=False, errors=None):
+    """Run ``jql`` and return (entries, next_page_token), or None on failure (Jira's error bodies go to ``errors``).
+
+    Jira is only asked for keys and ``updated``; bodies come from the issue cache when its
+    version matches, and the rest are fetched in one follow-up search and written through.
+    The probe runs with the caller's token, so the cache never widens what a user can see.
+    """
+    params = {"jql": jql, "fields": "updated", "maxResults": max_results}
+    if next_page_token:
+        params["nextPageToken"] = next_page_token
+    data = await _jql_search(access_token, cloud_id, params, http_client, label, errors)
+    if data is None:
+        return None
+    probes = [(issue["key"], issue_version(issue.get("fields", {}).get("updated"))) for issue in data.get("issues", [])]
+    next_page_token = None if data.get("isLast", True) else data.get("nextPageToken")
+
+    cached = await get_cached_issues([key for key, _ in probes])
+    entries = {
+        key: cached[key] for key, version in probes
+        if key in cached and cached[key]["version"] == version and (not need_comments or cached[key]["comments"] is not None)
+    }
+    missing = [key for key, _ in probes if key not in entries]
+    if missing:
+        data = await _jql_search(access_token, cloud_id, {
+            "jql": f"key in ({','.join(missing)})",
+            "fields": ISSUE_FIELDS if need_comments else BASE_ISSUE_FIELDS,
+            "maxResults": len(missing)
+        }, http_client, f"{label}_bodies")
+        if data is None:
+            return None
+        fetched = [normalize_issue(issue) for issue in data.get("issues", [])]
+        entries.update((entry["key"], entry) for entry in fetched)
+        task = asyncio.create_task(_save_fetched(fetched))
+        _cache_write_tasks.add(task)
+        task.add_done_callback(_cache_write_tasks.discard)
+    return [entries[key] for key, _ in probes if key in entries], next_page_token
+
+async def _save_fetched(entries):
+    try:
+        await save_issues(entries)
+    except Exception as e:
+        print(f"⚠️ Issue cache write failed: {e}")
+
+async def search_issue_page(access_token, cloud_id, jql, http_client, label, max_results, next_page_token=None):
+    """One page of Home-style issues. Returns (issues, next_page_token), or None on failure."""
+    page = await fetch_issues(access_token, cloud_id, jql, http_client, label, max_results, next_page_token)
+    if page is None:
+        return None
+    entries, next_page_token = page
+    return [home_issue_from_entry(entry) for entry in entries], next_page_token
+
+async def _search_home_issues(access_token, cloud_id, jql, http_client, label):
+    # One issue beyond what the tab renders tells us whether to offer "Show more"
+    page = await search_issue_page(access_token, cloud_id, jql, http_client, label, HOME_ISSUE_LIMIT + 1)
+    return page[0] if page else None
 
-    issues = []
-    for issue in response.json().get("issues", []):
-        fields = issue["fields"]
-        try:
-            desc = fields.get("description", {})
-            desc_text = desc.get("content", [{}])[0].get("content", [{}])[0].get("text", "")
-        except Exception:
-            desc_text = ""
-        assignee_display = "Unassigned"
-        assignee_image = "https://cdn-icons-png.flaticon.com/512/149/149071.png"
-        assignee_id = None
-        if fields.get("assignee"):
-            assignee_display = fields["assignee"].get("displayName")
-            assignee_image=fields["assignee"]["avatarUrls"]["48x48"]
-        issues.append({
-            "key": issue["key"],
-            "summary": fields["summary"],
-            "description": desc_text,
-            "status": fields["status"]["name"],
-            "type": fields["issuetype"]["name"],
-            "type_icon": type_icon(fields["issuetype"]["name"]),
-            "assignee": assignee_display,
-            "assignee_pic": assignee_image,
-            "assignee_id": assignee_id,
-            "priority": fields["priority"]["name"] if fields.get("priority") else "N/A",
-            "priority_icon": priority_emoji(fields.get("priority", {}).get("name", ""))
-        })
-    return issues
+async def fetch_assigned_issues(access_token, cloud_id, slack_user_id, client,http_client):
+    issues = await cached_search(slack_user_id, ASSIGNED_JQL, lambda: _search_home_issues(
+        access_token, cloud_id, ASSIGNED_JQL, http_client, "assigned"))
+    return issues or []
+
+async def fetch_watching_issues(access_token, cloud_id, slack_user_id, client,http_client):
+    issues = await cached_search(slack_user_id, WATCHING_JQL, lambda: _search_home_issues(
+        access_token, cloud_id, WATCHING_JQL, http_client, "watched"))
+    return issues or []
 
 def ticket_block(issue):
     if not isinstance(issue, dict):
@@ -477,7 +521,7 @@ async def build_adf_comment(comment_text, slack_user_ids, client,access_token,cl
     if slack_user_ids:
         for uid in slack_user_ids:
             try:
-                token_info = await get_valid_jira_token(uid,http_client)
+                token_info = await get_valid_jira_token(uid,http_client,active=False)
                 if not token_info:
                     target_email=await resolve_user(uid,client,get_id="email")
                     url = f"https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/user/search?query={target_email}"
@@ -1,140 +1,367 @@
 import os
 import json
+import asyncio
+import heapq
+from collections import OrderedDict
+import redis.exceptions
 from handlers.app_state import redis_client
+from handlers.redis_access import record_rtt, redis_pipeline, redis_setex
 from datetime import datetime, timedelta, timezone
-from handlers.jira_models import JiraToken, SessionLocal
+from sqlalchemy import delete, select
+from cryptography.fernet import InvalidToken
+from handlers.jira_models import JiraToken, AsyncSessionLocal, fernet
 
 
 
-_token_cache = {}
 IN_MEMORY_CACHE_TTL = timedelta(minutes=3)
+JIRA_OAUTH_TOKEN_URL = os.getenv("JIRA_OAUTH_TOKEN_URL", "https://auth.atlassian.com/oauth/token")
+REFRESH_LOCK_TIMEOUT = 30
+REFRESH_LOCK_WAIT = 15
+_refresh_inflight = {}
+# Atlassian's answers for a refresh token that will never work again
+PERMANENT_REFRESH_ERRORS = ("invalid_grant", "unauthorized_client")
 
-def _clean_token_cache():
-    now = datetime.now(timezone.utc)
-    expired_keys = []
-    for uid, entry in _token_cache.items():
-        token_expired = False
-        token_obj = entry["token"]
-        if isinstance(token_obj, dict):
-            token_expired = token_obj.get("expires_at") and datetime.fromisoformat(token_obj["expires_at"]) <= now
-        elif hasattr(token_obj, "token_expires_at"):
-            token_expired = token_obj.token_expires_at <= now
+# Background refresher settings
+TOKEN_REFRESH_HORIZON = timedelta(minutes=int(os.getenv("TOKEN_REFRESH_HORIZON_MINUTES", "10")))
+TOKEN_REFRESH_INTERVAL = int(os.getenv("TOKEN_REFRESH_INTERVAL_SECONDS", "120"))
+TOKEN_REFRESH_CONCURRENCY = int(os.getenv("TOKEN_REFRESH_CONCURRENCY", "5"))
+ACTIVE_USER_WINDOW = timedelta(hours=int(os.getenv("ACTIVE_USER_WINDOW_HOURS", "24")))
+REDIS_ACTIVE_USERS_KEY = "jira_token:active"
+TOKEN_CACHE_MAX_SIZE = int(os.getenv("TOKEN_CACHE_MAX_SIZE", "5000"))
 
-        if token_expired or entry["expires_at"] <= now:
-            expired_keys.append(uid)
+class RefreshTokenRevoked(Exception):
+    """The stored refresh token is missing or was rejected for good; the user has to reconnect Jira."""
 
-    for uid in expired_keys:
-        del _token_cache[uid]
-        print(f"🧹 Removed expired token for {uid}")
 
+class _TokenCacheEntry:
+    __slots__ = ("token", "expires_at")
 
-async def save_jira_token(slack_user_id, access_token, refresh_token, expires_in, cloud_id, account_id, display_name):
-    session = SessionLocal()
-    token = session.get(JiraToken, slack_user_id)
-    if not token:
-        token = JiraToken(slack_user_id=slack_user_id)
-        session.add(token)
+    def __init__(self, token, expires_at):
+        self.token = token
+        self.expires_at = expires_at
+
+
+class TokenCache:
+    """Bounded LRU of decrypted tokens with a heap of expiry times, so lookups and expiry are amortized O(1)."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._expiry_heap = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, now):
+        self._expire(now)
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= now:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.token
+
+    def set(self, key, token, expires_at):
+        self._entries[key] = _TokenCacheEntry(token, expires_at)
+        self._entries.move_to_end(key)
+        heapq.heappush(self._expiry_heap, (expires_at, key))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        # Drop stale heap entries left behind by overwrites and LRU evictions
+        if len(self._expiry_heap) > 2 * self.max_size:
+            self._expiry_heap = [(e.expires_at, k) for k, e in self._entries.items()]
+            heapq.heapify(self._expiry_heap)
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._expiry_heap.clear()
+
+    def _expire(self, now):
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at == expires_at:
+                del self._entries[key]
+                self.expirations += 1
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+    def __len__(self):
+        return len(self._entries)
 
+
+_token_cache = TokenCache(TOKEN_CACHE_MAX_SIZE)
+
+def _cache_in_memory(slack_user_id, result, token_expires_at, now):
+    # Entry lives for IN_MEMORY_CACHE_TTL but never past the token's own expiry
+    expires_at = min(now + IN_MEMORY_CACHE_TTL, token_expires_at)
+    _token_cache.set(slack_user_id, result, expires_at.timestamp())
+
+def get_token_cache_stats():
+    return _token_cache.stats()
+
+
+async def save_jira_token(slack_user_id, access_token, refresh_token, expires_in, cloud_id, account_id, display_name):
     now = datetime.now(timezone.utc)
     expires_at = now + timedelta(seconds=expires_in)
-    token.account_id = account_id
-    token.display_name = display_name
-    token.set_token(access_token)
-    token.set_refresh_token(refresh_token)
-    token.token_expires_at = expires_at
-    token.cloud_id = cloud_id
-    token.connected_at = now
-
-    session.commit()
-    session.close()
-
-    # Cache to Redis with token expiry as TTL
+    async with AsyncSessionLocal() as session:
+        token = await session.get(JiraToken, slack_user_id)
+        if not token:
+            token = JiraToken(slack_user_id=slack_user_id)
+            session.add(token)
+
+        token.account_id = account_id
+        token.display_name = display_name
+        token.set_token(access_token)
+        token.set_refresh_token(refresh_token)
+        token.token_expires_at = expires_at
+        token.cloud_id = cloud_id
+        token.connected_at = now
+        await session.commit()
+
+    # Cache to Redis with token expiry as TTL (refresh token stays in Postgres)
     redis_key = f"jira_token:{slack_user_id}"
     redis_data = {
         "account_id": account_id,
         "display_name": display_name,
         "access_token": access_token,
-        "refresh_token": refresh_token,
         "cloud_id": cloud_id,
         "expires_at": expires_at.isoformat()
     }
     ttl_seconds = int(expires_in)
-    await redis_client.setex(redis_key, ttl_seconds, json.dumps(redis_data))
+    await redis_setex("token.save", redis_key, ttl_seconds, _seal_token(redis_data))
+    _token_cache.discard(slack_user_id)
 
 
-async def get_valid_jira_token(slack_user_id,http_client):
+async def get_valid_jira_token(slack_user_id,http_client,active=True):
+    """``active=False`` for lookups on someone else's behalf (assignees, mentions), which must not keep their token warm."""
     now = datetime.now(timezone.utc)
-    _clean_token_cache()
 
     # In-memory cache
-    cached = _token_cache.get(slack_user_id)
-    if cached and cached["expires_at"] > now:
+    cached = _token_cache.get(slack_user_id, now.timestamp())
+    if cached:
         print(f"✅ In-memory cache hit for {slack_user_id}")
-        return cached["token"]
+        return cached
 
-    # Redis cache
+    # Redis cache (activity mark and token read share one round-trip)
     redis_key = f"jira_token:{slack_user_id}"
-    redis_data = await redis_client.get(redis_key)
-    if redis_data:
-        token_data = json.loads(redis_data)
+    try:
+        async with redis_pipeline("token.lookup") as pipe:
+            if active:
+                pipe.zadd(REDIS_ACTIVE_USERS_KEY, {slack_user_id: now.timestamp()})
+            pipe.get(redis_key)
+        redis_data = pipe.results[-1]
+    except redis.exceptions.RedisError as e:
+        print(f"⚠️ Redis token lookup failed for {slack_user_id}: {e}")
+        redis_data = None
+    token_data = _open_token(redis_data) if redis_data else None
+    if token_data:
         expires_at = datetime.fromisoformat(token_data["expires_at"])
         if expires_at - now> IN_MEMORY_CACHE_TTL:
             print(f"✅ Redis cache hit for {slack_user_id}")
-            _token_cache[slack_user_id] = {
-                "token": token_data,
-                "expires_at": now + IN_MEMORY_CACHE_TTL
-            }
+            _cache_in_memory(slack_user_id, token_data, expires_at, now)
             return token_data
 
     # Postgres fallback
-    session = SessionLocal()
-    token = session.get(JiraToken, slack_user_id)
-    if not token:
-        session.close()
+    async with AsyncSessionLocal() as session:
+        token = await session.get(JiraToken, slack_user_id)
+        if not token:
+            return None
+        needs_refresh = token.token_expires_at and (token.token_expires_at - now) <= IN_MEMORY_CACHE_TTL
+        if not needs_refresh:
+            result = _token_result(token)
+
+    if needs_refresh:
+        return await _refresh_single_flight(slack_user_id, http_client)
+
+    await _cache_token(slack_user_id, result, token.token_expires_at, now)
+    return result
+
+def _seal_token(token_data):
+    # Redis only ever sees an encrypted envelope; it is opened once into the in-process cache
+    return fernet.encrypt(json.dumps(token_data).encode()).decode()
+
+def _open_token(envelope):
+    try:
+        return json.loads(fernet.decrypt(envelope.encode()))
+    except (InvalidToken, ValueError):
+        print("⚠️ Ignoring unreadable Jira token envelope in Redis")
         return None
-    # Refresh if expired
-    if token.token_expires_at and (token.token_expires_at - now) <= IN_MEMORY_CACHE_TTL:
-        print(f"🔄 Refreshing expired Jira token for user {slack_user_id}")
-        refresh_token = token.get_refresh_token()
-        refresh_response = await http_client.post("https://auth.atlassian.com/oauth/token", json={
-            "grant_type": "refresh_token",
-            "client_id": os.getenv("JIRA_CLIENT_ID"),
-            "client_secret": os.getenv("JIRA_CLIENT_SECRET"),
-            "refresh_token": refresh_token
-        })
-
-        if refresh_response.status_code != 200:
-            session.close()
-            raise Exception("❌ Failed to refresh Jira token.")
-
-        refresh_data = refresh_response.json()
-        new_access_token = refresh_data["access_token"]
-        new_refresh_token = refresh_data.get("refresh_token", refresh_token)
-
-        token.set_token(new_access_token)
-        token.set_refresh_token(new_refresh_token)
-        token.token_expires_at = now + timedelta(seconds=refresh_data.get("expires_in", 3600))
-        session.commit()
-        print("✅ Token refreshed and saved.")
-
-    result = {
+
+def _token_result(token, access_token=None):
+    return {
         "account_id": token.account_id,
         "display_name": token.display_name,
-        "access_token": token.get_token(),
-        "refresh_token": token.get_refresh_token(),
+        "access_token": access_token or token.get_token(),
         "cloud_id": token.cloud_id,
         "expires_at": token.token_expires_at.isoformat()
     }
-    session.close()
 
+async def _cache_token(slack_user_id, result, token_expires_at, now):
     # Set Redis and memory cache to expire at actual token expiration
-    ttl_seconds = int((token.token_expires_at - now).total_seconds())
-    await redis_client.setex(redis_key, ttl_seconds, json.dumps(result))
-    _token_cache[slack_user_id] = {
-        "token": result,
-        "expires_at": now + IN_MEMORY_CACHE_TTL
-    }
-    return result
+    ttl_seconds = int((token_expires_at - now).total_seconds())
+    if ttl_seconds > 0:
+        await redis_setex("token.store", f"jira_token:{slack_user_id}", ttl_seconds, _seal_token(result))
+    _cache_in_memory(slack_user_id, result, token_expires_at, now)
+
+async def _refresh_single_flight(slack_user_id, http_client, horizon=IN_MEMORY_CACHE_TTL):
+    # One refresh per user per process; concurrent callers await the same task
+    task = _refresh_inflight.get(slack_user_id)
+    if task is None:
+        task = asyncio.ensure_future(_refresh_with_lock(slack_user_id, http_client, horizon))
+        _refresh_inflight[slack_user_id] = task
+        task.add_done_callback(lambda _: _refresh_inflight.pop(slack_user_id, None))
+    else:
+        print(f"⏳ Awaiting in-flight Jira token refresh for {slack_user_id}")
+    return await asyncio.shield(task)
+
+async def _refresh_with_lock(slack_user_id, http_client, horizon):
+    # Redis lock so only one gunicorn worker talks to auth.atlassian.com per user
+    lock = redis_client.lock(
+        f"jira_token_refresh:{slack_user_id}",
+        timeout=REFRESH_LOCK_TIMEOUT,
+        blocking_timeout=REFRESH_LOCK_WAIT
+    )
+    acquired = await lock.acquire()
+    if not acquired:
+        raise Exception("❌ Timed out waiting for Jira token refresh.")
+    try:
+        now = datetime.now(timezone.utc)
+        async with AsyncSessionLocal() as session:
+            token = await session.get(JiraToken, slack_user_id)
+            if not token:
+                return None
+            # Another worker may have refreshed while we waited for the lock
+            if token.token_expires_at and (token.token_expires_at - now) <= horizon:
+                print(f"🔄 Refreshing expired Jira token for user {slack_user_id}")
+                refresh_token = token.get_refresh_token() if token.encrypted_refresh_token else ""
+                if not refresh_token:
+                    raise RefreshTokenRevoked(f"❌ No Jira refresh token stored for {slack_user_id}.")
+                refresh_response = await http_client.post(JIRA_OAUTH_TOKEN_URL, json={
+                    "grant_type": "refresh_token",
+                    "client_id": os.getenv("JIRA_CLIENT_ID"),
+                    "client_secret": os.getenv("JIRA_CLIENT_SECRET"),
+                    "refresh_token": refresh_token
+                })
+
+                if refresh_response.status_code != 200:
+                    try:
+                        error = refresh_response.json().get("error")
+                    except ValueError:
+                        error = None
+                    if error in PERMANENT_REFRESH_ERRORS:
+                        raise RefreshTokenRevoked(f"❌ Jira refresh token for {slack_user_id} was rejected: {error}")
+                    raise Exception("❌ Failed to refresh Jira token.")
+
+                refresh_data = refresh_response.json()
+                new_access_token = refresh_data["access_token"]
+                new_refresh_token = refresh_data.get("refresh_token", refresh_token)
+
+                token.set_token(new_access_token)
+                token.set_refresh_token(new_refresh_token)
+                token.token_expires_at = now + timedelta(seconds=refresh_data.get("expires_in", 3600))
+                await session.commit()
+                print("✅ Token refreshed and saved.")
+                result = _token_result(token, access_token=new_access_token)
+            else:
+                print(f"✅ Jira token for {slack_user_id} already refreshed by another worker")
+                result = _token_result(token)
+
+        await _cache_token(slack_user_id, result, token.token_expires_at, now)
+        return result
+    finally:
+        try:
+            await lock.release()
+        except redis.exceptions.LockError:
+            pass
+
+async def refresh_expiring_tokens(http_client):
+    # Refresh tokens of recently active users before they expire so requests never pay for it
+    now = datetime.now(timezone.utc)
+    async with redis_pipeline("token.refresher") as pipe:
+        pipe.zremrangebyscore(REDIS_ACTIVE_USERS_KEY, "-inf", (now - ACTIVE_USER_WINDOW).timestamp())
+        pipe.zrange(REDIS_ACTIVE_USERS_KEY, 0, -1)
+    active_users = pipe.results[1]
+    if not active_users:
+        return 0
+
+    async with AsyncSessionLocal() as session:
+        rows = await session.execute(
+            select(JiraToken.slack_user_id).where(
+                JiraToken.slack_user_id.in_(active_users),
+                JiraToken.token_expires_at <= now + TOKEN_REFRESH_HORIZON
+            )
+        )
+        expiring = rows.scalars().all()
+    if not expiring:
+        return 0
+
+    print(f"🔄 Proactively refreshing {len(expiring)} Jira token(s)...")
+    semaphore = asyncio.Semaphore(TOKEN_REFRESH_CONCURRENCY)
+
+    revoked = []
+
+    async def refresh_one(uid):
+        async with semaphore:
+            try:
+                await _refresh_single_flight(uid, http_client, TOKEN_REFRESH_HORIZON)
+                return True
+            except RefreshTokenRevoked as e:
+                print(f"⚠️ {e} Dropping {uid} from background refresh.")
+                revoked.append(uid)
+                return False
+            except Exception as e:
+                print(f"⚠️ Background refresh failed for {uid}: {e}")
+                return False
+
+    results = await asyncio.gather(*(refresh_one(uid) for uid in expiring))
+    if revoked:
+        # Retrying can never succeed; the next request of theirs asks them to reconnect instead
+        record_rtt("token.refresher")
+        await redis_client.zrem(REDIS_ACTIVE_USERS_KEY, *revoked)
+    refreshed = sum(results)
+    print(f"✅ Background refresh complete: {refreshed}/{len(expiring)} token(s) refreshed.")
+    return refreshed
+
+async def run_token_refresher(http_client):
+    while True:
+        try:
+            await refresh_expiring_tokens(http_client)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Token refresher run failed: {e}")
+        await asyncio.sleep(TOKEN_REFRESH_INTERVAL)
+
+async def get_jira_token_record(slack_user_id):
+    async with AsyncSessionLocal() as session:
+        return await session.get(JiraToken, slack_user_id)
+
+async def get_slack_user_ids(account_id):
+    """Slack users connected to the Jira account ``account_id``."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(JiraToken.slack_user_id).where(JiraToken.account_id == account_id))
+        return list(result.scalars())
+
+async def delete_all_jira_tokens():
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(JiraToken))
+        await session.commit()
+
 async def reset_user():
     async for key in redis_client.scan_iter("jira_token:*"):
             await redis_client.delete(key)
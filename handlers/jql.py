@@ -0,0 +1,14 @@
+import re
+
+# Characters Jira's text search (~) treats as query syntax
+_TEXT_SPECIAL = re.compile(r'[+\-&|!(){}\[\]^~*?\\:"/]')
+
+
+def jql_string(value):
+    """Quote a value for use on the right-hand side of a JQL clause."""
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+def jql_text(value):
+    """Quote free text for a ``~`` clause, dropping characters Jira would parse as operators."""
+    return jql_string(" ".join(_TEXT_SPECIAL.sub(" ", str(value)).split()))
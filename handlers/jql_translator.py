@@ -0,0 +1,158 @@
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from handlers.app_state import gptclient, redis_client
+from handlers.llm_scheduler import estimate_tokens, llm_scheduler
+from handlers.project_loader import catalog
+from handlers.redis_access import redis_get, redis_setex, record_rtt
+
+TRANSLATION_CACHE_TTL = 60 * 60 * 24 * 7
+TRANSLATOR_MODEL = "gpt-4o-mini"
+TRANSLATOR_SYSTEM_PROMPT = """
+    You are JiraMate — a smart assistant trained to interpret natural language questions and generate precise JQL (Jira Query Language) queries for use with Jira Cloud.
+Your task is to: Convert the user query into a JQL that GPT-4o will use to fetch and answer, If the user doesnt ask Jira Related Question, keep the jql empty.
+If the user query references a specific issue key like `proj-123`, `ABC-42`, or any `Abc-###` pattern, you must use `issue = ABC-123`.\n"
+### Output Format
+Respond ONLY with a valid JSON object, like this:
+{
+  "jql": "your JQL string here",
+  "explanation": "A human-readable summary of what the query does."
+}
+- ⚠️ Do NOT return anything else (no markdown, no commentary, no code blocks).
+- ⚠️ Your output MUST be a valid JSON object that can be parsed.
+- ⚠️ Use escaped double quotes and avoid newlines inside JSON.
+
+
+    """
+
+_ISSUE_KEY = re.compile(r"\b([A-Za-z][A-Za-z0-9_]+)-(\d+)\b")
+# Questions about an issue's relations need real JQL functions, so they go to the LLM
+_RELATIONAL = re.compile(r"\b(link|linked|links|related|similar|block|blocks|blocked|blocking|sub-?tasks?|child|children|parent|epic|clone[sd]?|duplicates?)\b")
+_OPEN = "statusCategory != Done ORDER BY updated DESC"
+_INTENTS = [
+    (
+        re.compile(r"(show |list |what are |whats )?(all )?my (open |current |active )?(tickets|issues|tasks|work)|(tickets|issues|tasks) assigned to me"),
+        f"assignee = currentUser() AND {_OPEN}",
+        "Your open issues, most recently updated first."
+    ),
+    (
+        re.compile(r"what am i watching|(show |list )?(the )?(tickets|issues) (i am|im) watching"),
+        f"watcher = currentUser() AND {_OPEN}",
+        "Open issues you are watching, most recently updated first."
+    ),
+    (
+        re.compile(r"(show |list )?(my )?(tickets|issues) (i reported|i created|reported by me|created by me)"),
+        f"reporter = currentUser() AND {_OPEN}",
+        "Open issues you reported, most recently updated first."
+    ),
+]
+
+_stats = {"pattern": 0, "cache": 0, "llm": 0, "llm_ms": 0.0}
+
+
+def normalize_query(text):
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = text.replace("'", "").replace("’", "")
+    text = re.sub(r"[^\w\s-]", " ", text)
+    text = re.sub(r"\b(please|pls|hey|hi|jiramate)\b", " ", text)
+    return " ".join(text.split())
+
+def _cache_key(normalized):
+    return f"nl_jql:{hashlib.sha1(normalized.encode()).hexdigest()[:20]}"
+
+def _known_issue_keys(text):
+    keys = []
+    for project, number in _ISSUE_KEY.findall(text):
+        # "gpt-4" or "covid-19" are not issue keys; only trust projects we know about
+        if project.upper() in catalog.project_index:
+            key = f"{project.upper()}-{number}"
+            if key not in keys:
+                keys.append(key)
+    return keys
+
+def match_pattern(user_input, normalized):
+    """Deterministic translations for issue-key lookups and a few personal intents."""
+    keys = _known_issue_keys(user_input)
+    if keys and not _RELATIONAL.search(normalized):
+        if len(keys) == 1:
+            return {"jql": f"issue = {keys[0]}", "explanation": f"Looking up {keys[0]}."}
+        return {"jql": f"issue in ({', '.join(keys)})", "explanation": f"Looking up {', '.join(keys)}."}
+    for pattern, jql, explanation in _INTENTS:
+        if pattern.fullmatch(normalized):
+            return {"jql": jql, "explanation": explanation}
+    return None
+
+async def _ask_llm(user_input):
+    started = time.monotonic()
+    messages = [
+        {"role": "system", "content": TRANSLATOR_SYSTEM_PROMPT},
+        {"role": "user", "content": f"""
+User query:
+"{user_input}"
+"""}
+    ]
+    response = await llm_scheduler.run("dm", TRANSLATOR_MODEL, estimate_tokens(messages, 400), lambda: gptclient.chat.completions.create(
+        model=TRANSLATOR_MODEL,
+        messages=messages,
+        temperature=0.4,
+        max_tokens=400
+    ))
+    _stats["llm"] += 1
+    _stats["llm_ms"] += (time.monotonic() - started) * 1000
+    try:
+        parsed = json.loads(response.choices[0].message.content.strip())
+    except Exception as e:
+        print(f"GPT JQL parse error: {e}")
+        return None
+    return {"jql": parsed.get("jql", ""), "explanation": parsed.get("explanation", "")}
+
+async def translate_query(user_input):
+    """Turn a DM question into {"jql", "explanation"}: patterns first, then the shared cache, then the LLM.
+
+    Returns None when the LLM's answer could not be parsed.
+    """
+    normalized = normalize_query(user_input)
+    translation = match_pattern(user_input, normalized)
+    if translation:
+        _stats["pattern"] += 1
+        return translation
+
+    try:
+        cached = await redis_get("jql.translate", _cache_key(normalized))
+    except Exception as e:
+        print(f"⚠️ JQL translation cache read failed: {e}")
+        cached = None
+    if cached:
+        _stats["cache"] += 1
+        return json.loads(cached)
+
+    translation = await _ask_llm(user_input)
+    if translation is not None:
+        try:
+            await redis_setex("jql.translate", _cache_key(normalized), TRANSLATION_CACHE_TTL, json.dumps(translation))
+        except Exception as e:
+            print(f"⚠️ JQL translation cache write failed: {e}")
+    return translation
+
+async def forget_translation(user_input):
+    # Called when Jira rejects a cached JQL so the next ask goes back to the LLM
+    try:
+        record_rtt("jql.translate")
+        await redis_client.delete(_cache_key(normalize_query(user_input)))
+    except Exception as e:
+        print(f"⚠️ JQL translation cache delete failed: {e}")
+
+def get_translator_stats():
+    lookups = _stats["pattern"] + _stats["cache"] + _stats["llm"]
+    avg_llm_ms = _stats["llm_ms"] / _stats["llm"] if _stats["llm"] else 0.0
+    return {
+        "pattern_hits": _stats["pattern"],
+        "cache_hits": _stats["cache"],
+        "llm_calls": _stats["llm"],
+        "hit_rate": round((_stats["pattern"] + _stats["cache"]) / lookups, 3) if lookups else 0.0,
+        "avg_llm_ms": round(avg_llm_ms, 1),
+        # Every hit skipped one LLM round-trip
+        "saved_ms_estimate": round((_stats["pattern"] + _stats["cache"]) * avg_llm_ms, 1)
+    }
@@ -1,7 +1,101 @@
-import json,os,re
+import json,os,re,time,asyncio
 JIRA_DOMAIN = os.getenv("JIRA_DOMAIN")
 from handlers.app_state import gptclient,http_client
-from handlers.jira_client import extract_comment_text
+from handlers.jira_client import fetch_issues
+from handlers.jql_translator import translate_query, forget_translation
+from handlers.llm_scheduler import LLMOverloaded, estimate_tokens, llm_scheduler
+from handlers.summary_cache import summary_digest, get_cached_summary, save_summary
+
+# chat.update / views.update are Tier 3 (~50/min), so edit a streaming message about once a second
+STREAM_UPDATE_INTERVAL = float(os.getenv("LLM_STREAM_UPDATE_SECONDS", "1.0"))
+STREAM_CURSOR = " ▍"
+_stream_stats = {"streams": 0, "first_token_ms": 0.0, "total_ms": 0.0, "updates": 0}
+
+SUMMARY_MODEL = "gpt-4o-mini"
+SUMMARY_SYSTEM_PROMPT = """
+            You are a Slack-integrated Jira bot. Format your output consistently.
+
+- Use Slack-compatible markdown only.
+- The first line must always wrap title and description with ` `: `<title> - <description>`
+- Write 3–5 lines of summary.
+- Then end with: `↳ _Suggested Resolution:_ <recommendation/suggestion>`
+            """
+
+
+async def stream_completion(render, lane, **request):
+    """Run a streaming chat completion on a scheduler ``lane`` and return its text.
+
+    ``await render(text, done)`` is called with the text so far, at most once per
+    STREAM_UPDATE_INTERVAL and never while a previous update is still in flight,
+    then once more with ``done=True``. A partial render returning False stops the
+    stream, and None is returned. Raises LLMOverloaded when the queue sheds the call.
+    """
+    cost = estimate_tokens(request.get("messages"), request.get("max_tokens", 0))
+    started = time.monotonic()
+    # The slot is held for the whole stream: concurrency counts open generations, not requests sent
+    async with llm_scheduler.session(lane, request["model"], cost, lambda: gptclient.chat.completions.create(stream=True, **request)) as stream:
+        text, first_token_at, last_render, pending = "", None, 0.0, None
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            text += delta
+            now = time.monotonic()
+            if first_token_at is None:
+                first_token_at = now
+            if pending is not None and pending.done():
+                if pending.exception() is None and pending.result() is False:
+                    await stream.close()
+                    return None
+                pending = None
+            if pending is None and now - last_render >= STREAM_UPDATE_INTERVAL:
+                last_render = now
+                pending = asyncio.create_task(_safe_render(render, text))
+                _stream_stats["updates"] += 1
+        if pending is not None:
+            await asyncio.wait([pending])
+    text = text.strip()
+    _stream_stats["streams"] += 1
+    _stream_stats["first_token_ms"] += ((first_token_at or time.monotonic()) - started) * 1000
+    _stream_stats["total_ms"] += (time.monotonic() - started) * 1000
+    await render(text, True)
+    return text
+
+async def _safe_render(render, text):
+    try:
+        return await render(text, False)
+    except Exception as e:
+        # A dropped intermediate edit (e.g. rate limited) is fine; the next one catches up
+        print(f"⚠️ Streaming update failed: {e}")
+        if "not_found" in str(e):
+            # The modal or message is gone; stop generating for nobody
+            return False
+        return None
+
+def get_stream_stats():
+    streams = _stream_stats["streams"]
+    return {
+        "streams": streams,
+        "avg_first_token_ms": round(_stream_stats["first_token_ms"] / streams, 1) if streams else 0.0,
+        "avg_total_ms": round(_stream_stats["total_ms"] / streams, 1) if streams else 0.0,
+        "updates": _stream_stats["updates"]
+    }
+
+def trim_partial_markdown(text):
+    """Cut a partial completion back to the last point where its markup is balanced."""
+    if text.count("```") % 2:
+        text = text[:text.rfind("```")]
+    # Half-written link: "[label" or "[label](http..."
+    text = re.sub(r"\[[^\]\n]*(\]\([^)\s]*)?$", "", text)
+    for marker in ("**", "__", "~~", "`"):
+        if text.count(marker) % 2:
+            text = text[:text.rfind(marker)]
+    last_line = text.rsplit("\n", 1)[-1]
+    for marker in ("*", "_"):
+        if last_line.replace(marker * 2, "").count(marker) % 2:
+            text = text[:text.rfind(marker)]
+            last_line = text.rsplit("\n", 1)[-1]
+    return text.rstrip()
 
 async def generate_and_update_summary(client, view_id, metadata_json,http_client,channel=None,ts=None):
     metadata = json.loads(metadata_json)
@@ -10,89 +104,83 @@ async def generate_and_update_summary(client, view_id, metadata_json,http_client
     cloud_id = metadata["cloud_id"]
     user_id = metadata["user_id"]
 
-    issue_resp = await http_client.get(
-        f"https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/issue/{issue_key}",
-        headers={"Authorization": f"Bearer {access_token}"}
-    )
+    async def show(summary_text, done):
+        if not done:
+            summary_text = trim_partial_markdown(summary_text) + STREAM_CURSOR
+        try:
+            if view_id == "slash-command-view":
+                await client.chat_update(
+                    channel=channel,
+                    ts=ts,
+                    text=f"📋 Summary for *<https://{JIRA_DOMAIN}/browse/{issue_key}|{issue_key}>*:\n{summary_text}",
+                    blocks=[]
+                )
+            else:
+                await client.views_update(
+                    view_id=view_id,
+                    view={
+                        "type": "modal",
+                        "title": {"type": "plain_text", "text": f"Summary for {issue_key}"},
+                        "close": {"type": "plain_text", "text": "Close"},
+                        "blocks": [
+                            {
+                                "type": "section",
+                                "text": {"type": "mrkdwn", "text": f"{summary_text}"}
+                            }
+                        ]
+                    }
+                )
+        except Exception as e:
+            if done and "not_found" in str(e):
+                print("⚠️ Summary modal was closed before update. Skipping update.")
+            else:
+                raise
 
-    if issue_resp.status_code != 200:
-        summary_text = "❌ Failed to fetch issues/comments."
-    else:
-        issue_data = issue_resp.json()
-        summary = issue_data["fields"]["summary"]
-        description = ""
-        desc_field = issue_data["fields"].get("description")
-        if desc_field and isinstance(desc_field.get("content"), list):
-            for block in desc_field["content"]:
-                for item in block.get("content", []):
-                    if "text" in item:
-                        description += item["text"] + " "
-        description = description.strip() or "No description available."
-        comments_data = issue_data["fields"].get("comment", {}).get("comments", [])
-        comments_text = "\n".join(
-            f"- {c.get('author', {}).get('displayName', 'Someone')}: {extract_comment_text(c)}"
-            for c in comments_data
-        )
-        prompt = f"""
+    page = await fetch_issues(access_token, cloud_id, f"issue = {issue_key}", http_client, "summary", 1, need_comments=True)
+
+    if not page or not page[0]:
+        await show("❌ Failed to fetch issues/comments.", True)
+        return
+    issue = page[0][0]
+    summary = issue["summary"]
+    description = issue["description"] or "No description available."
+    comments_text = "\n".join(f"- {c['author']}: {c['text']}" for c in issue["comments"] or [])
+    prompt = f"""
 Jira Issue:
 - Title: `{summary}`
 - Description: `{description or "N/A"}`
 - Comments:{comments_text}
 """
-        try:
-            response = await gptclient.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """
-            You are a Slack-integrated Jira bot. Format your output consistently.
-
-- Use Slack-compatible markdown only.
-- The first line must always wrap title and description with ` `: `<title> - <description>`
-- Write 3–5 lines of summary.
-- Then end with: `↳ _Suggested Resolution:_ <recommendation/suggestion>`
-            """
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt}
-                ],
-                temperature=0.5,
-                max_tokens=1000
-            )
-            summary_text=response.choices[0].message.content.strip()
-        except Exception as e:
-            summary_text = f"❌ Summary generation failed: {e}"
-
-    # Update modal with summary
+    digest = summary_digest(SUMMARY_MODEL, SUMMARY_SYSTEM_PROMPT, prompt)
+    cached = await get_cached_summary(issue_key, digest)
+    if cached:
+        await show(cached, True)
+        return
     try:
-        if view_id == "slash-command-view":
-            await client.chat_postMessage(
-                channel=channel,
-                ts=ts,
-                text=f"📋 Summary for *<https://{JIRA_DOMAIN}/browse/{issue_key}|{issue_key}>*:\n{summary_text}"
-            )
-        else:
-            await client.views_update(
-                view_id=view_id,
-                view={
-                    "type": "modal",
-                    "title": {"type": "plain_text", "text": f"Summary for {issue_key}"},
-                    "close": {"type": "plain_text", "text": "Close"},
-                    "blocks": [
-                        {
-                            "type": "section",
-                            "text": {"type": "mrkdwn", "text": f"{summary_text}"}
-                        }
-                    ]
-                }
-            )
+        summary_text = await stream_completion(
+            show,
+            "summarize",
+            model=SUMMARY_MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": SUMMARY_SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": prompt}
+            ],
+            temperature=0.5,
+            max_tokens=1000
+        )
+    except LLMOverloaded as e:
+        await show(f"🚦 {e}", True)
+        return
     except Exception as e:
-        if "not_found" in str(e):
-            print("⚠️ Summary modal was closed before update. Skipping update.")
-        else:
-            raise
+        await show(f"❌ Summary generation failed: {e}", True)
+        return
+    if summary_text:
+        await save_summary(issue_key, digest, summary_text)
 
 def gptprompt(current_title, current_description, past_issues):
     prompt = f"""
@@ -115,50 +203,21 @@ Comment: {issue.get('last_comment', 'No recent comments')}
 
     return prompt.strip()
 
-async def analyze_user_query_and_respond(user_input: str, access_token: str, cloud_id: str):
-    jql_prompt = f"""
-User query:
-"{user_input}"
-"""
-
-    jql_resp = await gptclient.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {
-                "role": "system",
-                "content": """
-    You are JiraMate — a smart assistant trained to interpret natural language questions and generate precise JQL (Jira Query Language) queries for use with Jira Cloud.
-Your task is to: Convert the user query into a JQL that GPT-4o will use to fetch and answer, If the user doesnt ask Jira Related Question, keep the jql empty.
-If the user query references a specific issue key like `proj-123`, `ABC-42`, or any `Abc-###` pattern, you must use `issue = ABC-123`.\n"
-### Output Format
-Respond ONLY with a valid JSON object, like this:
-{
-  "jql": "your JQL string here",
-  "explanation": "A human-readable summary of what the query does."
-}
-- ⚠️ Do NOT return anything else (no markdown, no commentary, no code blocks).
-- ⚠️ Your output MUST be a valid JSON object that can be parsed.
-- ⚠️ Use escaped double quotes and avoid newlines inside JSON.
-
+async def analyze_user_query_and_respond(user_input: str, access_token: str, cloud_id: str, render=None):
+    """Answer a DM question. ``render(blocks)``, if given, receives progress and the streaming answer."""
+    async def show(text, done):
+        if render and not done:
+            await render([{
+                "type": "section",
+                "text": {"type": "mrkdwn", "text": markdown_to_slack(trim_partial_markdown(text)) + STREAM_CURSOR}
+            }])
 
-    """
-                    },
-                    {
-                        "role": "user",
-                        "content": jql_prompt}
-                ],
-        temperature=0.4,
-        max_tokens=400
-    )
-    try:
-        content = jql_resp.choices[0].message.content.strip()
-        parsed = json.loads(content)
-    except Exception as e:
-        print(f"GPT JQL parse error: {e}")
+    parsed = await translate_query(user_input)
+    if parsed is None:
         return [{
             "type": "section",
             "text": {"type": "mrkdwn", "text": "❌ I couldn’t understand your request. Please rephrase or try again."}
-        }]               
+        }]
     jql = parsed.get("jql", "")
     explanation = parsed.get("explanation", "")
     if not jql:
@@ -169,25 +228,18 @@ Respond ONLY with a valid JSON object, like this:
             }
         ]
 
-    url = f"https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/search"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Accept": "application/json"
-    }
-    params = {
-        "jql": jql,
-        "fields": "summary,status,description,comment,assignee,priority,issuetype,created,updated,project",
-        "maxResults": 5
-    }
-    resp = await http_client.get(url, headers=headers, params=params)
-    if resp.status_code != 200:
+    if render:
+        await render([{"type": "section", "text": {"type": "mrkdwn", "text": f"🔎 _{explanation or 'Searching Jira...'}_"}}])
+    page = await fetch_issues(access_token, cloud_id, jql, http_client, "assistant", 5, need_comments=True)
+    if page is None:
+        await forget_translation(user_input)
         return [
             {
                 "type": "section",
                 "text": {"type": "mrkdwn", "text": f"❌ Sorry, I couldn't process your Jira search. Please check your request or try rephrasing it."}
             }
         ]
-    issues = resp.json().get("issues", [])
+    issues = page[0]
     if not issues:
         return [
             {
@@ -198,32 +250,16 @@ Respond ONLY with a valid JSON object, like this:
     formatted = ""
     for issue in issues:
         key = issue["key"]
-        fields = issue["fields"]
-        # Initialize individual values
-        summary = fields.get("summary", "")
-        status = fields.get("status", {}).get("name")
-        assignee_data = fields.get("assignee")
-        assignee = assignee_data.get("displayName") if assignee_data else None
-        priority = fields.get("priority", {}).get("name")
-        created = fields.get("created", "")
-        updated = fields.get("updated", "")
-        issuetype = fields.get("issuetype", {}).get("name")
-        project = fields.get("project", {}).get("name")
-        # Extract description
-        description = ""
-        desc_field = fields.get("description", "")
-        if desc_field and isinstance(desc_field.get("content"), list):
-            for block in desc_field["content"]:
-                for item in block.get("content", []):
-                    if "text" in item:
-                        description += item["text"] + " "
-        description = description.strip()
-        # Extract comments
-        comments_data = fields.get("comment", {}).get("comments", [])
-        comments_text = "\n".join(
-            f"- {c.get('author', {}).get('displayName', 'Someone')}: {extract_comment_text(c)}"
-            for c in comments_data
-        )
+        summary = issue["summary"]
+        status = issue["status"]
+        assignee = issue["assignee"]
+        priority = issue["priority"]
+        created = issue["created"]
+        updated = issue["updated"]
+        issuetype = issue["type"]
+        project = issue["project"]
+        description = issue["description"]
+        comments_text = "\n".join(f"- {c['author']}: {c['text']}" for c in issue["comments"] or [])
         # Start formatting
         formatted += f"\n<{JIRA_DOMAIN}/browse/{key}|*{key}*>"
         if summary:
@@ -264,7 +300,9 @@ The ticket data is from the user query.
 Give response in Markdown format NOT Slack Markdown.
 """
 
-    summary_resp = await gptclient.chat.completions.create(
+    message = await stream_completion(
+        show,
+        "dm",
         model="gpt-4o-mini",
         messages=[
             {
@@ -294,8 +332,14 @@ Your response must follow these interaction rules:
         temperature=0.6,
         max_tokens=1000
     )
-
-    message = summary_resp.choices[0].message.content.strip()
+    if not message:
+        # Stopped early, or the model returned nothing
+        return [
+            {
+                "type": "section",
+                "text": {"type": "mrkdwn", "text": "⚠️ I couldn’t put an answer together this time. Please try asking again."}
+            }
+        ]
     return [
         {
             "type": "section",
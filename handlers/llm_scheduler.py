@@ -0,0 +1,207 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+import openai
+
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+LLM_QUEUE_DEPTH = int(os.getenv("LLM_QUEUE_DEPTH", "50"))
+# Per-model budgets; set them to the organisation's OpenAI rate limits
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = 1.0
+LLM_BACKOFF_CAP = 20.0
+
+# Lower runs first: someone is waiting on a DM, then on a summary, then on the duplicate check
+LANES = {"dm": 0, "summarize": 1, "similarity": 2}
+RETRYABLE = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+
+class LLMOverloaded(Exception):
+    def __init__(self, message="JiraMate is handling a lot of requests right now. Please try again in a minute."):
+        super().__init__(message)
+
+
+def estimate_tokens(messages=None, max_tokens=0, texts=()):
+    # ~4 characters per token is close enough for budgeting
+    chars = len(json.dumps(messages, ensure_ascii=False)) if messages else 0
+    chars += sum(len(t) for t in texts)
+    return chars // 4 + max_tokens
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "lane", "model", "cost", "future")
+
+    def __init__(self, priority, seq, lane, model, cost, future):
+        self.priority, self.seq, self.lane, self.model, self.cost, self.future = priority, seq, lane, model, cost, future
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class LLMScheduler:
+    """Priority queue in front of OpenAI: bounded concurrency, per-model RPM/TPM buckets, load shedding."""
+
+    def __init__(self, concurrency=LLM_CONCURRENCY, max_depth=LLM_QUEUE_DEPTH):
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+        self._queue = []
+        self._active = 0
+        self._seq = itertools.count()
+        self._buckets = {}
+        self._timer = None
+        self._stats = {lane: {"granted": 0, "wait_ms": 0.0, "max_wait_ms": 0.0, "shed": 0, "retries": 0} for lane in LANES}
+
+    def _model_buckets(self, model):
+        if model not in self._buckets:
+            self._buckets[model] = (TokenBucket(LLM_REQUESTS_PER_MINUTE), TokenBucket(LLM_TOKENS_PER_MINUTE))
+        return self._buckets[model]
+
+    def _shed_for(self, priority):
+        # Queue full: drop the newest request of the least urgent lane, unless that would be this one
+        victim = max(self._queue, key=lambda w: (w.priority, w.seq))
+        if victim.priority <= priority:
+            return False
+        self._queue.remove(victim)
+        heapq.heapify(self._queue)
+        self._stats[victim.lane]["shed"] += 1
+        victim.future.set_exception(LLMOverloaded())
+        return True
+
+    def _pump(self):
+        self._timer = None
+        blocked_models, retry_in = set(), None
+        for waiter in sorted(self._queue):
+            if self._active >= self.concurrency:
+                break
+            if waiter.model in blocked_models:
+                continue
+            requests, tokens = self._model_buckets(waiter.model)
+            wait = max(requests.wait_time(1), tokens.wait_time(waiter.cost))
+            if wait > 0:
+                # Nothing behind it on the same model may overtake it
+                blocked_models.add(waiter.model)
+                retry_in = wait if retry_in is None else min(retry_in, wait)
+                continue
+            requests.take(1)
+            tokens.take(waiter.cost)
+            self._queue.remove(waiter)
+            self._active += 1
+            waiter.future.set_result(None)
+        heapq.heapify(self._queue)
+        if retry_in is not None and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(retry_in, self._pump)
+
+    def _release(self):
+        self._active -= 1
+        self._pump()
+
+    @asynccontextmanager
+    async def slot(self, lane, model, cost):
+        priority = LANES[lane]
+        if len(self._queue) >= self.max_depth and not self._shed_for(priority):
+            self._stats[lane]["shed"] += 1
+            raise LLMOverloaded()
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(priority, next(self._seq), lane, model, cost, future)
+        heapq.heappush(self._queue, waiter)
+        enqueued_at = time.monotonic()
+        self._pump()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release()
+            elif waiter in self._queue:
+                self._queue.remove(waiter)
+                heapq.heapify(self._queue)
+            raise
+        waited = (time.monotonic() - enqueued_at) * 1000
+        stats = self._stats[lane]
+        stats["granted"] += 1
+        stats["wait_ms"] += waited
+        stats["max_wait_ms"] = max(stats["max_wait_ms"], waited)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _retry_delay(self, lane, attempt, error):
+        response = getattr(error, "response", None)
+        try:
+            delay = float(response.headers.get("retry-after")) + random.uniform(0, 0.5)
+        except (AttributeError, TypeError, ValueError):
+            delay = random.uniform(0, min(LLM_BACKOFF_CAP, LLM_BACKOFF_BASE * 2 ** attempt))
+        self._stats[lane]["retries"] += 1
+        print(f"⏳ OpenAI {type(error).__name__} on {lane} lane, retrying in {delay:.1f}s")
+        return delay
+
+    @asynccontextmanager
+    async def session(self, lane, model, cost, call):
+        """Hold a slot while ``await call()`` and the body run; yields the call's result.
+
+        Rate limits and transient failures are retried with jittered backoff. Each attempt
+        waits for its own slot and RPM/TPM budget, and the backoff sleep holds no slot.
+        """
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            async with self.slot(lane, model, cost):
+                try:
+                    result = await call()
+                except RETRYABLE as e:
+                    if attempt == LLM_MAX_RETRIES:
+                        raise
+                    delay = self._retry_delay(lane, attempt, e)
+                else:
+                    yield result
+                    return
+            await asyncio.sleep(delay)
+
+    async def run(self, lane, model, cost, call):
+        async with self.session(lane, model, cost, call) as result:
+            return result
+
+    def stats(self):
+        lanes = {}
+        for lane, s in self._stats.items():
+            lanes[lane] = {
+                "granted": s["granted"],
+                "avg_wait_ms": round(s["wait_ms"] / s["granted"], 1) if s["granted"] else 0.0,
+                "max_wait_ms": round(s["max_wait_ms"], 1),
+                "shed": s["shed"],
+                "retries": s["retries"],
+                "queued": sum(1 for w in self._queue if w.lane == lane)
+            }
+        return {"active": self._active, "queued": len(self._queue), "lanes": lanes}
+
+
+llm_scheduler = LLMScheduler()
+
+def get_llm_scheduler_stats():
+    return llm_scheduler.stats()
@@ -1,24 +1,41 @@
-from handlers.project_loader import load_projects
+from handlers.project_loader import catalog
+import os
 import json
+from collections import OrderedDict
 from handlers.llm import generate_and_update_summary
-from handlers.app_state import redis_client
+from handlers.options_index import build_options_index, options_cache_key, options_block_id
 
 
-projects,projects_index,issue_type_index=load_projects()
+JIRA_DOMAIN = os.getenv("JIRA_DOMAIN")
+COMPILED_MODAL_CACHE_SIZE = 256
+ISSUE_PAGE_TITLES = {"assigned": "Assigned to You", "watching": "Watching"}
+# private_metadata is capped at 3000 chars; older page cursors are dropped past this
+MAX_PAGE_METADATA = 2800
+
+SKIPPED_FIELDS = {"project", "issuetype", "summary", "priority", "project_block", "issue_block","reporter"}
+# Above this many allowedValues a multi-select is served from the Redis options index
+MAX_STATIC_OPTIONS = 100
+
+# Static modal parts, rebuilt only when the catalog version changes
+_project_options_cache = {"version": None, "options": []}
+_compiled_modals = OrderedDict()
+
 def plain_text(text):
     return {"type": "plain_text", "text": text}
 def project_options():
-    options = [
-        {
-            "text": plain_text(f"{p['name']} ({p['key']})"),
-            "value": p["key"]
-        }
-        for p in projects
-    ]
-    return options
+    if _project_options_cache["version"] != catalog.version or not _project_options_cache["options"]:
+        _project_options_cache["options"] = [
+            {
+                "text": plain_text(f"{p['name']} ({p['key']})"),
+                "value": p["key"]
+            }
+            for p in catalog.projects
+        ]
+        _project_options_cache["version"] = catalog.version
+    return _project_options_cache["options"]
 
 def issue_options(selected_project_key):
-    project = projects_index.get(selected_project_key)
+    project = catalog.project_index.get(selected_project_key)
     if not project:
         raise Exception("Project not found!")
     options = [
@@ -81,7 +98,7 @@ def build_project_selection_modal():
 }
 
 def build_issue_type_modal(selected_project_key):
-    project=projects_index.get(selected_project_key)
+    project=catalog.project_index.get(selected_project_key)
     project_name = project["name"]
     return {
     "type": "modal",
@@ -133,9 +150,55 @@ def build_issue_type_modal(selected_project_key):
     ]
 }
 
+def build_no_issue_types_modal(selected_project_key):
+    modal = build_project_selection_modal()
+    project = catalog.project_index.get(selected_project_key) or {}
+    modal["blocks"][0]["accessory"]["initial_option"] = next(
+        (opt for opt in project_options() if opt["value"] == selected_project_key), None)
+    modal["blocks"].append({
+        "type": "section",
+        "text": {"type": "mrkdwn", "text": f"⚠️ *{project.get('name', selected_project_key)}* has no work types you can create. Pick another project."}
+    })
+    return modal
+
 async def build_ticket_fields_modal(fields, project_key, project_name, issue_type_id):
-    issue_name = issue_type_index.get(f"{project_key}:{issue_type_id}")
-    SKIPPED_FIELDS = {"project", "issuetype", "summary", "priority", "project_block", "issue_block","reporter"}
+    """``fields`` is None when they could not be fetched; that modal is served but not cached."""
+    key = (project_key, issue_type_id, catalog.version)
+    compiled = _compiled_modals.get(key)
+    fetched = fields is not None
+    # An issue type with no extra fields is a valid, cacheable result; older snapshots stored it as []
+    fields = fields or {}
+    if compiled is None:
+        compiled = await compile_ticket_fields_modal(fields, project_key, project_name, issue_type_id)
+        if fetched:
+            _compiled_modals[key] = compiled
+        while len(_compiled_modals) > COMPILED_MODAL_CACHE_SIZE:
+            _compiled_modals.popitem(last=False)
+    else:
+        _compiled_modals.move_to_end(key)
+        # The template outlives the options indexes it points at; make sure they are still there
+        for field_key, allowed_values in indexed_option_fields(fields):
+            await build_options_index(options_cache_key(project_key, issue_type_id, field_key), allowed_values)
+
+    # Patch only the per-request bits onto shallow copies; the compiled template is shared
+    issue_block = compiled["blocks"][1]
+    issue_opts = issue_block["accessory"]["options"]
+    selected = next((opt for opt in issue_opts if opt["value"] == issue_type_id), issue_opts[0] if issue_opts else None)
+    blocks = list(compiled["blocks"])
+    blocks[1] = {**issue_block, "accessory": {**issue_block["accessory"], "initial_option": selected}}
+    return {**compiled, "blocks": blocks}
+
+def indexed_option_fields(fields):
+    """(field_key, allowedValues) of the required multi-selects too large for static options."""
+    for field_key, field in fields.items():
+        if field_key in SKIPPED_FIELDS or not field.get("required", False):
+            continue
+        allowed_values = field.get("allowedValues", [])
+        if field.get("schema", {}).get("type") == "array" and len(allowed_values) > MAX_STATIC_OPTIONS:
+            yield field_key, allowed_values
+
+async def compile_ticket_fields_modal(fields, project_key, project_name, issue_type_id):
+    issue_name = catalog.issue_type_index.get(f"{project_key}:{issue_type_id}")
     project_opts = project_options()
     issue_opts = issue_options(project_key)
 
@@ -160,8 +223,7 @@ async def build_ticket_fields_modal(fields, project_key, project_name, issue_typ
                 "type": "static_select",
                 "action_id": "issue_selected",
                 "placeholder": plain_text("Select work type"),
-                "options": issue_opts,
-                "initial_option": issue_opts[0] if issue_opts else None
+                "options": issue_opts
             }
         },
         {
@@ -231,14 +293,11 @@ async def build_ticket_fields_modal(fields, project_key, project_name, issue_typ
 
         # Multi-select
         if field_type == "array" and allowed_values:
-            if len(allowed_values) > 100:
-                cache_key = f"external_fields:{field_key}"
-                exists = await redis_client.exists(cache_key)
-                if not exists:
-                    await redis_client.set(cache_key, json.dumps(allowed_values), ex=3600)
+            if len(allowed_values) > MAX_STATIC_OPTIONS:
+                await build_options_index(options_cache_key(project_key, issue_type_id, field_key), allowed_values)
                 blocks.append({
                     "type": "input",
-                    "block_id": field_key,
+                    "block_id": options_block_id(project_key, issue_type_id, field_key),
                     "element": {
                         "type": "multi_external_select",
                         "action_id": "input_value",
@@ -371,6 +430,12 @@ async def open_status_modal(client, trigger_id, issue_key, user_id,access_token,
         {"text": {"type": "plain_text", "text": t["name"]}, "value": t["id"]}
         for t in transitions
     ]
+    # Transition names ("Start Progress") are not statuses; the submit handler patches Home with the target
+    targets = {
+        t["id"]: {"status": t.get("to", {}).get("name", t["name"]),
+                  "done": t.get("to", {}).get("statusCategory", {}).get("key") == "done"}
+        for t in transitions
+    }
 
     # Open the modal with dropdown
     await client.views_open(
@@ -381,7 +446,8 @@ async def open_status_modal(client, trigger_id, issue_key, user_id,access_token,
             "private_metadata": json.dumps({
                     "issue_key": issue_key,
                     "cloud_id": cloud_id,
-                    "token": access_token}),
+                    "token": access_token,
+                    "targets": targets}),
             "title": {"type": "plain_text", "text": "Change Status"},
             "submit": {"type": "plain_text", "text": "Update"},
             "close": {"type": "plain_text", "text": "Cancel"},
@@ -501,3 +567,52 @@ async def open_summary_modal(client, trigger_id, issue_key, user_id,access_token
     )
     view_id = result["view"]["id"]
     await generate_and_update_summary(client, view_id, metadata,http_client)
+
+def _page_metadata(list_name, history, next_page_token):
+    # history holds the nextPageToken of every page up to the current one (None for the first)
+    metadata = {"list": list_name, "history": history, "next": next_page_token}
+    while len(metadata["history"]) > 2 and len(json.dumps(metadata)) > MAX_PAGE_METADATA:
+        metadata["history"] = [None] + metadata["history"][2:]
+    return json.dumps(metadata)
+
+def build_issue_page_modal(list_name, issues, history, next_page_token):
+    blocks = []
+    for issue in issues:
+        blocks += [
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*<https://{JIRA_DOMAIN}/browse/{issue['key']}|{issue['key']}>* – {issue['summary']}"
+                }
+            },
+            {
+                "type": "context",
+                "elements": [
+                    {"type": "mrkdwn", "text": f"*Status:* {issue['status']}"},
+                    {"type": "mrkdwn", "text": f"*Type:* {issue['type']}"},
+                    {"type": "mrkdwn", "text": f"*Assignee:* {issue['assignee']}"},
+                    {"type": "mrkdwn", "text": f"*Priority:* {issue['priority_icon']} {issue['priority']}"}
+                ]
+            },
+            {"type": "divider"}
+        ]
+    if not issues:
+        blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": "🎉 Nothing more to show."}})
+
+    buttons = []
+    if len(history) > 1:
+        buttons.append({"type": "button", "text": plain_text("◀ Previous"), "action_id": "issue_page_prev"})
+    if next_page_token:
+        buttons.append({"type": "button", "text": plain_text("Next ▶"), "action_id": "issue_page_next"})
+    if buttons:
+        blocks.append({"type": "actions", "elements": buttons})
+
+    return {
+        "type": "modal",
+        "callback_id": "issue_page_modal",
+        "private_metadata": _page_metadata(list_name, history, next_page_token),
+        "title": plain_text(ISSUE_PAGE_TITLES.get(list_name, "Issues")),
+        "close": plain_text("Close"),
+        "blocks": blocks
+    }
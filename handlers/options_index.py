@@ -0,0 +1,122 @@
+import hashlib
+import json
+import re
+from handlers.app_state import redis_client
+from handlers.redis_access import redis_pipeline, record_rtt
+
+OPTIONS_INDEX_TTL = 60 * 60 * 24
+OPTIONS_BATCH_SIZE = 5000
+MAX_OPTIONS = 100
+_SEP = "\x00"
+_LEX_MAX = "\U0010ffff"
+_WORD_SPLIT = re.compile(r"[\s/_\-.,()]+")
+
+
+def option_label(opt):
+    return opt.get("name") or opt.get("value") or str(opt)
+
+def option_value(opt):
+    return opt.get("id") or opt.get("value") or str(opt)
+
+def options_version(allowed_values):
+    return hashlib.sha1(json.dumps(allowed_values, sort_keys=True).encode()).hexdigest()[:16]
+
+def options_cache_key(project_key, issue_type_id, field_key):
+    # The same customfield can carry different allowedValues per project / issue type context
+    return f"{project_key}:{issue_type_id}:{field_key}"
+
+def options_block_id(project_key, issue_type_id, field_key):
+    return f"{field_key}|{project_key}|{issue_type_id}"
+
+def options_cache_key_from_block_id(block_id):
+    parts = block_id.split("|")
+    if len(parts) != 3:
+        return block_id
+    field_key, project_key, issue_type_id = parts
+    return options_cache_key(project_key, issue_type_id, field_key)
+
+def _pointer_key(cache_key):
+    return f"external_fields:{cache_key}"
+
+def _index_key(cache_key, version):
+    return f"external_options:{cache_key}:{version}"
+
+def _members(allowed_values):
+    # One lex-sorted member per word start, so "bar" finds "Foo Bar" with a range query
+    for opt in allowed_values:
+        label = option_label(opt)
+        value = option_value(opt)
+        lowered = label.lower()
+        starts = {lowered} | {w for w in _WORD_SPLIT.split(lowered) if w}
+        for term in starts:
+            yield f"{term}{_SEP}{label}{_SEP}{value}"
+
+async def build_options_index(cache_key, allowed_values):
+    """Publish a lex-sorted Redis index of allowedValues, once per content version."""
+    version = options_version(allowed_values)
+    pointer = _pointer_key(cache_key)
+    index_key = _index_key(cache_key, version)
+    # Reading the pointer and index also renews their TTLs, so an index in use never lapses under a cached modal
+    async with redis_pipeline("options.build") as pipe:
+        pipe.getex(pointer, ex=OPTIONS_INDEX_TTL)
+        pipe.expire(index_key, OPTIONS_INDEX_TTL)
+    current, index_exists = pipe.results
+    if current == version and index_exists:
+        return version
+    if index_exists:
+        # The pointer lapsed or points at another payload, but this one is already indexed: re-point, don't rewrite
+        async with redis_pipeline("options.build") as pipe:
+            pipe.set(pointer, version, ex=OPTIONS_INDEX_TTL)
+        return version
+
+    batch = {}
+    async with redis_pipeline("options.build") as pipe:
+        pipe.delete(index_key)
+    for member in _members(allowed_values):
+        batch[member] = 0
+        if len(batch) >= OPTIONS_BATCH_SIZE:
+            async with redis_pipeline("options.build") as pipe:
+                pipe.zadd(index_key, batch)
+            batch = {}
+    async with redis_pipeline("options.build") as pipe:
+        if batch:
+            pipe.zadd(index_key, batch)
+        pipe.expire(index_key, OPTIONS_INDEX_TTL)
+        pipe.set(pointer, version, ex=OPTIONS_INDEX_TTL)
+        if current and current != version:
+            # Leave the old index briefly for options requests already in flight
+            pipe.expire(_index_key(cache_key, current), 60)
+    print(f"📇 Indexed {len(allowed_values)} options for {cache_key} (v{version})")
+    return version
+
+async def query_options_index(cache_key, query, limit=MAX_OPTIONS):
+    """Return up to ``limit`` Slack options whose label or a word in it starts with ``query``.
+
+    Returns None when no index has been published for the field.
+    """
+    record_rtt("options.query")
+    version = await redis_client.get(_pointer_key(cache_key))
+    if not version:
+        return None
+    index_key = _index_key(cache_key, version)
+    query = query.lower()
+    # A label can match on several words, so over-fetch a bounded window and de-duplicate
+    record_rtt("options.query")
+    if query:
+        members = await redis_client.zrangebylex(index_key, f"[{query}", f"[{query}{_LEX_MAX}", start=0, num=limit * 3)
+    else:
+        members = await redis_client.zrange(index_key, 0, limit * 3 - 1)
+
+    options, seen = [], set()
+    for member in members:
+        _, label, value = member.split(_SEP, 2)
+        if value in seen:
+            continue
+        seen.add(value)
+        options.append({
+            "text": {"type": "plain_text", "text": label[:75]},
+            "value": value
+        })
+        if len(options) >= limit:
+            break
+    return options
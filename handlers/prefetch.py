@@ -0,0 +1,57 @@
+import asyncio
+from handlers.app_state import redis_client
+from handlers.redis_access import record_rtt, redis_pipeline
+from handlers.modal_builder import issue_options, build_ticket_fields_modal
+from handlers.jira_client import fetch_issue_fields
+
+PREFETCH_CONCURRENCY = 3
+PICKS_TTL = 60 * 60 * 24 * 90
+
+# Keep references so background prefetches aren't garbage collected mid-flight
+_prefetch_tasks = set()
+
+
+def _picks_key(user_id, project_key):
+    return f"issue_type_picks:{user_id}:{project_key}"
+
+async def record_issue_type_pick(user_id, project_key, issue_type_id):
+    key = _picks_key(user_id, project_key)
+    try:
+        async with redis_pipeline("prefetch.record") as pipe:
+            pipe.zincrby(key, 1, issue_type_id)
+            pipe.expire(key, PICKS_TTL)
+    except Exception as e:
+        print(f"⚠️ Failed to record issue type pick for {user_id}: {e}")
+
+async def rank_issue_types(user_id, project_key):
+    """Non-subtask issue type options for the project, most often picked by this user first."""
+    options = issue_options(project_key)
+    try:
+        record_rtt("prefetch.rank")
+        scores = dict(await redis_client.zrange(_picks_key(user_id, project_key), 0, -1, withscores=True))
+    except Exception as e:
+        print(f"⚠️ Failed to load issue type history for {user_id}: {e}")
+        scores = {}
+    # sorted() is stable, so ties keep Jira's order
+    return sorted(options, key=lambda opt: -scores.get(opt["value"], 0))
+
+async def _warm(user_id, project_key, project_name, issue_type_ids, http_client):
+    semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+    async def warm_one(issue_type_id):
+        async with semaphore:
+            try:
+                fields = await fetch_issue_fields(user_id, project_key, issue_type_id, http_client)
+                await build_ticket_fields_modal(fields, project_key, project_name, issue_type_id)
+            except Exception as e:
+                print(f"⚠️ Prefetch failed for {project_key}:{issue_type_id} → {e}")
+
+    await asyncio.gather(*(warm_one(issue_type_id) for issue_type_id in issue_type_ids))
+
+def prefetch_issue_types(user_id, project_key, project_name, issue_type_ids, http_client):
+    # Fire-and-forget warm-up of field metadata and compiled modals
+    if not issue_type_ids:
+        return
+    task = asyncio.create_task(_warm(user_id, project_key, project_name, issue_type_ids, http_client))
+    _prefetch_tasks.add(task)
+    task.add_done_callback(_prefetch_tasks.discard)
@@ -1,9 +1,12 @@
 import json
-import requests
+import hashlib
+import asyncio
+import random
+import httpx
 import os
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from handlers.redis_access import redis_pipeline
 
 JIRA_DOMAIN = os.getenv("JIRA_DOMAIN")
 JIRA_API_USER = os.getenv("JIRA_API_USER")
@@ -11,121 +14,267 @@ JIRA_API_TOKEN = os.getenv("JIRA_API_TOKEN")
 auth = (JIRA_API_USER, JIRA_API_TOKEN)
 headers = {"Accept": "application/json"}
 
+SYNC_CONCURRENCY = int(os.getenv("CREATEMETA_CONCURRENCY", "8"))
+SYNC_MAX_RETRIES = 5
+SYNC_PAGE_SIZE = 50
+SYNC_TIMEOUT = 20
 
-def fetch_and_save_projects():
-    url = f"https://{JIRA_DOMAIN}/rest/api/3/issue/createmeta"
-    file_path = Path("projects.json")
-    one_day_ago = datetime.now(timezone.utc) - timedelta(days=1)
+PROJECTS_FILE = "projects.json"
+CATALOG_VERSION_KEY = "createmeta:version"
+CATALOG_PROJECTS_KEY = "createmeta:projects"
+CATALOG_REFRESHED_AT_KEY = "createmeta:refreshed_at"
+CATALOG_LOCK_KEY = "createmeta:refresh_lock"
+CATALOG_LOCK_TIMEOUT = 60 * 30
+CATALOG_MAX_AGE = timedelta(days=1)
+CATALOG_CHECK_INTERVAL = int(os.getenv("CATALOG_CHECK_INTERVAL_SECONDS", "60"))
+FIELDS_KEY = "createmeta:fields"
+FIELD_HASHES_KEY = "createmeta:field_hashes"
 
-    if file_path.exists():
-        last_modified = datetime.fromtimestamp(file_path.stat().st_mtime, timezone.utc)
-        if last_modified > one_day_ago:
-            print("✅ Projects are up to date. Skipping fetch.")
-            return
 
-    print("🌐 Fetching Projects from Jira...")
-    response = requests.get(url, headers=headers, auth=auth)
-    if response.status_code != 200:
-        print(f"❌ Failed to fetch projects: {response.status_code} {response.text}")
-        return
+def _content_hash(data):
+    return hashlib.sha1(data.encode()).hexdigest()
 
-    projects = response.json().get("projects", [])
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(projects, f, indent=2)
-    print(f"✅ Saved {len(projects)} projects.")
-    run_parallel_field_fetch(projects)
+def field_key(project_key, issue_type_id):
+    return f"{project_key}:{issue_type_id}"
 
+async def store_fields(redis, project_key, issue_type_id, fields):
+    # Field metadata lives in Redis so every worker and replica shares one copy
+    content = json.dumps(fields)
+    digest = _content_hash(content)
+    async with redis_pipeline("catalog.fields", client=redis) as pipe:
+        pipe.hset(FIELDS_KEY, field_key(project_key, issue_type_id), content)
+        pipe.hset(FIELD_HASHES_KEY, field_key(project_key, issue_type_id), digest)
+    return digest
 
-def fetch_and_save_field(project_key, issue_type_id):
+def _file_hash(path):
     try:
-        field_url = f"https://{JIRA_DOMAIN}/rest/api/3/issue/createmeta/{project_key}/issuetypes/{issue_type_id}"
-        field_resp = requests.get(field_url, headers=headers, auth=auth, timeout=20)
-
-        if field_resp.status_code == 200:
-            fields = field_resp.json().get("fields", [])
-            if isinstance(fields, list):
-                fields = {f["key"]: f for f in fields if "key" in f}
-            path = Path(f"fields/{project_key}")
-            path.mkdir(parents=True, exist_ok=True)
-            with open(path / f"{issue_type_id}.json", "w", encoding="utf-8") as f:
-                json.dump(fields, f, indent=2)
-            return True
-        else:
-            print(f"⚠️ Failed {project_key}:{issue_type_id} → {field_resp.status_code}")
+        return _content_hash(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+class CreatemetaSync:
+    """One createmeta crawl: bounded concurrency, Retry-After aware, writes only changed field metadata."""
+
+    def __init__(self, client, redis, concurrency=SYNC_CONCURRENCY):
+        self.client = client
+        self.redis = redis
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.stats = {"fetched": 0, "unchanged": 0, "rewritten": 0, "failed": 0}
+        self.field_hashes = {}
+
+    async def get_json(self, url, params=None):
+        for attempt in range(SYNC_MAX_RETRIES):
+            async with self.semaphore:
+                response = await self.client.get(url, params=params)
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code in (429, 502, 503, 504):
+                try:
+                    delay = float(response.headers.get("Retry-After"))
+                except (TypeError, ValueError):
+                    delay = 2 ** attempt
+                delay += random.uniform(0, 0.5)
+                print(f"⏳ {response.status_code} from Jira, retrying {url} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            print(f"⚠️ Failed {url} → {response.status_code}")
+            return None
+        print(f"❌ Giving up on {url} after {SYNC_MAX_RETRIES} attempts")
+        return None
+
+    async def get_paginated(self, url, *list_keys, params=None):
+        items, start_at = [], 0
+        while True:
+            data = await self.get_json(url, params={**(params or {}), "startAt": start_at, "maxResults": SYNC_PAGE_SIZE})
+            if data is None:
+                return None
+            page = next((data[k] for k in list_keys if k in data), [])
+            items.extend(page)
+            start_at += len(page)
+            if not page or data.get("isLast") or start_at >= data.get("total", 0):
+                return items
+
+    async def fetch_projects(self):
+        base = f"https://{JIRA_DOMAIN}/rest/api/3"
+        # action=create lists only projects the integration user can create issues in
+        projects = await self.get_paginated(f"{base}/project/search", "values", params={"action": "create"})
+        if projects is None:
+            return None
+
+        async def with_issue_types(p):
+            issue_types = await self.get_paginated(f"{base}/issue/createmeta/{p['key']}/issuetypes", "issueTypes", "values")
+            if not issue_types:
+                # Failed, forbidden or empty: publishing it would offer a project nobody can create in
+                print(f"⚠️ Skipping {p['key']}: no creatable issue types")
+                return None
+            return {
+                "id": p.get("id"),
+                "key": p["key"],
+                "name": p.get("name"),
+                "issuetypes": [
+                    {"id": it.get("id"), "name": it.get("name"), "subtask": it.get("subtask", False)}
+                    for it in issue_types
+                ]
+            }
+
+        results = await asyncio.gather(*(with_issue_types(p) for p in projects if p.get("key")))
+        return [p for p in results if p]
+
+    async def sync_field(self, project_key, issue_type_id):
+        url = f"https://{JIRA_DOMAIN}/rest/api/3/issue/createmeta/{project_key}/issuetypes/{issue_type_id}"
+        fields = await self.get_paginated(url, "fields", "values")
+        if fields is None:
+            self.stats["failed"] += 1
+            return
+        self.stats["fetched"] += 1
+        fields = {f["key"]: f for f in fields if "key" in f}
+        key = field_key(project_key, issue_type_id)
+        if self.field_hashes.get(key) == _content_hash(json.dumps(fields)):
+            self.stats["unchanged"] += 1
+            return
+        # Option indexes need no invalidation: the new catalog version recompiles the modal, and
+        # build_options_index re-points a field whose allowedValues hash changed
+        self.field_hashes[key] = await store_fields(self.redis, project_key, issue_type_id, fields)
+        self.stats["rewritten"] += 1
+
+    async def run(self):
+        print("🌐 Fetching Projects from Jira...")
+        projects = await self.fetch_projects()
+        if projects is None:
+            print("❌ Failed to fetch projects.")
+            return None
+
+        content = json.dumps(projects, indent=2)
+        file_path = Path(PROJECTS_FILE)
+        if _file_hash(file_path) != _content_hash(content):
+            await asyncio.to_thread(file_path.write_text, content, encoding="utf-8")
+        print(f"✅ Saved {len(projects)} projects.")
+
+        tasks = [
+            (p["key"], it["id"])
+            for p in projects
+            for it in p["issuetypes"]
+            if it.get("id")
+        ]
+        self.field_hashes = await self.redis.hgetall(FIELD_HASHES_KEY)
+        print(f"🚀 Starting field sync for {len(tasks)} issue types...")
+        await asyncio.gather(*(self.sync_field(key, issue_id) for key, issue_id in tasks))
+        print(
+            f"🎉 Field sync complete: {self.stats['fetched']} fetched, {self.stats['unchanged']} unchanged, "
+            f"{self.stats['rewritten']} rewritten, {self.stats['failed']} failed."
+        )
+        return self
+
+
+async def sync_project_metadata(redis):
+    async with httpx.AsyncClient(auth=auth, headers=headers, timeout=SYNC_TIMEOUT) as client:
+        return await CreatemetaSync(client, redis).run()
+
+
+class ProjectCatalog:
+    """In-memory project/issue type indexes that can be swapped for a newer snapshot at any time."""
+
+    def __init__(self):
+        self.projects = []
+        self.project_index = {}
+        self.issue_type_index = {}
+        self.version = None
+
+    def swap(self, projects, version):
+        project_index = {}
+        issue_type_index = {}
+        for p in projects:
+            key = p.get("key")
+            if not key:
+                continue
+            project_index[key] = p
+            for it in p.get("issuetypes", []):
+                issue_type_id = it.get("id")
+                issue_type_name = it.get("name")
+                if issue_type_id and issue_type_name:
+                    issue_type_index[f"{key}:{issue_type_id}"] = issue_type_name
+        # Rebind in one go so readers never see half-built indexes
+        self.projects, self.project_index, self.issue_type_index = projects, project_index, issue_type_index
+        self.version = version
+        print(f"📚 Project catalog v{version} loaded ({len(project_index)} projects).")
+
+    def load_snapshot(self):
+        file_path = Path(PROJECTS_FILE)
+        try:
+            content = file_path.read_text(encoding="utf-8")
+            projects = json.loads(content)
+        except FileNotFoundError:
+            print("📁 projects.json missing — serving an empty catalog until the refresh completes.")
             return False
+        except Exception as e:
+            print(f"❌ Error loading projects.json: {e}")
+            return False
+        if not isinstance(projects, list) or not projects:
+            print("⚠️ Empty or invalid projects.json — waiting for refresh.")
+            return False
+        self.swap(projects, _content_hash(content)[:12])
+        return True
+
 
-    except Exception as e:
-        print(f"❌ Error fetching {project_key}:{issue_type_id} → {e}")
+catalog = ProjectCatalog()
+
+
+async def _load_shared_catalog(redis):
+    # Hot-swap in whatever the elected worker last published
+    async with redis_pipeline("catalog.load", client=redis) as pipe:
+        pipe.get(CATALOG_VERSION_KEY)
+        pipe.get(CATALOG_PROJECTS_KEY)
+    version, content = pipe.results
+    if not version or not content or version == catalog.version:
         return False
+    catalog.swap(json.loads(content), version)
+    if _file_hash(Path(PROJECTS_FILE)) != _content_hash(content):
+        await asyncio.to_thread(Path(PROJECTS_FILE).write_text, content, encoding="utf-8")
+    return True
 
+async def _catalog_is_stale(redis):
+    refreshed_at = await redis.get(CATALOG_REFRESHED_AT_KEY)
+    if not refreshed_at:
+        return True
+    return datetime.fromisoformat(refreshed_at) < datetime.now(timezone.utc) - CATALOG_MAX_AGE
 
-def run_parallel_field_fetch(projects, max_workers=10):
-    tasks = []
-    for project in projects:
-        key = project.get("key")
-        if not key:
-            continue
-        for issuetype in project.get("issuetypes", []):
-            issue_id = issuetype.get("id")
-            if issue_id:
-                tasks.append((key, issue_id))
-
-    print(f"🚀 Starting parallel field fetch for {len(tasks)} issue types...")
-    saved_projects = set()
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(fetch_and_save_field, key, issue_id): (key, issue_id)
-            for key, issue_id in tasks
-        }
-
-        for future in as_completed(futures):
-            key, issue_id = futures[future]
-            try:
-                success=future.result()
-                if success and key not in saved_projects:
-                    print(f"📁 Saved fields for project: {key}")
-                    saved_projects.add(key)
-            except Exception as e:
-                print(f"❌ Exception in task {key}:{issue_id} → {e}")
-
-    print("🎉 Parallel field fetch complete.")
-
-def load_projects():
-    file_path = Path("projects.json")
-
-    def fetch_and_load():
-        fetch_and_save_projects()
-        with open(file_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-
-    if not file_path.exists():
-        print("📁 projects.json missing — triggering fetch...")
-        projects = fetch_and_load()
-    else:
+async def refresh_catalog(redis):
+    # Only the worker holding the lock crawls createmeta; everyone else picks up the new version
+    lock = redis.lock(CATALOG_LOCK_KEY, timeout=CATALOG_LOCK_TIMEOUT, blocking=False)
+    if not await lock.acquire():
+        return False
+    try:
+        if not await _catalog_is_stale(redis):
+            return False
+        sync = await sync_project_metadata(redis)
+        if sync is None:
+            return False
+        content = await asyncio.to_thread(Path(PROJECTS_FILE).read_text, encoding="utf-8")
+        # The version covers projects and every field payload, so any metadata change bumps it
+        field_digest = "".join(h for _, h in sorted(sync.field_hashes.items()))
+        version = _content_hash(content + field_digest)[:12]
+        async with redis_pipeline("catalog.publish", transaction=True, client=redis) as pipe:
+            pipe.set(CATALOG_PROJECTS_KEY, content)
+            pipe.set(CATALOG_VERSION_KEY, version)
+            pipe.set(CATALOG_REFRESHED_AT_KEY, datetime.now(timezone.utc).isoformat())
+        if version != catalog.version:
+            catalog.swap(json.loads(content), version)
+        return True
+    finally:
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                projects = json.load(f)
-                if not isinstance(projects, list) or not projects:
-                    print("⚠️ Empty or invalid projects.json — re-fetching...")
-                    projects = fetch_and_load()
-        except Exception as e:
-            print(f"❌ Error loading projects.json: {e} — triggering fetch.")
-            projects = fetch_and_load()
-
-    # 🔎 Indexes
-    project_index = {}
-    issue_type_index = {}
-
-    for p in projects:
-        key = p.get("key")
-        if not key:
-            continue
-        project_index[key] = p
-        for it in p.get("issuetypes", []):
-            issue_type_id = it.get("id")
-            issue_type_name = it.get("name")
-            if issue_type_id and issue_type_name:
-                issue_type_index[f"{key}:{issue_type_id}"] = issue_type_name
-
-    return projects, project_index, issue_type_index
+            await lock.release()
+        except Exception:
+            pass
 
+async def run_catalog_refresher(redis):
+    while True:
+        try:
+            await _load_shared_catalog(redis)
+            if await _catalog_is_stale(redis):
+                await refresh_catalog(redis)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Project catalog refresh failed: {e}")
+        await asyncio.sleep(CATALOG_CHECK_INTERVAL)
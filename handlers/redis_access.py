@@ -0,0 +1,61 @@
+from collections import Counter
+from contextlib import asynccontextmanager
+import redis.exceptions
+from handlers.app_state import redis_client
+
+# Round-trips to Redis, counted per call site
+_rtt_counts = Counter()
+
+def record_rtt(site, count=1):
+    _rtt_counts[site] += count
+
+def get_redis_rtt_counts():
+    return dict(_rtt_counts)
+
+async def redis_get(site, key):
+    record_rtt(site)
+    return await redis_client.get(key)
+
+async def redis_mget(site, keys):
+    if not keys:
+        return []
+    record_rtt(site)
+    return await redis_client.mget(keys)
+
+async def redis_setex(site, key, ttl_seconds, value):
+    record_rtt(site)
+    return await redis_client.setex(key, ttl_seconds, value)
+
+@asynccontextmanager
+async def redis_pipeline(site, transaction=False, client=None):
+    """Queue commands on the yielded pipeline; they are sent in a single round-trip on exit.
+
+    Results are available afterwards as ``pipe.results``. ``client`` overrides the shared connection.
+    """
+    async with (client or redis_client).pipeline(transaction=transaction) as pipe:
+        yield pipe
+        record_rtt(site)
+        pipe.results = await pipe.execute()
+
+async def redis_watch_update(site, key, update):
+    """Optimistic read-modify-write of one key, retried while another client changes it.
+
+    ``update(current)`` gets the stored value (or None) and returns ``(value, ttl_seconds)``
+    to write, or None to leave the key alone.
+    """
+    async with redis_client.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                await pipe.watch(key)
+                record_rtt(site, 2)
+                change = update(await pipe.get(key))
+                if change is None:
+                    await pipe.unwatch()
+                    return
+                pipe.multi()
+                pipe.setex(key, change[1], change[0])
+                record_rtt(site)
+                await pipe.execute()
+                return
+            except redis.exceptions.WatchError:
+                continue
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+import redis.exceptions
+from handlers.app_state import redis_client
+from handlers.redis_access import record_rtt
+
+SEARCH_CACHE_TTL = float(os.getenv("HOME_SEARCH_CACHE_TTL_SECONDS", "30"))
+SEARCH_CACHE_MAX_SIZE = int(os.getenv("HOME_SEARCH_CACHE_MAX_SIZE", "2000"))
+SEARCH_INVALIDATIONS_CHANNEL = "home_search:invalidations"
+
+# (slack_user_id, jql) -> (expires_at, issues), oldest first
+_results = OrderedDict()
+_inflight = {}
+# ("user", slack_user_id) / ("issue", issue_key) -> when it was last invalidated, to reject fetches that raced it
+_invalidated = {}
+_stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+# label -> [requests, response bytes, seconds]
+_fetches = {}
+
+
+async def cached_search(slack_user_id, jql, fetch):
+    """Return cached issues for (user, jql), or run ``fetch()`` once for all concurrent callers."""
+    key = (slack_user_id, jql)
+    entry = _results.get(key)
+    if entry and entry[0] > time.monotonic():
+        _stats["hits"] += 1
+        return entry[1]
+
+    task = _inflight.get(key)
+    if task is not None:
+        _stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    _stats["misses"] += 1
+    started = time.monotonic()
+    task = asyncio.ensure_future(fetch())
+    _inflight[key] = task
+    try:
+        issues = await asyncio.shield(task)
+    finally:
+        _inflight.pop(key, None)
+    if issues is not None and not _invalidated_since(started, slack_user_id, issues):
+        _store(key, issues)
+    return issues
+
+def _store(key, issues):
+    now = time.monotonic()
+    _results[key] = (now + SEARCH_CACHE_TTL, issues)
+    _results.move_to_end(key)
+    # Every entry gets the same TTL, so the oldest is always the first to expire
+    while _results and (len(_results) > SEARCH_CACHE_MAX_SIZE or next(iter(_results.values()))[0] <= now):
+        _results.popitem(last=False)
+
+def _invalidated_since(started, slack_user_id, issues):
+    marks = [("user", slack_user_id)] + [("issue", issue.get("key")) for issue in issues]
+    return any(_invalidated.get(mark, 0) >= started for mark in marks)
+
+def _drop(issue_key, slack_user_ids):
+    # Drop every cached result that shows this issue, plus all results of the given users
+    now = time.monotonic()
+    if issue_key:
+        _invalidated[("issue", issue_key)] = now
+    for slack_user_id in slack_user_ids:
+        _invalidated[("user", slack_user_id)] = now
+    stale = [
+        key for key, (_, issues) in _results.items()
+        if key[0] in slack_user_ids or any(issue.get("key") == issue_key for issue in issues)
+    ]
+    for key in stale:
+        del _results[key]
+    _stats["invalidations"] += len(stale)
+    # Marks only matter to fetches still in flight; those finish well within a cache TTL
+    for mark in [m for m, at in _invalidated.items() if at < now - SEARCH_CACHE_TTL]:
+        del _invalidated[mark]
+
+async def invalidate_issue(issue_key, slack_user_ids=()):
+    """Drop results showing ``issue_key`` (and all of ``slack_user_ids``) here and on every other worker."""
+    _drop(issue_key, slack_user_ids)
+    try:
+        record_rtt("search.invalidate")
+        await redis_client.publish(SEARCH_INVALIDATIONS_CHANNEL, json.dumps({"issue": issue_key, "users": list(slack_user_ids)}))
+    except redis.exceptions.RedisError as e:
+        print(f"⚠️ Home search invalidation publish failed: {e}")
+
+async def invalidate_user(slack_user_id):
+    await invalidate_issue(None, (slack_user_id,))
+
+async def run_search_invalidation_listener():
+    # Applies invalidations published by any worker (our own echo is harmless)
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(SEARCH_INVALIDATIONS_CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                data = json.loads(message["data"])
+                _drop(data.get("issue"), data.get("users", ()))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Home search invalidation listener failed: {e}")
+            # Invalidations may have been missed while disconnected
+            _results.clear()
+            await asyncio.sleep(5)
+        finally:
+            await pubsub.aclose()
+
+def record_search_fetch(label, size, elapsed):
+    totals = _fetches.setdefault(label, [0, 0, 0.0])
+    totals[0] += 1
+    totals[1] += size
+    totals[2] += elapsed
+
+def get_search_cache_stats():
+    lookups = _stats["hits"] + _stats["misses"] + _stats["coalesced"]
+    hit_rate = (_stats["hits"] + _stats["coalesced"]) / lookups if lookups else 0.0
+    fetches = {
+        label: {"requests": n, "avg_bytes": size // n, "avg_ms": round(elapsed * 1000 / n, 1)}
+        for label, (n, size, elapsed) in _fetches.items()
+    }
+    return {**_stats, "size": len(_results), "hit_rate": round(hit_rate, 3), "fetches": fetches}
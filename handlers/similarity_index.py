@@ -0,0 +1,256 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from handlers.app_state import redis_client, gptclient
+from handlers.issue_cache import normalize_issue
+from handlers.jql import jql_string
+from handlers.llm_scheduler import estimate_tokens, llm_scheduler
+from handlers.redis_access import record_rtt, redis_pipeline
+
+EMBEDDING_MODEL = os.getenv("SIMILARITY_EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = 256
+EMBEDDING_BATCH = 128
+SIMILARITY_FIELDS = "summary,description,status,issuetype,updated"
+SYNC_INTERVAL = int(os.getenv("SIMILARITY_SYNC_INTERVAL_SECONDS", "300"))
+# Incremental syncs never see deletions or moves; a full crawl this often prunes them
+FULL_SYNC_INTERVAL = int(os.getenv("SIMILARITY_FULL_SYNC_INTERVAL_SECONDS", str(6 * 60 * 60)))
+SYNC_LOCK_TIMEOUT = 60 * 10
+MAX_INDEXED_ISSUES = int(os.getenv("SIMILARITY_MAX_ISSUES", "5000"))
+MIN_SCORE = float(os.getenv("SIMILARITY_MIN_SCORE", "0.45"))
+RELOAD_CHECK_INTERVAL = 30
+DESCRIPTION_CHARS = 1000
+
+_indexes = {}
+_sync_tasks = {}
+_stats = {"queries": 0, "embed_ms": 0.0, "search_ms": 0.0, "cold_fallbacks": 0, "embedded": 0}
+
+
+def _vectors_key(project_key):
+    return f"similar:{project_key}:vectors"
+
+def _state_key(project_key):
+    return f"similar:{project_key}:state"
+
+def _lock_key(project_key):
+    return f"similar:{project_key}:lock"
+
+def issue_text(summary, description):
+    return f"{summary}\n{(description or '')[:DESCRIPTION_CHARS]}".strip()
+
+def _text_hash(text):
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+def _encode(vector):
+    return base64.b64encode(vector.astype(np.float32).tobytes()).decode()
+
+def _decode(data):
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+async def embed(texts):
+    """Unit-normalized embeddings, one row per text."""
+    vectors = []
+    for i in range(0, len(texts), EMBEDDING_BATCH):
+        batch = texts[i:i + EMBEDDING_BATCH]
+        response = await llm_scheduler.run("similarity", EMBEDDING_MODEL, estimate_tokens(texts=batch), lambda: gptclient.embeddings.create(
+            model=EMBEDDING_MODEL, input=batch, dimensions=EMBEDDING_DIMENSIONS
+        ))
+        vectors.extend(d.embedding for d in response.data)
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), EMBEDDING_DIMENSIONS)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+class ProjectIndex:
+    """In-memory cosine index over one project's issues, mirrored from a Redis hash."""
+
+    def __init__(self, project_key):
+        self.project_key = project_key
+        self.keys = []
+        self.meta = []
+        self.positions = {}
+        self.matrix = np.zeros((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+        self.rev = None
+        self.checked_at = 0.0
+
+    def upsert(self, rows):
+        # rows: [(issue_key, meta, vector)]
+        appended_keys, appended_meta, appended = [], [], []
+        for key, meta, vector in rows:
+            pos = self.positions.get(key)
+            if pos is None:
+                self.positions[key] = len(self.keys) + len(appended_keys)
+                appended_keys.append(key)
+                appended_meta.append(meta)
+                appended.append(vector)
+            else:
+                self.meta[pos] = meta
+                self.matrix[pos] = vector
+        if appended:
+            self.keys += appended_keys
+            self.meta += appended_meta
+            self.matrix = np.vstack([self.matrix, np.stack(appended)])
+
+    def remove(self, keys):
+        keep = [i for i, key in enumerate(self.keys) if key not in keys]
+        self.keys = [self.keys[i] for i in keep]
+        self.meta = [self.meta[i] for i in keep]
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        self.matrix = self.matrix[keep]
+
+    async def reload(self, force=False):
+        # Pick up vectors another worker embedded, at most every RELOAD_CHECK_INTERVAL seconds
+        now = time.monotonic()
+        if not force and now - self.checked_at < RELOAD_CHECK_INTERVAL:
+            return
+        self.checked_at = now
+        record_rtt("similar.reload")
+        rev = await redis_client.hget(_state_key(self.project_key), "rev")
+        if rev == self.rev:
+            return
+        record_rtt("similar.reload")
+        stored = await redis_client.hgetall(_vectors_key(self.project_key))
+        fresh = ProjectIndex(self.project_key)
+        fresh.upsert([
+            (key, meta, _decode(meta.pop("v")))
+            for key, meta in ((key, json.loads(raw)) for key, raw in stored.items())
+        ])
+        self.keys, self.meta, self.positions, self.matrix = fresh.keys, fresh.meta, fresh.positions, fresh.matrix
+        self.rev = rev
+
+    def search(self, vector, limit, issue_type=None):
+        if not self.keys:
+            return []
+        scores = self.matrix @ vector
+        if issue_type:
+            scores = np.where([m.get("type") == issue_type for m in self.meta], scores, -1.0)
+        top = np.argsort(-scores)[:limit] if len(scores) <= limit else np.argpartition(-scores, limit)[:limit]
+        ranked = sorted(((float(scores[i]), self.keys[i]) for i in top), reverse=True)
+        return [(key, score) for score, key in ranked if score >= MIN_SCORE]
+
+
+async def sync_project(index, fetch_page):
+    """Embed issues created or edited since the last sync. ``fetch_page(jql, fields, next_page_token)`` runs one Jira search page.
+
+    Every FULL_SYNC_INTERVAL the whole project is crawled instead, and indexed keys it no longer
+    returns (deleted, moved, or past MAX_INDEXED_ISSUES) are dropped.
+    """
+    lock = redis_client.lock(_lock_key(index.project_key), timeout=SYNC_LOCK_TIMEOUT, blocking=False)
+    if not await lock.acquire():
+        return
+    try:
+        await index.reload(force=True)
+        started = time.time()
+        record_rtt("similar.sync")
+        synced_at, full_synced_at = await redis_client.hmget(_state_key(index.project_key), "synced_at", "full_synced_at")
+        full = not full_synced_at or started - float(full_synced_at) > FULL_SYNC_INTERVAL
+        jql = f"project = {jql_string(index.project_key)}"
+        if synced_at and not full:
+            # Relative dates avoid JQL's per-user timezone; a minute of overlap is de-duplicated by text hash
+            minutes = int((started - float(synced_at)) // 60) + 2
+            jql += f" AND updated >= -{minutes}m"
+        jql += " ORDER BY updated DESC"
+
+        hashes = {key: meta.get("h") for key, meta in zip(index.keys, index.meta)}
+        next_page_token, seen, seen_keys = None, 0, set()
+        while seen < MAX_INDEXED_ISSUES:
+            data = await fetch_page(jql, SIMILARITY_FIELDS, next_page_token)
+            if data is None:
+                return
+            issues = [normalize_issue(issue) for issue in data.get("issues", [])]
+            seen += len(issues)
+            seen_keys.update(issue["key"] for issue in issues)
+            pending = []
+            for issue in issues:
+                text = issue_text(issue["summary"], issue["description"])
+                if hashes.get(issue["key"]) != _text_hash(text):
+                    pending.append((issue, text))
+            if pending:
+                vectors = await embed([text for _, text in pending])
+                _stats["embedded"] += len(pending)
+                rows = []
+                for (issue, text), vector in zip(pending, vectors):
+                    meta = {"summary": issue["summary"], "type": issue["type"], "h": _text_hash(text)}
+                    rows.append((issue["key"], meta, vector))
+                    hashes[issue["key"]] = meta["h"]
+                record_rtt("similar.sync")
+                await redis_client.hset(_vectors_key(index.project_key), mapping={
+                    key: json.dumps({**meta, "v": _encode(vector)}) for key, meta, vector in rows
+                })
+                index.upsert(rows)
+            next_page_token = None if data.get("isLast", True) else data.get("nextPageToken")
+            if not next_page_token:
+                break
+
+        stale = [key for key in index.keys if key not in seen_keys] if full else []
+        async with redis_pipeline("similar.sync", transaction=True) as pipe:
+            if stale:
+                pipe.hdel(_vectors_key(index.project_key), *stale)
+            pipe.hset(_state_key(index.project_key), mapping={"synced_at": started, **({"full_synced_at": started} if full else {})})
+            pipe.hincrby(_state_key(index.project_key), "rev", 1)
+        if stale:
+            index.remove(set(stale))
+        index.rev = str(pipe.results[-1])
+        print(f"🧭 Similarity index for {index.project_key}: {len(index.keys)} issues ({seen} scanned, {len(stale)} pruned).")
+    finally:
+        try:
+            await lock.release()
+        except Exception:
+            pass
+
+def _schedule_sync(index, fetch_page):
+    task = _sync_tasks.get(index.project_key)
+    if task and not task.done():
+        return
+
+    async def run():
+        try:
+            await sync_project(index, fetch_page)
+        except Exception as e:
+            print(f"⚠️ Similarity sync failed for {index.project_key}: {e}")
+
+    _sync_tasks[index.project_key] = asyncio.create_task(run())
+
+async def _needs_sync(project_key):
+    record_rtt("similar.state")
+    synced_at = await redis_client.hget(_state_key(project_key), "synced_at")
+    return not synced_at or time.time() - float(synced_at) > SYNC_INTERVAL
+
+async def find_similar(project_key, summary, description, issue_type, fetch_page, limit=5):
+    """Rank indexed issues of ``project_key`` against a draft ticket.
+
+    Returns [(issue_key, score)], or None while the project's index is still cold.
+    """
+    index = _indexes.get(project_key)
+    if index is None:
+        index = _indexes[project_key] = ProjectIndex(project_key)
+    await index.reload()
+    if await _needs_sync(project_key):
+        _schedule_sync(index, fetch_page)
+    if not index.keys:
+        _stats["cold_fallbacks"] += 1
+        return None
+
+    started = time.monotonic()
+    vector = (await embed([issue_text(summary, description)]))[0]
+    embedded = time.monotonic()
+    ranked = index.search(vector, limit, issue_type)
+    _stats["queries"] += 1
+    _stats["embed_ms"] += (embedded - started) * 1000
+    _stats["search_ms"] += (time.monotonic() - embedded) * 1000
+    return ranked
+
+def get_similarity_stats():
+    queries = _stats["queries"]
+    return {
+        "queries": queries,
+        "avg_embed_ms": round(_stats["embed_ms"] / queries, 1) if queries else 0.0,
+        "avg_search_ms": round(_stats["search_ms"] / queries, 2) if queries else 0.0,
+        "cold_fallbacks": _stats["cold_fallbacks"],
+        "embedded": _stats["embedded"],
+        "indexed": {key: len(index.keys) for key, index in _indexes.items()}
+    }
@@ -0,0 +1,56 @@
+import hashlib
+import os
+import time
+from handlers.app_state import redis_client
+from handlers.redis_access import redis_pipeline
+
+SUMMARY_CACHE_MAX = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "5000"))
+SUMMARY_CACHE_TTL = 60 * 60 * 24 * 30
+SUMMARY_LRU_KEY = "summary_cache:lru"
+
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def summary_digest(*parts):
+    # Content-addressed: the same prompt under the same model always yields the same key
+    return hashlib.sha1("\x00".join(parts).encode()).hexdigest()[:20]
+
+def _summary_key(issue_key, digest):
+    return f"summary_cache:{issue_key}:{digest}"
+
+async def get_cached_summary(issue_key, digest):
+    key = _summary_key(issue_key, digest)
+    try:
+        async with redis_pipeline("summary.get") as pipe:
+            pipe.get(key)
+            # zadd XX only refreshes recency for entries that are still tracked
+            pipe.zadd(SUMMARY_LRU_KEY, {key: time.time()}, xx=True)
+        summary = pipe.results[0]
+    except Exception as e:
+        print(f"⚠️ Summary cache read failed for {issue_key}: {e}")
+        return None
+    _stats["hits" if summary else "misses"] += 1
+    return summary
+
+async def save_summary(issue_key, digest, summary):
+    key = _summary_key(issue_key, digest)
+    try:
+        async with redis_pipeline("summary.save") as pipe:
+            pipe.setex(key, SUMMARY_CACHE_TTL, summary)
+            pipe.zadd(SUMMARY_LRU_KEY, {key: time.time()})
+            pipe.zcard(SUMMARY_LRU_KEY)
+        size = pipe.results[2]
+        if size > SUMMARY_CACHE_MAX:
+            # Evict the least recently read summaries beyond the cap
+            async with redis_pipeline("summary.evict") as pipe:
+                pipe.zpopmin(SUMMARY_LRU_KEY, size - SUMMARY_CACHE_MAX)
+            evicted = [k for k, _ in pipe.results[0]]
+            if evicted:
+                await redis_client.delete(*evicted)
+                _stats["evictions"] += len(evicted)
+    except Exception as e:
+        print(f"⚠️ Summary cache write failed for {issue_key}: {e}")
+
+def get_summary_cache_stats():
+    lookups = _stats["hits"] + _stats["misses"]
+    return {**_stats, "hit_rate": round(_stats["hits"] / lookups, 3) if lookups else 0.0}
@@ -0,0 +1,128 @@
+import heapq
+import re
+
+MAX_PREFIX_LEN = 12
+SHORT_QUERY_LEN = 2
+SHORT_QUERY_SLACK = 8
+_WORD_SPLIT = re.compile(r"[\s._@\-]+")
+
+
+def display_label(u):
+    return u.get("real_name") or u.get("profile", {}).get("display_name") or u.get("name", "")
+
+def _terms(u):
+    profile = u.get("profile", {})
+    values = [
+        u.get("real_name", ""),
+        u.get("name", ""),
+        profile.get("display_name", ""),
+        profile.get("real_name_normalized", ""),
+        profile.get("email", ""),
+    ]
+    return [v.lower() for v in values if v]
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class UserSearchIndex:
+    """Word-prefix and trigram index over the Slack user cache, updated one user at a time."""
+
+    def __init__(self):
+        self._prefixes = {}
+        self._trigrams = {}
+        self._keys = {}
+        self._users = {}
+        # Ranked ids for empty/one/two-letter queries, whose candidate sets are large
+        self._short_results = {}
+
+    def add(self, u):
+        uid = u["id"]
+        self.remove(uid)
+        terms = _terms(u)
+        prefixes, trigrams = set(), set()
+        for term in terms:
+            for word in [term] + _WORD_SPLIT.split(term):
+                for i in range(1, min(len(word), MAX_PREFIX_LEN) + 1):
+                    prefixes.add(word[:i])
+            trigrams |= _trigrams(term)
+        for p in prefixes:
+            self._prefixes.setdefault(p, set()).add(uid)
+        for t in trigrams:
+            self._trigrams.setdefault(t, set()).add(uid)
+        self._keys[uid] = (prefixes, trigrams, terms, display_label(u).lower())
+        self._users[uid] = u
+        self._short_results.clear()
+
+    def remove(self, uid):
+        keys = self._keys.pop(uid, None)
+        self._users.pop(uid, None)
+        if not keys:
+            return
+        self._short_results.clear()
+        prefixes, trigrams, _, _ = keys
+        for p in prefixes:
+            bucket = self._prefixes.get(p)
+            if bucket is not None:
+                bucket.discard(uid)
+                if not bucket:
+                    del self._prefixes[p]
+        for t in trigrams:
+            bucket = self._trigrams.get(t)
+            if bucket is not None:
+                bucket.discard(uid)
+                if not bucket:
+                    del self._trigrams[t]
+
+    def clear(self):
+        self._prefixes.clear()
+        self._trigrams.clear()
+        self._keys.clear()
+        self._users.clear()
+        self._short_results.clear()
+
+    def _candidates(self, query):
+        if len(query) <= MAX_PREFIX_LEN:
+            found = set(self._prefixes.get(query, ()))
+        else:
+            found = set()
+        if len(query) >= 3:
+            buckets = sorted((self._trigrams.get(t, set()) for t in _trigrams(query)), key=len)
+            if buckets and buckets[0]:
+                substring_hits = set(buckets[0]).intersection(*buckets[1:])
+                found |= {uid for uid in substring_hits if any(query in term for term in self._keys[uid][2])}
+        return found
+
+    def _rank(self, uid, query):
+        _, _, terms, label = self._keys[uid]
+        if label == query or query in terms:
+            return (0, label)
+        if label.startswith(query) or any(term.startswith(query) for term in terms):
+            return (1, label)
+        if query in self._prefixes and uid in self._prefixes[query]:
+            return (2, label)
+        return (3, label)
+
+    def _ranked(self, query, limit, exclude):
+        if query:
+            ranked = ((self._rank(uid, query), uid) for uid in self._candidates(query) if uid not in exclude)
+        else:
+            ranked = ((self._keys[uid][3], uid) for uid in self._users if uid not in exclude)
+        return [uid for _, uid in heapq.nsmallest(limit, ranked)]
+
+    def search(self, query, limit=100, exclude=()):
+        query = (query or "").strip().lower()
+        if len(query) > SHORT_QUERY_LEN:
+            ids = self._ranked(query, limit, exclude)
+        else:
+            cached = self._short_results.get(query)
+            if cached is None or cached[0] < limit:
+                cached = (limit, self._ranked(query, limit + SHORT_QUERY_SLACK, ()))
+                self._short_results[query] = cached
+            ids = [uid for uid in cached[1] if uid not in exclude][:limit]
+            if len(ids) < limit and len(cached[1]) == cached[0] + SHORT_QUERY_SLACK:
+                ids = self._ranked(query, limit, exclude)
+        return [self._users[uid] for uid in ids]
+
+    def __len__(self):
+        return len(self._users)
@@ -1,8 +1,11 @@
 import os
 import json
+import asyncio
 from handlers.app_state import redis_client
 import redis.exceptions  # Add this at the top
-from handlers.jira_token_store import redis_client
+from slack_sdk.errors import SlackApiError
+from handlers.redis_access import redis_pipeline, record_rtt
+from handlers.user_search import UserSearchIndex
 from datetime import datetime, timedelta, timezone
 
 """redis_client = aioredis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379"), decode_responses=True)"""
@@ -10,70 +13,236 @@ from datetime import datetime, timedelta, timezone
 # Constants
 USER_CACHE_TTL = 60 * 60 * 2  # 2 hours
 DEFAULT_AVATAR = "https://cdn-icons-png.flaticon.com/512/149/149071.png"
-REDIS_USER_LIST_KEY = "slack:users"
+REDIS_USER_HASH_KEY = "slack:users:by_id"
+REDIS_USER_SYNCED_KEY = "slack:users:synced"
+REDIS_USER_CHANGES_CHANNEL = "slack:users:changes"
+USERS_LIST_PAGE_SIZE = 200
+USERS_LIST_MAX_RETRIES = 5
+USER_SYNC_LOCK_KEY = "slack:users:sync_lock"
+USER_SYNC_LOCK_TIMEOUT = 60 * 10
+USER_SYNC_LOCK_WAIT = 60 * 2
+_sync_inflight = {}
 
 # In-memory user cache
 _user_cache = {
-    "data": None,
     "expires_at": datetime.now(timezone.utc),
     "by_email": {},
     "by_username": {},
-    "by_id": {}
+    "by_id": {},
+    # Set when the change listener lost its subscription and may have missed deltas
+    "missed_changes": False
 }
+_user_search = UserSearchIndex()
 
 def is_valid_user(u):
     return u.get("id") != "USLACKBOT" and not u.get("deleted") and not u.get("is_bot") and not u.get("is_app_user")
 
+def _user_names(u):
+    profile = u.get("profile", {})
+    uname = u.get("name", "").lower()
+    display = profile.get("display_name", "").lower()
+    real = profile.get("real_name_normalized", "").lower()
+    return {name for name in (uname, display, real) if name}
+
+def unindex_user(user_id):
+    _user_search.remove(user_id)
+    old = _user_cache["by_id"].pop(user_id, None)
+    if not old:
+        return
+    email = old.get("profile", {}).get("email")
+    if email and _user_cache["by_email"].get(email) is old:
+        del _user_cache["by_email"][email]
+    for name in _user_names(old):
+        if _user_cache["by_username"].get(name) is old:
+            del _user_cache["by_username"][name]
+
+def index_user(u):
+    unindex_user(u["id"])
+    email = u.get("profile", {}).get("email")
+    if email:
+        _user_cache["by_email"][email] = u
+    for name in _user_names(u):
+        _user_cache["by_username"][name] = u
+    _user_cache["by_id"][u["id"]] = u
+    _user_search.add(u)
+
 def index_users(users):
     _user_cache["by_email"].clear()
     _user_cache["by_username"].clear()
     _user_cache["by_id"].clear()
-
+    _user_search.clear()
     for u in users:
-        profile = u.get("profile", {})
-        email = profile.get("email")
-        uname = u.get("name", "").lower()
-        display = profile.get("display_name", "").lower()
-        real = profile.get("real_name_normalized", "").lower()
-
-        if email:
-            _user_cache["by_email"][email] = u
-        for name in {uname, display, real}:
-            if name:
-                _user_cache["by_username"][name] = u
-        _user_cache["by_id"][u["id"]] = u
+        index_user(u)
 
-async def resolve_user(text, client, get_id, force_refresh=False):
+def apply_user_delta(u):
+    if is_valid_user(u):
+        index_user(u)
+    else:
+        unindex_user(u.get("id"))
+
+async def _users_list_page(client, cursor):
+    # users.list is Tier 2; wait out a 429 and retry the same cursor instead of restarting the crawl
+    for attempt in range(USERS_LIST_MAX_RETRIES + 1):
+        try:
+            return await client.users_list(limit=USERS_LIST_PAGE_SIZE, cursor=cursor)
+        except SlackApiError as e:
+            if e.response.status_code != 429 or attempt == USERS_LIST_MAX_RETRIES:
+                raise
+            headers = e.response.headers or {}
+            delay = int(headers.get("Retry-After") or headers.get("retry-after") or 1)
+            print(f"⏳ users.list rate limited, retrying page in {delay}s")
+            await asyncio.sleep(delay)
+
+async def sync_all_users(client):
+    # Paginated users.list; each page is written to the Redis hash as it arrives
+    print("🔁 Syncing Slack user directory...")
     now = datetime.now(timezone.utc)
+    seen_ids = set()
+    cursor = None
+    while True:
+        response = await _users_list_page(client, cursor)
+        members = response["members"]
+        valid = {u["id"]: json.dumps(u) for u in members if is_valid_user(u)}
+        invalid = [u["id"] for u in members if not is_valid_user(u)]
+        try:
+            async with redis_pipeline("users.sync") as pipe:
+                if valid:
+                    pipe.hset(REDIS_USER_HASH_KEY, mapping=valid)
+                if invalid:
+                    pipe.hdel(REDIS_USER_HASH_KEY, *invalid)
+        except redis.exceptions.RedisError as e:
+            print(f"⚠️ Redis set failed: {e}")
+        for u in members:
+            apply_user_delta(u)
+        seen_ids.update(valid)
+
+        cursor = response.get("response_metadata", {}).get("next_cursor")
+        if not cursor:
+            break
 
+    # Drop users that vanished from the directory entirely
+    for uid in set(_user_cache["by_id"]) - seen_ids:
+        unindex_user(uid)
     try:
-        if force_refresh or not await redis_client.exists(REDIS_USER_LIST_KEY) or _user_cache["expires_at"] <= now:
-            print("🔁 Fetching fresh user list from Slack...")
-            response = await client.users_list()
-            members = response["members"]
-            valid_users = [u for u in members if is_valid_user(u)]
+        record_rtt("users.sync")
+        stale = set(await redis_client.hkeys(REDIS_USER_HASH_KEY)) - seen_ids
+        async with redis_pipeline("users.sync") as pipe:
+            if stale:
+                pipe.hdel(REDIS_USER_HASH_KEY, *stale)
+            pipe.setex(REDIS_USER_SYNCED_KEY, USER_CACHE_TTL, now.isoformat())
+    except redis.exceptions.RedisError as e:
+        print(f"⚠️ Redis set failed: {e}")
 
-            try:
-                await redis_client.setex(REDIS_USER_LIST_KEY, USER_CACHE_TTL, json.dumps(valid_users))
-            except redis.exceptions.RedisError as e:
-                print(f"⚠️ Redis set failed: {e}")
+    _user_cache["expires_at"] = now + timedelta(seconds=USER_CACHE_TTL)
+    _user_cache["missed_changes"] = False
+    print(f"✅ Synced {len(seen_ids)} Slack users.")
+
+async def sync_directory(client, force=False):
+    # One crawl at a time: concurrent callers in this process share a task, other workers wait on the lock
+    task = _sync_inflight.get(REDIS_USER_HASH_KEY)
+    if task is None:
+        task = asyncio.ensure_future(_sync_with_lock(client, force))
+        _sync_inflight[REDIS_USER_HASH_KEY] = task
+        task.add_done_callback(lambda _: _sync_inflight.pop(REDIS_USER_HASH_KEY, None))
+    else:
+        print("⏳ Awaiting in-flight Slack user sync")
+    return await asyncio.shield(task)
 
-            _user_cache["data"] = valid_users
-            _user_cache["expires_at"] = now + timedelta(seconds=USER_CACHE_TTL)
-            index_users(valid_users)
+async def _sync_with_lock(client, force):
+    requested_at = datetime.now(timezone.utc)
+    lock = redis_client.lock(USER_SYNC_LOCK_KEY, timeout=USER_SYNC_LOCK_TIMEOUT, blocking_timeout=USER_SYNC_LOCK_WAIT)
+    if not await lock.acquire():
+        raise Exception("❌ Timed out waiting for the Slack user sync.")
+    try:
+        async with redis_pipeline("users.sync") as pipe:
+            pipe.get(REDIS_USER_SYNCED_KEY)
+            pipe.ttl(REDIS_USER_SYNCED_KEY)
+        synced_at, ttl = pipe.results
+        # Another worker synced while we waited for the lock
+        if synced_at and ttl > 0 and (not force or datetime.fromisoformat(synced_at) >= requested_at):
+            await _adopt_shared_directory(ttl)
+        else:
+            await sync_all_users(client)
+    finally:
+        try:
+            await lock.release()
+        except redis.exceptions.LockError:
+            pass
 
-        elif not _user_cache["data"]:
+async def _adopt_shared_directory(ttl):
+    # Deltas from the change listener keep a loaded index current; only rebuild when there is none or we missed some
+    if not _user_cache["by_id"] or _user_cache["missed_changes"]:
+        record_rtt("users.load")
+        cached = await redis_client.hgetall(REDIS_USER_HASH_KEY)
+        index_users(json.loads(u) for u in cached.values())
+        _user_cache["missed_changes"] = False
+    _user_cache["expires_at"] = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+
+async def apply_user_change(user):
+    # Called for user_change / team_join events: write the delta and tell every worker about it
+    try:
+        async with redis_pipeline("users.change") as pipe:
+            if is_valid_user(user):
+                pipe.hset(REDIS_USER_HASH_KEY, user["id"], json.dumps(user))
+            else:
+                pipe.hdel(REDIS_USER_HASH_KEY, user["id"])
+            pipe.publish(REDIS_USER_CHANGES_CHANNEL, json.dumps(user))
+    except redis.exceptions.RedisError as e:
+        print(f"⚠️ Redis user update failed: {e}")
+    apply_user_delta(user)
+
+async def run_user_change_listener():
+    # Applies deltas published by any worker to this worker's in-process indexes
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(REDIS_USER_CHANGES_CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                apply_user_delta(json.loads(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ User change listener failed: {e}")
+            _user_cache["missed_changes"] = True
+            await asyncio.sleep(5)
+        finally:
+            await pubsub.aclose()
+
+async def ensure_users_loaded(client, force_refresh=False):
+    now = datetime.now(timezone.utc)
+
+    try:
+        local_fresh = _user_cache["by_id"] and not _user_cache["missed_changes"] and _user_cache["expires_at"] > now
+        if force_refresh:
+            await sync_directory(client, force=True)
+        elif not local_fresh:
+            # Another worker may already have synced the directory; adopt it while its sync marker is alive
+            ttl = -2
             try:
-                cached = await redis_client.get(REDIS_USER_LIST_KEY)
-                if cached:
-                    _user_cache["data"] = json.loads(cached)
-                    _user_cache["expires_at"] = now + timedelta(seconds=USER_CACHE_TTL)
-                    index_users(_user_cache["data"])
+                record_rtt("users.load")
+                ttl = await redis_client.ttl(REDIS_USER_SYNCED_KEY)
             except redis.exceptions.RedisError as e:
                 print(f"⚠️ Redis get failed: {e}")
 
+            if ttl > 0:
+                await _adopt_shared_directory(ttl)
+            else:
+                await sync_directory(client)
+
     except Exception as e:
         print("❌ Slack user fetch failed:", e)
+        return False
+    return True
+
+async def search_users(query, client, limit=100, exclude=()):
+    if not await ensure_users_loaded(client):
+        return []
+    return _user_search.search(query, limit=limit, exclude=exclude)
+
+async def resolve_user(text, client, get_id, force_refresh=False):
+    if not await ensure_users_loaded(client, force_refresh):
         return None if get_id != "profile" else (None, DEFAULT_AVATAR)
 
     # Resolving user based on mode
@@ -91,14 +260,14 @@ async def resolve_user(text, client, get_id, force_refresh=False):
         user = _user_cache["by_id"].get(text)
         return user["profile"].get("email") if user else None
 
-    return _user_cache["data"]
+    return list(_user_cache["by_id"].values())
 
 def fetchUsers(client):
     return resolve_user("", client, get_id="data", force_refresh=True)
 
 async def refresh_user_cache(client):
-    await redis_client.delete(REDIS_USER_LIST_KEY)
-    _user_cache["data"] = None
+    await redis_client.delete(REDIS_USER_HASH_KEY, REDIS_USER_SYNCED_KEY)
+    index_users([])
     _user_cache["expires_at"] = datetime.now(timezone.utc)
     users =await resolve_user("", client, get_id="data", force_refresh=True)
     return users
@@ -0,0 +1,31 @@
+"""Replay recorded Jira webhook deliveries against a running JiraMate, e.g. for offline testing.
+
+    python replay_webhooks.py [fixtures/jira_webhooks.json] [http://localhost:3000/jira/webhook]
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import hashlib
+import hmac
+import json
+import os
+import sys
+import httpx
+
+fixture = sys.argv[1] if len(sys.argv) > 1 else "fixtures/jira_webhooks.json"
+url = sys.argv[2] if len(sys.argv) > 2 else "http://localhost:3000/jira/webhook"
+secret = os.getenv("JIRA_WEBHOOK_SECRET")
+if not secret:
+    sys.exit("JIRA_WEBHOOK_SECRET must be set; JiraMate rejects unsigned deliveries.")
+
+with open(fixture, encoding="utf-8") as f:
+    events = json.load(f)
+
+for event in events:
+    body = json.dumps(event).encode()
+    headers = {
+        "Content-Type": "application/json",
+        "X-Hub-Signature": "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    }
+    response = httpx.post(url, content=body, headers=headers)
+    print(f"{'✅' if response.status_code == 200 else '❌'} {event.get('webhookEvent')} → {response.status_code} {response.text}")
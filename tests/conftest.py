@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import timezone
+from cryptography.fernet import Fernet
+
+# Settings the handlers read at import time
+_db_path = os.path.join(tempfile.mkdtemp(prefix="jiramate-tests-"), "tokens.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_db_path}")
+os.environ.setdefault("JIRA_TOKEN_SECRET", Fernet.generate_key().decode())
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("SLACK_BOT_TOKEN", "xoxb-test")
+os.environ.setdefault("SLACK_SIGNING_SECRET", "test-signing-secret")
+os.environ.setdefault("JIRA_WEBHOOK_SECRET", "test-webhook-secret")
+os.environ.setdefault("JIRA_DOMAIN", "example.atlassian.net")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakeredis
+import pytest
+import handlers.app_state
+
+
+def _as_utc(token, *args):
+    for column in ("token_expires_at", "connected_at"):
+        value = getattr(token, column)
+        if value is not None and value.tzinfo is None:
+            setattr(token, column, value.replace(tzinfo=timezone.utc))
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    """An in-memory Redis swapped in for every module that imported ``redis_client``."""
+    fake = fakeredis.FakeAsyncRedis(decode_responses=True)
+    original = handlers.app_state.redis_client
+    for name, module in list(sys.modules.items()):
+        if (name == "app" or name.startswith("handlers.")) and getattr(module, "redis_client", None) is original:
+            monkeypatch.setattr(module, "redis_client", fake)
+    return fake
+
+
+@pytest.fixture
+def run():
+    """``asyncio.run`` that also closes pooled DB connections before the loop goes away."""
+    from handlers.jira_models import async_engine
+
+    def runner(coro):
+        async def main():
+            try:
+                return await coro
+            finally:
+                await async_engine.dispose()
+        return asyncio.run(main())
+    return runner
+
+
+@pytest.fixture
+def db():
+    """Fresh ``jira_tokens`` table on the async engine."""
+    from sqlalchemy import event
+    from handlers.jira_models import Base, JiraToken, async_engine
+
+    # SQLite drops the timezone Postgres keeps on DateTime(timezone=True)
+    if not event.contains(JiraToken, "load", _as_utc):
+        event.listen(JiraToken, "load", _as_utc)
+        event.listen(JiraToken, "refresh", _as_utc)
+
+    async def reset():
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        # Connections are bound to the loop that opened them; each test runs its own loop
+        await async_engine.dispose()
+
+    asyncio.run(reset())
+    return async_engine
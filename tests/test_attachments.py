@@ -0,0 +1,104 @@
+import asyncio
+import tracemalloc
+import httpx
+import pytest
+import handlers.jira_client as jira_client
+
+FILE_SIZE = 40 * 1024 * 1024
+CHUNK = 64 * 1024
+
+
+class LocalSlackAndJira:
+    """One local HTTP server playing both Slack's file host (GET) and Jira's attachment endpoint (POST)."""
+
+    def __init__(self):
+        self.uploaded = 0
+        self.upload_head = b""
+
+    async def handle(self, reader, writer):
+        request_line = await reader.readline()
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if request_line.startswith(b"GET"):
+            writer.write(f"HTTP/1.1 200 OK\r\nContent-Length: {FILE_SIZE}\r\n\r\n".encode())
+            block = b"x" * CHUNK
+            for _ in range(FILE_SIZE // CHUNK):
+                writer.write(block)
+                await writer.drain()
+        else:
+            remaining = int(headers["content-length"])
+            while remaining:
+                data = await reader.read(min(CHUNK, remaining))
+                if not data:
+                    break
+                if len(self.upload_head) < 200:
+                    self.upload_head += data[:200]
+                self.uploaded += len(data)
+                remaining -= len(data)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n[]")
+        await writer.drain()
+        writer.close()
+
+
+class ToLocal(httpx.AsyncBaseTransport):
+    # Sends api.atlassian.com and files.slack.com requests to the local server
+    def __init__(self, port):
+        self.port = port
+        self.inner = httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        request.url = request.url.copy_with(scheme="http", host="127.0.0.1", port=self.port)
+        return await self.inner.handle_async_request(request)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+@pytest.fixture
+def jira_token(monkeypatch):
+    async def token(slack_user_id, http_client, active=True):
+        return {"access_token": "access", "cloud_id": "cloud-1"}
+    monkeypatch.setattr(jira_client, "get_valid_jira_token", token)
+
+
+def test_relay_streams_without_buffering_the_file(jira_token):
+    server = LocalSlackAndJira()
+
+    async def main():
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with httpx.AsyncClient(transport=ToLocal(port), timeout=30) as client:
+            tracemalloc.start()
+            ok = await jira_client.attach_file_to_ticket("U1", "SHOP-1", "big.bin", "https://files.slack.com/big.bin", client)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        listener.close()
+        return ok, peak
+
+    ok, peak = asyncio.run(main())
+    assert ok
+    assert server.uploaded > FILE_SIZE
+    assert b'filename="big.bin"' in server.upload_head
+    # Roughly a few chunks in flight, nowhere near the 40 MB file
+    assert peak < 8 * 1024 * 1024, f"peak {peak / 1024 / 1024:.1f} MB"
+
+
+def test_files_over_the_cap_are_refused(jira_token, monkeypatch):
+    monkeypatch.setattr(jira_client, "ATTACHMENT_MAX_BYTES", 1024 * 1024)
+    server = LocalSlackAndJira()
+
+    async def main():
+        with pytest.raises(jira_client.AttachmentTooLarge):
+            await jira_client.attach_file_to_ticket("U1", "SHOP-1", "big.bin", "https://files.slack.com/big.bin", None, size=FILE_SIZE)
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with httpx.AsyncClient(transport=ToLocal(port), timeout=30) as client:
+            # Slack's size was unknown up front; the download's Content-Length gives it away
+            with pytest.raises(jira_client.AttachmentTooLarge):
+                await jira_client.attach_file_to_ticket("U1", "SHOP-1", "big.bin", "https://files.slack.com/big.bin", client)
+        listener.close()
+
+    asyncio.run(main())
+    assert server.uploaded == 0
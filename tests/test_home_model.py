@@ -0,0 +1,22 @@
+import handlers.home_model as home_model
+
+
+def _model():
+    return {
+        "assigned": [{"key": "SHOP-1", "status": "To Do"}, {"key": "SHOP-2", "status": "To Do"}],
+        "watching": [{"key": "SHOP-3", "status": "To Do"}]
+    }
+
+
+def test_status_patch_uses_the_target_status():
+    model = _model()
+    home_model.set_status("SHOP-2", "In Progress")(model)
+    assert model["assigned"][0] == {"key": "SHOP-2", "status": "In Progress"}
+
+
+def test_done_transitions_drop_the_issue():
+    model = _model()
+    home_model.set_status("SHOP-1", "Closed", done=True)(model)
+    home_model.set_status("SHOP-3", "Closed", done=True)(model)
+    assert [i["key"] for i in model["assigned"]] == ["SHOP-2"]
+    assert model["watching"] == []
@@ -0,0 +1,70 @@
+import json
+import os
+from fastapi.testclient import TestClient
+import app
+import handlers.issue_cache as issue_cache
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "jira_webhooks.json")
+
+
+def _events():
+    with open(FIXTURE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_replayed_webhooks_keep_the_cache_in_step(redis, run):
+    events = _events()
+
+    async def main():
+        states = []
+        for event in events:
+            assert await issue_cache.apply_webhook_event(event) == "SHOP-42"
+            states.append((await issue_cache.get_cached_issues(["SHOP-42"])).get("SHOP-42"))
+        return states
+
+    created, started, commented, edited, uncommented, deleted = run(main())
+    assert created["description"] == "Carts with more than 50 items time out at payment. Seen on web and mobile since Tuesday."
+    assert created["description_head"] == "Carts with more than 50 items time out at payment."
+    assert started["status"] == "In Progress"
+    assert [c["text"] for c in commented["comments"]] == [
+        "Reproduced with 60 items. The payment service call takes ~40s. [~accountid:5b10ac8d82e05b22cc7d4ef5] can you take a look?"
+    ]
+    assert commented["comments"][0]["author"] == "Grace Hopper"
+    assert edited["description"].endswith("*Workaround:* split the order into two carts.")
+    assert uncommented["comments"] == []
+    assert deleted is None
+
+
+def test_adf_bodies_from_rest_still_normalize():
+    issue = {"key": "SHOP-1", "fields": {
+        "description": {"type": "doc", "content": [
+            {"type": "paragraph", "content": [{"type": "text", "text": "First line."}]},
+            {"type": "paragraph", "content": [{"type": "text", "text": "Second."}]}
+        ]},
+        "comment": {"comments": [{"id": "1", "author": {"displayName": "Ada"}, "body": {"type": "doc", "content": [
+            {"type": "paragraph", "content": [{"type": "mention", "attrs": {"text": "@Grace"}}, {"type": "text", "text": "please check"}]}
+        ]}}]}
+    }}
+    entry = issue_cache.normalize_issue(issue)
+    assert entry["description"] == "First line. Second."
+    assert entry["description_head"] == "First line."
+    assert entry["comments"][0]["text"] == "@Grace please check"
+
+
+def test_webhook_requires_a_valid_signature(monkeypatch):
+    client = TestClient(app.fastapi_app)
+    body = json.dumps(_events()[0])
+    assert client.post("/jira/webhook", content=body, headers={"X-Hub-Signature": "sha256=forged"}).status_code == 401
+    monkeypatch.setattr(app, "JIRA_WEBHOOK_SECRET", None)
+    assert client.post("/jira/webhook", content=body).status_code == 503
+
+
+def test_metrics_require_the_token(monkeypatch):
+    client = TestClient(app.fastapi_app)
+    monkeypatch.setattr(app, "METRICS_TOKEN", None)
+    assert client.get("/metrics").status_code == 404
+    monkeypatch.setattr(app, "METRICS_TOKEN", "metrics-secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer metrics-secret"})
+    assert response.status_code == 200 and "redis_rtt" in response.json()
@@ -0,0 +1,180 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+import httpx
+import handlers.jira_token_store as store
+from handlers.jira_models import AsyncSessionLocal, JiraToken
+
+
+async def _insert_token(slack_user_id, expires_in, refresh_token="refresh-0"):
+    async with AsyncSessionLocal() as session:
+        token = JiraToken(
+            slack_user_id=slack_user_id,
+            account_id=f"acc-{slack_user_id}",
+            display_name=slack_user_id,
+            cloud_id="cloud-1",
+            token_expires_at=datetime.now(timezone.utc) + timedelta(seconds=expires_in)
+        )
+        token.set_token(f"access-{slack_user_id}")
+        token.set_refresh_token(refresh_token)
+        session.add(token)
+        await session.commit()
+
+
+def test_cold_cache_lookups_do_not_stall_the_event_loop(redis, db, run):
+    store._token_cache.clear()
+    users = [f"U{i:03d}" for i in range(50)]
+
+    async def main():
+        for uid in users:
+            await _insert_token(uid, 3600)
+        lags, done = [], asyncio.Event()
+
+        async def ticker():
+            # Stand-in for Slack acks: anything the lookups block shows up as tick lag
+            while not done.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lags.append(time.perf_counter() - started - 0.005)
+
+        tick = asyncio.create_task(ticker())
+        results = await asyncio.gather(*(store.get_valid_jira_token(uid, None) for uid in users))
+        done.set()
+        await tick
+        return results, lags
+
+    results, lags = run(main())
+    assert [r["access_token"] for r in results] == [f"access-{uid}" for uid in users]
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] if len(lags) > 1 else lags[0]
+    assert p99 < 0.1, f"event loop stalled for {p99 * 1000:.0f} ms"
+
+
+def _token_endpoint(calls):
+    async def handler(request):
+        calls.append(request)
+        # Slow enough that every concurrent caller arrives while the refresh is in flight
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"access_token": f"fresh-{len(calls)}", "refresh_token": f"refresh-{len(calls)}", "expires_in": 3600})
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_concurrent_requests_share_one_refresh(redis, db, run):
+    store._token_cache.clear()
+    calls = []
+
+    async def main():
+        await _insert_token("UREFRESH", 30)
+        async with _token_endpoint(calls) as client:
+            return await asyncio.gather(*(store.get_valid_jira_token("UREFRESH", client) for _ in range(20)))
+
+    results = run(main())
+    assert len(calls) == 1
+    assert {r["access_token"] for r in results} == {"fresh-1"}
+
+
+def test_refresh_lock_serializes_workers(redis, db, run):
+    # Calling _refresh_with_lock directly skips the in-process future, like a second gunicorn worker would
+    store._token_cache.clear()
+    calls = []
+
+    async def main():
+        await _insert_token("UWORKERS", 30)
+        async with _token_endpoint(calls) as client:
+            return await asyncio.gather(*(
+                store._refresh_with_lock("UWORKERS", client, store.IN_MEMORY_CACHE_TTL) for _ in range(2)
+            ))
+
+    first, second = run(main())
+    assert len(calls) == 1
+    assert first["access_token"] == second["access_token"] == "fresh-1"
+
+
+def test_refresher_drops_users_whose_refresh_can_never_succeed(redis, db, run):
+    store._token_cache.clear()
+
+    async def handler(request):
+        return httpx.Response(403, json={"error": "invalid_grant", "error_description": "refresh_token is invalid"})
+
+    async def main():
+        await _insert_token("UREVOKED", 30)
+        await _insert_token("UEMPTY", 30, refresh_token="")
+        await redis.zadd(store.REDIS_ACTIVE_USERS_KEY, {"UREVOKED": time.time(), "UEMPTY": time.time()})
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            refreshed = await store.refresh_expiring_tokens(client)
+        return refreshed, await redis.zrange(store.REDIS_ACTIVE_USERS_KEY, 0, -1)
+
+    refreshed, active = run(main())
+    assert refreshed == 0
+    assert active == []
+
+
+def test_only_the_acting_user_is_marked_active(redis, db, run):
+    store._token_cache.clear()
+
+    async def main():
+        await _insert_token("UACTOR", 3600)
+        await _insert_token("UASSIGNEE", 3600)
+        await store.get_valid_jira_token("UACTOR", None)
+        await store.get_valid_jira_token("UASSIGNEE", None, active=False)
+        return await redis.zrange(store.REDIS_ACTIVE_USERS_KEY, 0, -1)
+
+    assert run(main()) == ["UACTOR"]
+
+
+def test_redis_tier_holds_only_a_sealed_envelope(redis, db, run):
+    store._token_cache.clear()
+
+    async def main():
+        await store.save_jira_token("USEALED", "access-secret", "refresh-secret", 3600, "cloud-1", "acc-1", "Sealed")
+        raw = await redis.get("jira_token:USEALED")
+        first = await store.get_valid_jira_token("USEALED", None)
+        hits = store._token_cache.hits
+        second = await store.get_valid_jira_token("USEALED", None)
+        return raw, first, second, store._token_cache.hits - hits
+
+    raw, first, second, new_hits = run(main())
+    assert "access-secret" not in raw and "refresh-secret" not in raw
+    assert "refresh_token" not in first
+    assert first == second and first["access_token"] == "access-secret"
+    # Opened once from Redis, then served from the in-process cache
+    assert new_hits == 1
+
+
+def test_lookup_latency_per_tier(redis, db, run):
+    # Micro-benchmark of the three tiers; fakeredis and SQLite stand in for the network hops,
+    # so the absolute numbers only show relative cost, not production latency
+    store._token_cache.clear()
+    rounds = 30
+
+    async def timed(prepare):
+        samples = []
+        for _ in range(rounds):
+            await prepare()
+            started = time.perf_counter()
+            assert await store.get_valid_jira_token("UBENCH", None)
+            samples.append(time.perf_counter() - started)
+        return sorted(samples)[rounds // 2] * 1000
+
+    async def nothing():
+        pass
+
+    async def drop_memory():
+        store._token_cache.clear()
+
+    async def drop_memory_and_redis():
+        store._token_cache.clear()
+        await redis.delete("jira_token:UBENCH")
+
+    async def main():
+        await _insert_token("UBENCH", 3600)
+        return {
+            "postgres": await timed(drop_memory_and_redis),
+            "redis": await timed(drop_memory),
+            "memory": await timed(nothing)
+        }
+
+    medians = run(main())
+    print("token lookup p50: " + ", ".join(f"{tier} {ms:.3f} ms" for tier, ms in medians.items()))
+    assert medians["memory"] < medians["redis"] and medians["memory"] < medians["postgres"]
+    assert medians["memory"] < 1
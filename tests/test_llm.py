@@ -0,0 +1,104 @@
+import asyncio
+import json
+import time
+import openai
+import handlers.llm as llm
+
+CHUNKS = ["The ", "checkout ", "bug ", "is ", "**fixed** ", "in ", "SHOP-42."]
+CHUNK_DELAY = 0.08
+
+
+class FakeOpenAI:
+    """Local server answering chat completions as a server-sent event stream, one chunk every CHUNK_DELAY."""
+
+    async def handle(self, reader, writer):
+        length = 0
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode().partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        await reader.readexactly(length)
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nConnection: close\r\n\r\n")
+        for i, content in enumerate(CHUNKS):
+            await asyncio.sleep(CHUNK_DELAY)
+            chunk = {"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4o-mini",
+                     "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]}
+            writer.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await writer.drain()
+        writer.write(b"data: [DONE]\n\n")
+        await writer.drain()
+        writer.close()
+
+
+def _stream(monkeypatch, render):
+    monkeypatch.setattr(llm, "STREAM_UPDATE_INTERVAL", 0.05)
+
+    async def main():
+        server = await asyncio.start_server(FakeOpenAI().handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        client = openai.AsyncOpenAI(api_key="sk-test", base_url=f"http://127.0.0.1:{port}/v1", max_retries=0)
+        monkeypatch.setattr(llm, "gptclient", client)
+        try:
+            started = time.monotonic()
+            text = await llm.stream_completion(render, "dm", model="gpt-4o-mini", messages=[{"role": "user", "content": "status?"}], max_tokens=50)
+            return text, started, time.monotonic()
+        finally:
+            await client.close()
+            server.close()
+
+    return asyncio.run(main())
+
+
+def test_first_tokens_render_long_before_the_answer_completes(monkeypatch):
+    renders = []
+
+    async def render(text, done):
+        renders.append((time.monotonic(), text, done))
+
+    text, started, finished = _stream(monkeypatch, render)
+    assert text == "".join(CHUNKS).strip()
+    first_at, first_text, first_done = renders[0]
+    assert not first_done and "".join(CHUNKS).startswith(first_text)
+    # The first partial shows up about one chunk in, not after all of them
+    assert first_at - started < 3 * CHUNK_DELAY < finished - started
+    assert renders[-1][1:] == (text, True)
+    assert sum(1 for _, _, done in renders if not done) >= 2
+
+
+def test_a_gone_message_stops_the_stream(monkeypatch):
+    calls = []
+
+    async def render(text, done):
+        calls.append(done)
+        raise Exception("not_found")
+
+    text, _, _ = _stream(monkeypatch, render)
+    assert text is None
+    assert True not in calls and len(calls) == 1
+
+
+def test_partial_markdown_is_cut_back_to_balanced_markup():
+    assert llm.trim_partial_markdown("Status is **In Prog") == "Status is"
+    assert llm.trim_partial_markdown("See [SHOP-42](https://exa") == "See"
+    assert llm.trim_partial_markdown("Run `make te") == "Run"
+    assert llm.trim_partial_markdown("Done:\n```\nlog line") == "Done:"
+    assert llm.trim_partial_markdown("It is _mostly") == "It is"
+    assert llm.trim_partial_markdown("**Owner:** Ada, _on call_") == "**Owner:** Ada, _on call_"
+
+
+def test_an_unfinished_answer_falls_back_to_an_error_message(monkeypatch):
+    async def translate(text):
+        return {"jql": "project = SHOP", "explanation": "SHOP issues"}
+
+    async def issues(*args, **kwargs):
+        return [{"key": "SHOP-1", "summary": "Checkout hangs", "status": "Open", "assignee": None, "priority": None,
+                 "created": None, "updated": None, "type": "Bug", "project": "SHOP", "description": None, "comments": []}], None
+
+    async def stopped(render, lane, **request):
+        return None
+
+    monkeypatch.setattr(llm, "translate_query", translate)
+    monkeypatch.setattr(llm, "fetch_issues", issues)
+    monkeypatch.setattr(llm, "stream_completion", stopped)
+    blocks = asyncio.run(llm.analyze_user_query_and_respond("what is open?", "access", "cloud-1"))
+    assert blocks[0]["text"]["text"].startswith("⚠️")
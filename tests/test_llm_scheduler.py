@@ -0,0 +1,86 @@
+import asyncio
+import httpx
+import openai
+import pytest
+import handlers.llm_scheduler as llm_scheduler
+
+
+def _rate_limited(retry_after="0.05"):
+    response = httpx.Response(429, headers={"retry-after": retry_after}, request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_lanes_run_in_priority_order_and_shed_the_least_urgent():
+    async def main():
+        scheduler = llm_scheduler.LLMScheduler(concurrency=1, max_depth=3)
+        order = []
+
+        async def job(lane, name):
+            try:
+                async with scheduler.slot(lane, "gpt-4o-mini", 10):
+                    order.append(name)
+                    await asyncio.sleep(0.01)
+            except llm_scheduler.LLMOverloaded:
+                order.append(f"shed:{name}")
+
+        tasks = [asyncio.create_task(job("similarity", "running"))]
+        await asyncio.sleep(0)
+        for lane, name in [("similarity", "sim1"), ("similarity", "sim2"), ("summarize", "sum"), ("dm", "dm1"), ("dm", "dm2")]:
+            tasks.append(asyncio.create_task(job(lane, name)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(main()) == ["running", "shed:sim2", "shed:sim1", "dm1", "dm2", "sum"]
+
+
+def test_retries_release_the_slot_and_pay_for_each_attempt():
+    async def main():
+        scheduler = llm_scheduler.LLMScheduler(concurrency=1)
+        requests_bucket, _ = scheduler._model_buckets("gpt-4o-mini")
+        charged, take = [], requests_bucket.take
+        requests_bucket.take = lambda amount: (charged.append(amount), take(amount))
+        attempts, events = [], []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise _rate_limited()
+            return "ok"
+
+        async def other():
+            events.append("other ran")
+            return "other"
+
+        retried = asyncio.create_task(scheduler.run("similarity", "gpt-4o-mini", 10, flaky))
+        await asyncio.sleep(0.01)
+        # With concurrency 1 this only gets through if the backoff sleep gave the slot back
+        await scheduler.run("similarity", "gpt-4o-mini", 10, other)
+        events.append("retry still backing off" if not retried.done() else "retry finished first")
+        result = await retried
+        return result, len(attempts), events, len(charged), scheduler.stats()
+
+    result, attempts, events, charged, stats = asyncio.run(main())
+    assert result == "ok" and attempts == 3
+    assert events == ["other ran", "retry still backing off"]
+    # Three attempts plus the other call, each charged to the RPM bucket
+    assert charged == 4
+    assert stats["lanes"]["similarity"]["retries"] == 2
+    assert stats["active"] == 0
+
+
+def test_errors_after_the_stream_opened_are_not_retried():
+    async def main():
+        scheduler = llm_scheduler.LLMScheduler(concurrency=1)
+        calls = []
+
+        async def open_stream():
+            calls.append(1)
+            return "stream"
+
+        with pytest.raises(openai.RateLimitError):
+            async with scheduler.session("dm", "gpt-4o-mini", 10, open_stream):
+                raise _rate_limited()
+        return len(calls), scheduler.stats()["active"]
+
+    assert asyncio.run(main()) == (1, 0)
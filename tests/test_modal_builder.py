@@ -0,0 +1,104 @@
+import time
+import handlers.modal_builder as modal_builder
+import handlers.options_index as options_index
+from handlers.project_loader import catalog
+
+PROJECTS = [{
+    "key": "PROJ",
+    "name": "Project",
+    "issuetypes": [{"id": "10001", "name": "Bug"}, {"id": "10002", "name": "Task"}]
+}]
+
+
+def _fields(required_fields=40):
+    fields = {
+        f"customfield_{i}": {"name": f"Field {i}", "required": True, "schema": {"type": "string"}}
+        for i in range(required_fields)
+    }
+    fields["customfield_big"] = {
+        "name": "Components",
+        "required": True,
+        "schema": {"type": "array"},
+        "allowedValues": [{"id": str(i), "value": f"Component {i}"} for i in range(500)]
+    }
+    return fields
+
+
+def test_compiled_modal_is_reused_and_patched_per_request(redis, run, monkeypatch):
+    catalog.swap(PROJECTS, "test-v1")
+    modal_builder._compiled_modals.clear()
+    compiles = []
+    compile_modal = modal_builder.compile_ticket_fields_modal
+
+    async def counting_compile(*args):
+        compiles.append(args)
+        return await compile_modal(*args)
+
+    monkeypatch.setattr(modal_builder, "compile_ticket_fields_modal", counting_compile)
+    fields = _fields()
+
+    async def main():
+        started = time.perf_counter()
+        first = await modal_builder.build_ticket_fields_modal(fields, "PROJ", "Project", "10001")
+        compiled = time.perf_counter()
+        second = await modal_builder.build_ticket_fields_modal(fields, "PROJ", "Project", "10001")
+        return first, second, compiled - started, time.perf_counter() - compiled
+
+    first, second, compile_seconds, cached_seconds = run(main())
+    print(f"modal build: {compile_seconds * 1000:.1f} ms compiled, {cached_seconds * 1000:.1f} ms from the template cache")
+    assert len(compiles) == 1
+    assert first["blocks"][1]["accessory"]["initial_option"]["value"] == "10001"
+    assert second == first and second is not first
+    # The per-request patch must not leak into the shared template
+    assert "initial_option" not in modal_builder._compiled_modals[("PROJ", "10001", "test-v1")]["blocks"][1]["accessory"]
+    assert cached_seconds < 0.05 and cached_seconds < compile_seconds
+
+
+def test_cached_modal_keeps_its_options_index_alive(redis, run):
+    catalog.swap(PROJECTS, "test-v2")
+    modal_builder._compiled_modals.clear()
+    fields = _fields(required_fields=0)
+    cache_key = options_index.options_cache_key("PROJ", "10001", "customfield_big")
+    pointer = options_index._pointer_key(cache_key)
+
+    async def main():
+        await modal_builder.build_ticket_fields_modal(fields, "PROJ", "Project", "10001")
+        version = await redis.get(pointer)
+        index_key = options_index._index_key(cache_key, version)
+        # Close to expiry, as after a day without a catalog change
+        await redis.expire(pointer, 5)
+        await redis.expire(index_key, 5)
+        await modal_builder.build_ticket_fields_modal(fields, "PROJ", "Project", "10001")
+        renewed = (await redis.ttl(pointer), await redis.ttl(index_key))
+        # Already gone: a cache hit republishes it
+        await redis.delete(pointer, index_key)
+        await modal_builder.build_ticket_fields_modal(fields, "PROJ", "Project", "10001")
+        return renewed, await options_index.query_options_index(cache_key, "component 49")
+
+    renewed, options = run(main())
+    assert min(renewed) > options_index.OPTIONS_INDEX_TTL - 60
+    assert options and options[0]["value"] == "49"
+
+
+def test_issue_types_without_fields_are_cached(redis, run, monkeypatch):
+    catalog.swap(PROJECTS, "test-v3")
+    modal_builder._compiled_modals.clear()
+
+    async def main():
+        empty = await modal_builder.build_ticket_fields_modal({}, "PROJ", "Project", "10002")
+        # A cache hit with the [] older snapshots stored, and one where the fetch failed
+        legacy = await modal_builder.build_ticket_fields_modal([], "PROJ", "Project", "10002")
+        failed = await modal_builder.build_ticket_fields_modal(None, "PROJ", "Project", "10002")
+        return empty, legacy, failed
+
+    empty, legacy, failed = run(main())
+    assert empty == legacy == failed
+    assert ("PROJ", "10002", "test-v3") in modal_builder._compiled_modals
+
+
+def test_failed_field_fetches_are_not_cached(redis, run):
+    catalog.swap(PROJECTS, "test-v4")
+    modal_builder._compiled_modals.clear()
+    modal = run(modal_builder.build_ticket_fields_modal(None, "PROJ", "Project", "10001"))
+    assert modal["blocks"][1]["accessory"]["initial_option"]["value"] == "10001"
+    assert not modal_builder._compiled_modals
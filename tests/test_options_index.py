@@ -0,0 +1,54 @@
+import time
+import handlers.options_index as options_index
+
+CACHE_KEY = "PROJ:10001:customfield_10100"
+
+
+def _allowed_values(count):
+    return [{"id": str(i), "value": f"Component {i:05d} / {'Backend' if i % 2 else 'Frontend'}"} for i in range(count)]
+
+
+def test_typeahead_on_50k_options_is_a_bounded_range_query(redis, run):
+    async def main():
+        await options_index.build_options_index(CACHE_KEY, _allowed_values(50_000))
+        started = time.perf_counter()
+        by_prefix = await options_index.query_options_index(CACHE_KEY, "component 4999")
+        by_word = await options_index.query_options_index(CACHE_KEY, "front")
+        elapsed = time.perf_counter() - started
+        return by_prefix, by_word, elapsed
+
+    by_prefix, by_word, elapsed = run(main())
+    assert [o["value"] for o in by_prefix] == [str(i) for i in range(49990, 50000)]
+    # A later word matches too, capped at one Slack page and without duplicates
+    assert len(by_word) == options_index.MAX_OPTIONS
+    assert len({o["value"] for o in by_word}) == len(by_word)
+    assert all("Frontend" in o["text"]["text"] for o in by_word)
+    assert elapsed < 0.5
+
+
+def test_unchanged_options_are_not_reindexed(redis, run):
+    values = _allowed_values(50)
+
+    async def main():
+        first = await options_index.build_options_index(CACHE_KEY, values)
+        index_key = options_index._index_key(CACHE_KEY, first)
+        await redis.zadd(index_key, {"marker": 0})
+        second = await options_index.build_options_index(CACHE_KEY, values)
+        return first, second, await redis.zscore(index_key, "marker")
+
+    first, second, marker = run(main())
+    assert first == second
+    assert marker == 0
+
+
+def test_changed_options_are_repointed_without_invalidation(redis, run):
+    async def main():
+        old = await options_index.build_options_index(CACHE_KEY, _allowed_values(50))
+        # A metadata sync rewrote the field with one more option; nothing deleted the pointer
+        new = await options_index.build_options_index(CACHE_KEY, _allowed_values(51))
+        options = await options_index.query_options_index(CACHE_KEY, "component 00050")
+        return old, new, await redis.get(options_index._pointer_key(CACHE_KEY)), options
+
+    old, new, pointer, options = run(main())
+    assert old != new and pointer == new
+    assert [o["value"] for o in options] == ["50"]
@@ -0,0 +1,29 @@
+import httpx
+import handlers.project_loader as project_loader
+
+
+def test_projects_without_creatable_issue_types_are_skipped(redis, run):
+    seen = []
+
+    async def handler(request):
+        seen.append(request.url)
+        path = request.url.path
+        if path.endswith("/project/search"):
+            return httpx.Response(200, json={"isLast": True, "values": [{"id": "1", "key": "SHOP", "name": "Shop"},
+                                                                        {"id": "2", "key": "LOCKED", "name": "Locked"},
+                                                                        {"id": "3", "key": "EMPTY", "name": "Empty"}]})
+        if path.endswith("/SHOP/issuetypes"):
+            return httpx.Response(200, json={"isLast": True, "issueTypes": [{"id": "10001", "name": "Bug"}]})
+        if path.endswith("/LOCKED/issuetypes"):
+            return httpx.Response(403, json={"errorMessages": ["forbidden"]})
+        return httpx.Response(200, json={"isLast": True, "issueTypes": []})
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await project_loader.CreatemetaSync(client, redis).fetch_projects()
+
+    projects = run(main())
+    assert [p["key"] for p in projects] == ["SHOP"]
+    assert projects[0]["issuetypes"] == [{"id": "10001", "name": "Bug", "subtask": False}]
+    search = next(url for url in seen if url.path.endswith("/project/search"))
+    assert search.params["action"] == "create" and search.params["startAt"] == "0"
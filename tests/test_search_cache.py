@@ -0,0 +1,79 @@
+import asyncio
+import json
+import app
+import handlers.search_cache as search_cache
+from handlers.jira_token_store import save_jira_token
+
+JQL = "assignee = currentUser()"
+
+
+def _fetcher(calls, issues, delay=0.0):
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return issues
+    return fetch
+
+
+def test_invalidation_from_another_worker_drops_local_results(redis, run):
+    search_cache._results.clear()
+    calls = []
+
+    async def main():
+        listener = asyncio.create_task(search_cache.run_search_invalidation_listener())
+        await asyncio.sleep(0.05)
+        await search_cache.cached_search("U1", JQL, _fetcher(calls, [{"key": "PROJ-1"}]))
+        await search_cache.cached_search("U1", JQL, _fetcher(calls, [{"key": "PROJ-1"}]))
+        # What another worker's invalidate_issue publishes after a mutation or webhook
+        await redis.publish(search_cache.SEARCH_INVALIDATIONS_CHANNEL, json.dumps({"issue": "PROJ-1", "users": []}))
+        await asyncio.sleep(0.05)
+        await search_cache.cached_search("U1", JQL, _fetcher(calls, [{"key": "PROJ-1"}]))
+        listener.cancel()
+
+    run(main())
+    assert len(calls) == 2
+
+
+def test_fetch_that_raced_an_invalidation_is_not_cached(redis, run):
+    search_cache._results.clear()
+    calls = []
+
+    async def main():
+        fetch = asyncio.create_task(search_cache.cached_search("U2", JQL, _fetcher(calls, [{"key": "PROJ-2"}], delay=0.05)))
+        await asyncio.sleep(0.01)
+        await search_cache.invalidate_issue("PROJ-2")
+        await fetch
+        await search_cache.cached_search("U2", JQL, _fetcher(calls, [{"key": "PROJ-2"}]))
+
+    run(main())
+    assert len(calls) == 2
+
+
+def test_expired_results_are_evicted_and_the_cache_is_bounded(redis, run, monkeypatch):
+    search_cache._results.clear()
+    monkeypatch.setattr(search_cache, "SEARCH_CACHE_MAX_SIZE", 3)
+
+    async def main():
+        monkeypatch.setattr(search_cache, "SEARCH_CACHE_TTL", -1)
+        for user in ("UOLD1", "UOLD2"):
+            await search_cache.cached_search(user, JQL, _fetcher([], []))
+        monkeypatch.setattr(search_cache, "SEARCH_CACHE_TTL", 30)
+        # Inserting drops the expired entries, then the oldest beyond the cap
+        for i in range(5):
+            await search_cache.cached_search(f"U{i}", JQL, _fetcher([], []))
+
+    run(main())
+    assert [user for user, _ in search_cache._results] == ["U2", "U3", "U4"]
+
+
+def test_created_ticket_refreshes_reporter_and_assignee_searches(redis, db, run):
+    search_cache._results.clear()
+
+    async def main():
+        await save_jira_token("UASSIGNEE", "access", "refresh", 3600, "cloud-1", "acc-assignee", "Assignee")
+        for user in ("UREPORTER", "UASSIGNEE", "UBYSTANDER"):
+            await search_cache.cached_search(user, JQL, _fetcher([], []))
+        await app.invalidate_created_ticket("UREPORTER", "SHOP-9", {"fields": {"assignee": {"id": "acc-assignee"}}})
+
+    run(main())
+    assert [user for user, _ in search_cache._results] == ["UBYSTANDER"]
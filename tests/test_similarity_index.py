@@ -0,0 +1,188 @@
+import hashlib
+import re
+import time
+import httpx
+import numpy as np
+import handlers.jira_client as jira_client
+import handlers.similarity_index as similarity_index
+
+ISSUES = [
+    ("SHOP-1", "Checkout times out for carts with many items", "Payment step hangs past 30 seconds", "Bug"),
+    ("SHOP-2", "Add dark mode to the storefront", "Users asked for a dark theme", "Story"),
+    ("SHOP-3", "Password reset email never arrives", "Reset link mail is not delivered", "Bug"),
+    ("SHOP-4", "Checkout timeout on large carts", "Same payment hang, reported by support", "Story"),
+    ("SHOP-5", "Search results ignore stock filter", "Out of stock items still listed", "Bug"),
+]
+
+
+async def fake_embed(texts, embedded):
+    # Hashed bag of words: deterministic and close enough to exercise ranking without OpenAI
+    embedded.extend(texts)
+    matrix = np.zeros((len(texts), similarity_index.EMBEDDING_DIMENSIONS), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in re.findall(r"[a-z]+", text.lower()):
+            matrix[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % similarity_index.EMBEDDING_DIMENSIONS] += 1
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def _page(issues):
+    return {"isLast": True, "issues": [
+        {"key": key, "fields": {"summary": summary, "description": description, "issuetype": {"name": issue_type},
+                                "status": {"name": "To Do"}, "updated": "2025-06-02T09:15:00.000+0000"}}
+        for key, summary, description, issue_type in issues
+    ]}
+
+
+def test_index_ranks_duplicates_and_only_embeds_changes(redis, run, monkeypatch):
+    similarity_index._indexes.clear()
+    embedded = []
+    monkeypatch.setattr(similarity_index, "embed", lambda texts: fake_embed(texts, embedded))
+    monkeypatch.setattr(similarity_index, "MIN_SCORE", 0.2)
+    pages = []
+
+    async def fetch_page(jql, fields, next_page_token):
+        pages.append(jql)
+        return _page(ISSUES)
+
+    async def main():
+        index = similarity_index._indexes["SHOP"] = similarity_index.ProjectIndex("SHOP")
+        await similarity_index.sync_project(index, fetch_page)
+        first_sync = len(embedded)
+        # A second sync sees the same texts and embeds nothing
+        await similarity_index.sync_project(index, fetch_page)
+        any_type = await similarity_index.find_similar("SHOP", "Checkout times out with large carts", "payment hangs", None, fetch_page)
+        bugs_only = await similarity_index.find_similar("SHOP", "Checkout times out with large carts", "payment hangs", "Bug", fetch_page)
+        return first_sync, any_type, bugs_only
+
+    first_sync, any_type, bugs_only = run(main())
+    assert first_sync == len(ISSUES)
+    assert len(pages) == 2 and "updated >= -" in pages[1]
+    assert {key for key, _ in any_type[:2]} == {"SHOP-1", "SHOP-4"}
+    assert all(score >= 0.2 for _, score in any_type)
+    assert "SHOP-2" not in [key for key, _ in any_type]
+    assert bugs_only[0][0] == "SHOP-1" and "SHOP-4" not in [key for key, _ in bugs_only]
+
+
+def test_cold_index_defers_to_text_search(redis, run, monkeypatch):
+    similarity_index._indexes.clear()
+    monkeypatch.setattr(similarity_index, "embed", lambda texts: fake_embed(texts, []))
+
+    async def fetch_page(jql, fields, next_page_token):
+        return None
+
+    assert run(similarity_index.find_similar("EMPTY", "anything", "", None, fetch_page)) is None
+
+
+def test_full_sync_prunes_issues_jira_no_longer_returns(redis, run, monkeypatch):
+    similarity_index._indexes.clear()
+    monkeypatch.setattr(similarity_index, "embed", lambda texts: fake_embed(texts, []))
+    remaining = list(ISSUES)
+
+    async def fetch_page(jql, fields, next_page_token):
+        return _page(remaining)
+
+    async def main():
+        index = similarity_index._indexes["SHOP"] = similarity_index.ProjectIndex("SHOP")
+        await similarity_index.sync_project(index, fetch_page)
+        # SHOP-4 was deleted or moved; an incremental sync cannot tell
+        remaining.remove(ISSUES[3])
+        await similarity_index.sync_project(index, fetch_page)
+        after_incremental = list(index.keys)
+        monkeypatch.setattr(similarity_index, "FULL_SYNC_INTERVAL", -1)
+        await similarity_index.sync_project(index, fetch_page)
+        reloaded = similarity_index.ProjectIndex("SHOP")
+        await reloaded.reload(force=True)
+        return after_incremental, index.keys, reloaded.keys
+
+    after_incremental, pruned, reloaded = run(main())
+    assert "SHOP-4" in after_incremental
+    assert pruned == reloaded == ["SHOP-1", "SHOP-2", "SHOP-3", "SHOP-5"]
+
+
+def test_keys_jira_rejects_are_dropped_and_the_search_retried(redis, run, monkeypatch):
+    searches = []
+
+    async def ranked(*args):
+        return [("SHOP-9", 0.9), ("SHOP-1", 0.8)]
+
+    async def token(slack_user_id, http_client, active=True):
+        return {"access_token": "access", "cloud_id": "cloud-1"}
+
+    async def handler(request):
+        jql = request.url.params["jql"]
+        searches.append(jql)
+        if "SHOP-9" in jql:
+            return httpx.Response(400, json={"errorMessages": ["An issue with key 'SHOP-9' does not exist for field 'key'."]})
+        issue = _page(ISSUES[:1])["issues"][0]
+        issue["fields"]["comment"] = {"comments": []}
+        return httpx.Response(200, json={"isLast": True, "issues": [issue]})
+
+    monkeypatch.setattr(jira_client, "find_similar", ranked)
+    monkeypatch.setattr(jira_client, "get_valid_jira_token", token)
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await jira_client.search_similar_tickets("U1", "Checkout hangs", "SHOP", "Bug", client)
+
+    results = run(main())
+    assert [r["key"] for r in results] == ["SHOP-1"]
+    assert searches[0] == "key in (SHOP-9,SHOP-1)" and searches[1] == "key in (SHOP-1)"
+
+
+LABELLED = [
+    ("SHOP-10", "Checkout times out for carts with many items", "Bug"),
+    ("SHOP-11", "Payment step hangs on large orders", "Bug"),
+    ("SHOP-12", "Password reset email never arrives", "Bug"),
+    ("SHOP-13", "Reset link mail is not delivered to Gmail users", "Bug"),
+    ("SHOP-14", "Search results ignore stock filter", "Bug"),
+    ("SHOP-15", "Out of stock items still listed in search", "Bug"),
+    ("SHOP-16", "Add dark mode to the storefront", "Story"),
+    ("SHOP-17", "Export orders as CSV", "Story"),
+]
+# Draft title -> the tickets a triager would call duplicates
+QUERIES = {
+    "Checkout hangs for large carts": {"SHOP-10", "SHOP-11"},
+    "Password reset mail not delivered": {"SHOP-12", "SHOP-13"},
+    "Stock filter ignored in search results": {"SHOP-14", "SHOP-15"},
+}
+
+
+def _text_search(title):
+    # What ``summary ~ "title"`` did: every term of the draft title must appear in the summary
+    terms = set(re.findall(r"[a-z]+", title.lower()))
+    return [key for key, summary, _ in LABELLED if terms <= set(re.findall(r"[a-z]+", summary.lower()))]
+
+
+def test_index_recall_and_latency_against_the_text_search(redis, run, monkeypatch):
+    similarity_index._indexes.clear()
+    monkeypatch.setattr(similarity_index, "embed", lambda texts: fake_embed(texts, []))
+    monkeypatch.setattr(similarity_index, "MIN_SCORE", 0.2)
+
+    async def fetch_page(jql, fields, next_page_token):
+        return _page([(key, summary, "", issue_type) for key, summary, issue_type in LABELLED])
+
+    async def main():
+        index = similarity_index._indexes["SHOP"] = similarity_index.ProjectIndex("SHOP")
+        await similarity_index.sync_project(index, fetch_page)
+        return {title: await similarity_index.find_similar("SHOP", title, "", None, fetch_page) for title in QUERIES}
+
+    found = run(main())
+    index_recall = sum(len(QUERIES[t] & {key for key, _ in found[t]}) for t in QUERIES) / sum(map(len, QUERIES.values()))
+    text_recall = sum(len(QUERIES[t] & set(_text_search(t))) for t in QUERIES) / sum(map(len, QUERIES.values()))
+    print(f"recall@5: index {index_recall:.2f}, text search {text_recall:.2f}")
+    assert index_recall >= 0.8 and index_recall > text_recall, (index_recall, text_recall)
+
+    # Ranking itself is an in-process matrix product; the old path paid a Jira search per draft
+    rng = np.random.default_rng(0)
+    big = similarity_index.ProjectIndex("BIG")
+    vectors = rng.normal(size=(similarity_index.MAX_INDEXED_ISSUES, similarity_index.EMBEDDING_DIMENSIONS)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    big.upsert([(f"BIG-{i}", {"type": "Bug"}, v) for i, v in enumerate(vectors)])
+    started = time.perf_counter()
+    for v in vectors[:50]:
+        big.search(v, 5, "Bug")
+    per_query_ms = (time.perf_counter() - started) / 50 * 1000
+    print(f"index search: {per_query_ms:.2f} ms per query over {len(big.keys)} issues")
+    assert per_query_ms < 20, f"{per_query_ms:.1f} ms per query"
@@ -0,0 +1,50 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from slack_sdk.errors import SlackApiError
+import handlers.userfetch as userfetch
+
+
+def _member(i):
+    return {"id": f"U{i:04d}", "name": f"user{i}", "profile": {"email": f"user{i}@example.com", "display_name": f"User {i}"}}
+
+
+class FakeSlack:
+    """users.list over 3 pages that answers the second page with one 429 first."""
+
+    def __init__(self):
+        self.calls = []
+        self.members = [_member(i) for i in range(6)]
+
+    async def users_list(self, limit, cursor=None):
+        self.calls.append(cursor)
+        await asyncio.sleep(0.01)
+        if cursor == "2" and self.calls.count("2") == 1:
+            raise SlackApiError("ratelimited", SimpleNamespace(status_code=429, headers={"Retry-After": "0"}))
+        page = int(cursor or 0)
+        return {
+            "members": self.members[page * 2:page * 2 + 2],
+            "response_metadata": {"next_cursor": str(page + 1) if page < 2 else ""}
+        }
+
+
+def _reset_local_cache():
+    userfetch.index_users([])
+    userfetch._user_cache["expires_at"] = datetime.now(timezone.utc)
+    userfetch._user_cache["missed_changes"] = False
+
+
+def test_concurrent_loads_run_one_rate_limit_aware_sync(redis, run):
+    _reset_local_cache()
+    slack = FakeSlack()
+
+    async def main():
+        loaded = await asyncio.gather(*(userfetch.ensure_users_loaded(slack) for _ in range(5)))
+        return loaded, await redis.hlen(userfetch.REDIS_USER_HASH_KEY)
+
+    loaded, stored = run(main())
+    assert all(loaded)
+    # One crawl: three pages plus the single retried 429
+    assert slack.calls == [None, "1", "2", "2"]
+    assert stored == 6
+    assert len(userfetch._user_cache["by_id"]) == 6